@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Compare :mod:`metricq.datachunk_codec` to encoding and decoding via ``datachunk_pb2``.
+
+Usage:
+
+    $ python benchmarks/datachunk_codec.py [--points N] [--repeat R]
+"""
+
+import argparse
+import random
+import timeit
+from array import array
+from collections.abc import Callable
+from itertools import accumulate
+
+from google.protobuf.internal import api_implementation
+
+from metricq import datachunk_codec
+from metricq.datachunk_pb2 import DataChunk
+
+
+def protobuf_encode(timestamps: "array[int]", values: "array[float]") -> bytes:
+    # Equivalent to what SourceMetric.append does for every data point
+    chunk = DataChunk()
+    previous = 0
+    for timestamp, value in zip(timestamps, values):
+        chunk.time_delta.append(timestamp - previous)
+        chunk.value.append(value)
+        previous = timestamp
+    return chunk.SerializeToString()
+
+
+def protobuf_decode(data: bytes) -> tuple["array[int]", "array[float]"]:
+    # Equivalent to what Sink._on_data_chunk does
+    chunk = DataChunk()
+    chunk.ParseFromString(data)
+    return array("q", accumulate(chunk.time_delta)), array("d", chunk.value)
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # 1 kHz with some jitter, starting at a realistic point in time
+    start = 1_700_000_000_000_000_000
+    timestamps = array(
+        "q",
+        (start + i * 1_000_000 + random.randint(0, 1000) for i in range(args.points)),
+    )
+    values = array("d", (random.random() for _ in range(args.points)))
+    data = protobuf_encode(timestamps, values)
+    assert datachunk_codec.encode(timestamps, values) == data
+
+    print(
+        f"{args.points} data points, protobuf implementation: {api_implementation.Type()}, "
+        f"numpy: {datachunk_codec._numpy_available}"
+    )
+    print(f"{'':>8} {'datachunk_pb2':>14} {'codec':>10} {'speedup':>8}")
+    for name, reference, codec in [
+        (
+            "encode",
+            lambda: protobuf_encode(timestamps, values),
+            lambda: datachunk_codec.encode(timestamps, values),
+        ),
+        (
+            "decode",
+            lambda: protobuf_decode(data),
+            lambda: datachunk_codec.decode(data),
+        ),
+    ]:
+        reference_time = measure(reference, args.repeat)
+        codec_time = measure(codec, args.repeat)
+        print(
+            f"{name:>8} {reference_time * 1e3:>12.2f}ms {codec_time * 1e3:>8.2f}ms "
+            f"{reference_time / codec_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,7 @@ from .logging import get_logger
 from .rpc import rpc_handler
 from .sink import DurableSink, Sink
 from .source import Source
+from .source_metric import BufferPolicy
 from .subscription import Subscriber
 from .synchronous_source import SynchronousSource
 from .timeseries import (
@@ -60,6 +61,7 @@ except ImportError:
 # Please keep sorted alphabetically to avoid merge conflicts
 __all__ = [
     "Agent",
+    "BufferPolicy",
     "Client",
     "DataClient",
     "Drain",
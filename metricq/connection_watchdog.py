@@ -99,6 +99,11 @@ class ConnectionWatchdog:
         self._established_event.clear()
         self._closed_event.set()
 
+    @property
+    def is_established(self) -> bool:
+        """Whether the connection is currently established."""
+        return self._established_event is not None and self._established_event.is_set()
+
     async def closed(self) -> None:
         """Asynchronously wait for the connection to be closed."""
         assert self._closed_event is not None
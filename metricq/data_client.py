@@ -48,6 +48,10 @@ class DataClient(Client):
         self.data_connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
         self.data_channel: Optional[aio_pika.abc.AbstractRobustChannel] = None
         self.data_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        # Enabled by Sources that publish reliably
+        self._data_publisher_confirms = False
+        # Configured by Sinks, see Sink.prefetch_count
+        self._data_prefetch_count = 400
         self._data_connection_watchdog = ConnectionWatchdog(
             on_timeout_callback=lambda watchdog: self._schedule_stop(
                 ReconnectTimeout(
@@ -91,12 +95,13 @@ class DataClient(Client):
                 self._on_data_connection_reconnect
             )
 
-            # publisher confirms seem to be buggy, disable for now
-            channel = await self.data_connection.channel(publisher_confirms=False)
+            # publisher confirms seem to be buggy, only enable them on request
+            channel = await self.data_connection.channel(
+                publisher_confirms=self._data_publisher_confirms
+            )
             assert isinstance(channel, aio_pika.abc.AbstractRobustChannel)
             self.data_channel = channel
-            # TODO configurable prefetch count
-            await channel.set_qos(prefetch_count=400)
+            await channel.set_qos(prefetch_count=self._data_prefetch_count)
 
             self._data_connection_watchdog.start()
             self._data_connection_watchdog.set_established()
@@ -0,0 +1,257 @@
+# Copyright (c) 2018, ZIH,
+# Technische Universitaet Dresden,
+# Federal Republic of Germany
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of metricq nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Encode and decode data chunks to and from the protobuf wire format.
+
+This operates on whole arrays of timestamps and values instead of accessing the repeated fields
+of a :class:`~metricq.datachunk_pb2.DataChunk` element by element.
+If NumPy is installed, varints are encoded and decoded vectorized.
+Otherwise, and for any wire data not laid out the way protobuf serializers write it
+(packed :code:`time_delta` followed by packed :code:`value`), this falls back to
+:class:`~metricq.datachunk_pb2.DataChunk`.
+Either way, the results are identical.
+"""
+
+import sys
+from array import array
+from collections.abc import Iterable, Sized
+from itertools import accumulate, chain
+from operator import sub
+from typing import Any
+
+from .datachunk_pb2 import DataChunk
+
+try:
+    import numpy as np
+    import numpy.typing as npt
+except ImportError:  # pragma: no cover
+    _numpy_available = False
+else:
+    _numpy_available = True
+
+# Tags (field number << 3 | wire type) of the packed, length-delimited repeated fields
+_TIME_DELTA_TAG = 1 << 3 | 2
+_VALUE_TAG = 2 << 3 | 2
+
+_MAX_VARINT_LENGTH = 10
+
+
+class _NonCanonical(Exception):
+    """Wire data that the vectorized decoder does not handle"""
+
+
+def encode(timestamps: Iterable[int], values: Iterable[float]) -> bytes:
+    """Serialize data points into a :code:`DataChunk` message.
+
+    Args:
+        timestamps:
+            absolute POSIX timestamps in nanoseconds,
+            e.g. a sequence of :code:`int` or a NumPy array of dtype :code:`int64`
+        values:
+            values at the respective timestamps,
+            e.g. a sequence of :code:`float` or a NumPy array of dtype :code:`float64`
+
+    Returns:
+        The serialized message, as :code:`DataChunk.SerializeToString()` would return it.
+
+    Raises:
+        ValueError: if the number of timestamps and values differs
+    """
+    if _numpy_available:
+        return _encode_numpy(
+            _to_numpy(timestamps, np.int64), _to_numpy(values, np.float64)
+        )
+
+    timestamps = array("q", timestamps)
+    values = array("d", values)
+    _check_lengths(len(timestamps), len(values))
+    chunk = DataChunk()
+    chunk.time_delta.extend(map(sub, timestamps, chain((0,), timestamps)))
+    chunk.value.extend(values)
+    return chunk.SerializeToString()
+
+
+def decode(data: bytes) -> tuple["array[int]", "array[float]"]:
+    """Deserialize a :code:`DataChunk` message into arrays of timestamps and values.
+
+    Both arrays are contiguous buffers that can be wrapped without copying,
+    e.g. using :func:`numpy.frombuffer`.
+
+    Args:
+        data: a serialized :code:`DataChunk` message
+
+    Returns:
+        Absolute POSIX timestamps in nanoseconds (``int64``) and values (``float64``).
+
+    Raises:
+        google.protobuf.message.DecodeError: if the message is malformed
+    """
+    if _numpy_available:
+        try:
+            return _decode_numpy(data)
+        except _NonCanonical:
+            pass
+
+    chunk = DataChunk()
+    chunk.ParseFromString(data)
+    return array("q", accumulate(chunk.time_delta)), array("d", chunk.value)
+
+
+def _check_lengths(timestamps: int, values: int) -> None:
+    if timestamps != values:
+        raise ValueError(
+            f"Number of timestamps and values differ ({timestamps} != {values})"
+        )
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+if _numpy_available:
+
+    def _to_numpy(data: Iterable[Any], dtype: type[np.generic]) -> Any:
+        if isinstance(data, Sized):
+            return np.asarray(data, dtype=dtype)
+        return np.fromiter(data, dtype=dtype)
+
+    def _encode_numpy(
+        timestamps: "npt.NDArray[np.int64]", values: "npt.NDArray[np.float64]"
+    ) -> bytes:
+        if timestamps.ndim != 1 or values.ndim != 1:
+            raise ValueError("timestamps and values must be one-dimensional")
+        _check_lengths(len(timestamps), len(values))
+
+        message = bytearray()
+        if len(timestamps):
+            time_delta = _encode_varints(np.diff(timestamps, prepend=np.int64(0)))
+            message += _varint(_TIME_DELTA_TAG)
+            message += _varint(len(time_delta))
+            message += time_delta
+        if len(values):
+            value = values.astype("<f8", copy=False).tobytes()
+            message += _varint(_VALUE_TAG)
+            message += _varint(len(value))
+            message += value
+        return bytes(message)
+
+    def _encode_varints(integers: "npt.NDArray[np.int64]") -> bytes:
+        unsigned = integers.view(np.uint64)
+        # Number of 7-bit groups, negative numbers always take all 10 bytes
+        lengths = np.ones(len(unsigned), dtype=np.intp)
+        for group in range(1, _MAX_VARINT_LENGTH):
+            lengths += unsigned >= np.uint64(1 << (7 * group))
+
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        encoded = np.empty(ends[-1], dtype=np.uint8)
+        for group in range(int(lengths.max())):
+            selected = lengths > group
+            groups = (unsigned[selected] >> np.uint64(7 * group)) & np.uint64(0x7F)
+            continued = (lengths[selected] > group + 1).astype(np.uint64) << np.uint64(
+                7
+            )
+            encoded[starts[selected] + group] = groups | continued
+        return encoded.tobytes()
+
+    def _decode_numpy(data: bytes) -> tuple["array[int]", "array[float]"]:
+        # The fast path only handles messages laid out the way serializers write
+        # them: at most one packed time_delta field followed by at most one packed
+        # value field, both with single-byte tags.
+        buffer = memoryview(data)
+        fields: dict[int, memoryview] = {}
+        position = 0
+        while position < len(buffer):
+            tag = buffer[position]
+            if tag not in (_TIME_DELTA_TAG, _VALUE_TAG) or any(
+                field >= tag for field in fields
+            ):
+                raise _NonCanonical()
+            length, position = _read_varint(buffer, position + 1)
+            if position + length > len(buffer):
+                raise _NonCanonical()
+            fields[tag] = buffer[position : position + length]
+            position += length
+
+        time_delta = fields.get(_TIME_DELTA_TAG)
+        value = fields.get(_VALUE_TAG)
+        if value is not None and len(value) % 8 != 0:
+            raise _NonCanonical()
+
+        timestamps = array("q")
+        if time_delta is not None:
+            timestamps.frombytes(np.cumsum(_decode_varints(time_delta)).tobytes())
+
+        values = array("d")
+        if value is not None:
+            values.frombytes(value)
+            if sys.byteorder == "big":  # pragma: no cover
+                values.byteswap()
+
+        return timestamps, values
+
+    def _read_varint(buffer: memoryview, position: int) -> tuple[int, int]:
+        result = 0
+        for shift in range(0, 7 * _MAX_VARINT_LENGTH, 7):
+            if position >= len(buffer):
+                break
+            byte = buffer[position]
+            position += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result, position
+        raise _NonCanonical()
+
+    def _decode_varints(data: Any) -> "npt.NDArray[np.int64]":
+        encoded = np.frombuffer(data, dtype=np.uint8)
+        if len(encoded) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        ends = np.flatnonzero(encoded < 0x80)
+        if len(ends) == 0 or ends[-1] != len(encoded) - 1:
+            raise _NonCanonical()
+
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+        if lengths.max() == 1:
+            return encoded.astype(np.int64)
+        if lengths.max() > _MAX_VARINT_LENGTH:
+            raise _NonCanonical()
+
+        shifts = (np.arange(len(encoded)) - np.repeat(starts, lengths)) * 7
+        groups = (encoded & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+        return np.bitwise_or.reduceat(groups, starts).view(np.int64)
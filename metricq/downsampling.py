@@ -0,0 +1,306 @@
+# Copyright (c) 2018, ZIH,
+# Technische Universitaet Dresden,
+# Federal Republic of Germany
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of metricq nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Aggregate data points into windows of fixed duration while they arrive.
+
+This module requires NumPy, install :code:`metricq[numpy]`.
+"""
+
+from abc import abstractmethod
+from array import array
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import Any, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from .exceptions import NonMonotonicTimestamps
+from .sink import Sink
+from .timeseries import Metric, TimeAggregate, Timedelta, Timestamp
+
+# Window state: minimum, maximum, sum, count, integral_ns, active time in ns
+_Window = list[Any]
+# Consecutive windows [start, stop) with the same state
+_Run = tuple[int, int, _Window]
+
+
+def _merge(window: _Window, other: _Window) -> None:
+    window[0] = min(window[0], other[0])
+    window[1] = max(window[1], other[1])
+    for i in range(2, 6):
+        window[i] += other[i]
+
+
+class WindowAggregator:
+    """Aggregate the data points of a metric into windows of fixed duration.
+
+    Each data point covers the time since the previous data point, just like
+    :meth:`TimeAggregate.from_value_pair`.
+    The first data point only marks the start of the covered time and is not aggregated,
+    like the first data point of a raw :class:`HistoryResponse`.
+    Points are counted in the window in which the time they cover ends,
+    so a data point exactly at the start of a window belongs to the previous window.
+    If the time covered by a data point spans several windows, its integral and active time
+    are split between them, and its value contributes to their minimum and maximum,
+    but it is only counted in the last one.
+    Windows covered entirely by a single data point therefore have a count of zero.
+
+    Windows are aligned to multiples of :code:`interval` since the epoch and are returned
+    once data points after their end arrived, so memory use does not depend on the number
+    of data points.
+    Windows covered entirely by a single data point are only created while iterating over
+    the result of :meth:`add`, so neither does a long gap between two data points.
+
+    Args:
+        interval: duration of the windows
+    """
+
+    def __init__(self, interval: Timedelta):
+        if interval.ns <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        self.interval = interval
+        self._previous: Optional[int] = None
+        # Index of the window that is not complete yet, and its state
+        self._open_index: Optional[int] = None
+        self._open: Optional[_Window] = None
+
+    def add(
+        self, timestamps: Iterable[int], values: Iterable[float]
+    ) -> Iterator[TimeAggregate]:
+        """Aggregate data points, in order of their timestamps.
+
+        Args:
+            timestamps:
+                POSIX timestamps in nanoseconds, e.g. an :class:`array.array` or
+                a NumPy array of dtype :code:`int64`
+            values: values at the respective timestamps
+
+        Returns:
+            An iterator over the windows completed by these data points, in order.
+            :attr:`TimeAggregate.timestamp` is the start of the window.
+            The state of the aggregator is updated before this returns, regardless of
+            whether the iterator is consumed.
+
+        Raises:
+            ValueError: if the number of timestamps and values differs
+            NonMonotonicTimestamps: if the timestamps are not strictly increasing
+        """
+        ts = np.asarray(timestamps, dtype=np.int64)
+        vs = np.asarray(values, dtype=np.float64)
+        if len(ts) != len(vs):
+            raise ValueError(
+                f"Number of timestamps and values differ ({len(ts)} != {len(vs)})"
+            )
+        if self._previous is None:
+            if len(ts) == 0:
+                return iter(())
+            self._previous = int(ts[0])
+            ts, vs = ts[1:], vs[1:]
+        if len(ts) == 0:
+            return iter(())
+
+        previous = np.empty_like(ts)
+        previous[0] = self._previous
+        previous[1:] = ts[:-1]
+        if np.any(ts <= previous):
+            raise NonMonotonicTimestamps(
+                "Timestamps of data points are not strictly monotonic"
+            )
+
+        windows, gaps = self._aggregate(previous, ts, vs)
+        self._previous = int(ts[-1])
+
+        if self._open is not None:
+            assert self._open_index is not None
+            first = windows.get(self._open_index)
+            if first is None:
+                windows[self._open_index] = self._open
+            else:
+                _merge(first, self._open)
+
+        interval = self.interval.ns
+        # Gaps always end before the window of the last data point, so they are complete
+        closed = gaps
+        self._open_index = self._open = None
+        for index, window in windows.items():
+            if (index + 1) * interval <= self._previous:
+                closed.append((index, index + 1, window))
+            else:
+                self._open_index, self._open = index, window
+        closed.sort(key=itemgetter(0))
+        return self._iter_closed(closed)
+
+    def _iter_closed(self, runs: list[_Run]) -> Iterator[TimeAggregate]:
+        for start, stop, window in runs:
+            for index in range(start, stop):
+                yield self._to_aggregate(index, window)
+
+    def flush(self) -> Optional[TimeAggregate]:
+        """Return the window that is not complete yet, and start it over.
+
+        Use this at the end of a stream of data points.
+        """
+        if self._open is None:
+            return None
+        assert self._open_index is not None
+        aggregate = self._to_aggregate(self._open_index, self._open)
+        self._open_index = self._open = None
+        return aggregate
+
+    def _aggregate(
+        self,
+        previous: "npt.NDArray[np.int64]",
+        timestamps: "npt.NDArray[np.int64]",
+        values: "npt.NDArray[np.float64]",
+    ) -> tuple[dict[int, _Window], list[_Run]]:
+        interval = self.interval.ns
+        # Each data point covers (previous, timestamp], ending in window `last`
+        # and starting in window `first`.
+        last = (timestamps - 1) // interval
+        first = previous // interval
+        own_time = timestamps - np.maximum(previous, last * interval)
+
+        # Vectorized: data points grouped by the window they are counted in
+        starts = np.flatnonzero(np.diff(last, prepend=last[0] - 1))
+        counts = np.diff(starts, append=len(timestamps))
+        minima = np.minimum.reduceat(values, starts)
+        maxima = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        integrals = np.add.reduceat(values * own_time, starts)
+        active = np.add.reduceat(own_time, starts)
+        windows: dict[int, _Window] = {
+            int(index): [minimum, maximum, total, count, integral, time]
+            for index, minimum, maximum, total, count, integral, time in zip(
+                last[starts].tolist(),
+                minima.tolist(),
+                maxima.tolist(),
+                sums.tolist(),
+                counts.tolist(),
+                integrals.tolist(),
+                active.tolist(),
+            )
+        }
+
+        # Data points covering time before their window, at most one per window boundary.
+        # They cover the rest of the window they start in, and all windows in between
+        # entirely, which no other data point touches.
+        gaps: list[_Run] = []
+        for i in np.flatnonzero(first < last).tolist():
+            value = float(values[i])
+            index = int(first[i])
+            time = (index + 1) * interval - int(previous[i])
+            window = [value, value, 0.0, 0, value * time, time]
+            if index in windows:
+                _merge(windows[index], window)
+            else:
+                windows[index] = window
+            if index + 1 < last[i]:
+                gap = [value, value, 0.0, 0, value * interval, interval]
+                gaps.append((index + 1, int(last[i]), gap))
+        return windows, gaps
+
+    def _to_aggregate(self, index: int, window: _Window) -> TimeAggregate:
+        minimum, maximum, total, count, integral, active = window
+        return TimeAggregate(
+            timestamp=Timestamp(index * self.interval.ns),
+            minimum=minimum,
+            maximum=maximum,
+            sum=total,
+            count=count,
+            integral_ns=integral,
+            active_time=Timedelta(active),
+        )
+
+
+class DownsamplingSink(Sink):
+    """A :class:`Sink` that aggregates the data points of each metric into windows of fixed durations.
+
+    Every chunk is aggregated into each of the windows at once using a :class:`WindowAggregator`
+    per metric and interval.
+    Override :meth:`on_aggregate` to handle completed windows, e.g. to re-publish them with a
+    :class:`Source`:
+
+    .. code-block:: python
+
+        class MeanSink(DownsamplingSink):
+            def __init__(self, source: Source, **kwargs):
+                super().__init__(intervals=[Timedelta.from_s(1), Timedelta.from_s(60)], **kwargs)
+                self.source = source
+
+            async def on_aggregate(self, metric, interval, aggregate):
+                await self.source.send(
+                    f"{metric}.mean.{interval.s:g}s", aggregate.timestamp, aggregate.mean
+                )
+
+    Subclasses overriding :meth:`on_data_chunk` must call the base class implementation.
+
+    Args:
+        intervals: durations of the windows
+    """
+
+    def __init__(self, *args: Any, intervals: Iterable[Timedelta], **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.intervals = list(intervals)
+        if not self.intervals:
+            raise ValueError("intervals must not be empty")
+        self.aggregators: dict[Metric, list[WindowAggregator]] = {}
+
+    async def unsubscribe(self, metrics: Iterable[Metric]) -> None:
+        metrics_list = list(metrics)
+        await super().unsubscribe(metrics_list)
+        for metric in metrics_list:
+            self.aggregators.pop(metric, None)
+
+    async def on_data_chunk(
+        self, metric: Metric, timestamps: "array[int]", values: "array[float]"
+    ) -> None:
+        aggregators = self.aggregators.get(metric)
+        if aggregators is None:
+            aggregators = self.aggregators[metric] = [
+                WindowAggregator(interval) for interval in self.intervals
+            ]
+        ts = np.frombuffer(timestamps, dtype=np.int64)
+        vs = np.frombuffer(values, dtype=np.float64)
+        for aggregator in aggregators:
+            for aggregate in aggregator.add(ts, vs):
+                await self.on_aggregate(metric, aggregator.interval, aggregate)
+
+    @abstractmethod
+    async def on_aggregate(
+        self, metric: Metric, interval: Timedelta, aggregate: TimeAggregate
+    ) -> None:
+        """A Callback that is invoked for every completed window of a metric.
+
+        Args:
+            metric: name of the metric
+            interval: duration of the window
+            aggregate: the aggregated data points, its timestamp is the start of the window
+        """
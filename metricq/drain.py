@@ -27,9 +27,10 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import asyncio
-from collections.abc import Iterable
+from array import array
+from collections.abc import AsyncIterator, Iterable, Iterator
 from types import TracebackType
-from typing import Any, Optional, cast
+from typing import Any, Optional
 
 import aio_pika.abc
 
@@ -39,14 +40,29 @@ from .timeseries import Timestamp
 
 logger = get_logger(__name__)
 
+Chunk = tuple[str, "array[int]", "array[float]"]
+
 
 class Drain(Sink):
-    def __init__(self, *args: Any, queue: str, metrics: Iterable[str], **kwargs: Any):
+    def __init__(
+        self,
+        *args: Any,
+        queue: str,
+        metrics: Iterable[str],
+        max_buffered_chunks: Optional[int] = None,
+        **kwargs: Any,
+    ):
         """Drain the given queue of all buffered metric data
 
         Args:
             queue: The name of the queue that contains the subscribed data.
             metrics: Metrics that you want to subscribe to.
+            max_buffered_chunks:
+                Maximum number of received chunks that have not been iterated over yet.
+                Once reached, chunks are not acknowledged until there is room again,
+                so the broker stops delivering once :attr:`Sink.prefetch_count` chunks
+                are unacknowledged.
+                By default, received chunks are buffered without limit.
         """
         super().__init__(*args, add_uuid=True, **kwargs)
         if not queue:
@@ -55,8 +71,19 @@ class Drain(Sink):
         self._metrics = list(metrics)
         if not self._metrics:
             raise ValueError("Metrics must not be empty")
-
-        self._data: asyncio.Queue[tuple[str, Timestamp, float]] = asyncio.Queue()
+        if max_buffered_chunks is not None and max_buffered_chunks < 1:
+            raise ValueError(
+                f"max_buffered_chunks must be positive, got {max_buffered_chunks}"
+            )
+
+        # Received chunks, None marks the end of the data
+        self._data: asyncio.Queue[Optional[Chunk]] = asyncio.Queue(
+            maxsize=max_buffered_chunks or 0
+        )
+        self._end_received = False
+        self._exhausted = False
+        # Data points of the chunk that is currently iterated over
+        self._points: Optional[Iterator[tuple[str, Timestamp, float]]] = None
 
     async def connect(self) -> None:
         await super().connect()
@@ -76,16 +103,22 @@ class Drain(Sink):
         if message.type == "end":
             async with message.process():
                 logger.debug("received end message")
+                self._end_received = True
                 await self.rpc("sink.release", dataQueue=self._queue)
+                # Chunks received before are still waiting for room in a bounded buffer,
+                # the end marker queues up behind them.
+                await self._data.put(None)
                 self._event_loop.create_task(self.stop())
-                await self._data.put(cast(tuple[str, Timestamp, float], ()))
 
                 return
 
         await super()._on_data_message(message)
 
-    async def on_data(self, metric: str, time: Timestamp, value: float) -> None:
-        await self._data.put((metric, time, value))
+    async def on_data_chunk(
+        self, metric: str, timestamps: "array[int]", values: "array[float]"
+    ) -> None:
+        # Blocks while the buffer is full, so the chunk is not acknowledged
+        await self._data.put((metric, timestamps, values))
 
     async def __aexit__(
         self,
@@ -93,6 +126,11 @@ class Drain(Sink):
         exc_value: Optional[BaseException],
         exc_traceback: Optional[TracebackType],
     ) -> None:
+        if self._data.maxsize and not self._end_received:
+            # Left early, with nobody to make room in the buffer the end would never arrive.
+            # Unacknowledged chunks remain in the queue.
+            await self.stop()
+            return
         # We don't need to `await self.stop()` here, but it already got scheduled in
         # `Drain._on_data_message()`. But we need to wait for the stop task to finish.
         await self.stopped()
@@ -109,10 +147,42 @@ class Drain(Sink):
         return self
 
     async def __anext__(self) -> tuple[str, Timestamp, float]:
-        try:
-            metric, time, value = await self._data.get()
-        except ValueError:
-            # Value Error is part of control flow
-            # -> raised on empty tuple at the end, inserted with the end message
+        while True:
+            if self._points is not None:
+                try:
+                    return next(self._points)
+                except StopIteration:
+                    self._points = None
+
+            metric, timestamps, values = await self._next_chunk()
+            self._points = (
+                (metric, Timestamp(timestamp), value)
+                for timestamp, value in zip(timestamps, values)
+            )
+
+    async def chunks(self) -> AsyncIterator[Chunk]:
+        """Asynchronously iterate over all metric data a chunk at a time.
+
+        This avoids creating a tuple and a :class:`Timestamp` per data point::
+
+            async for metric, timestamps, values in my_drain.chunks():
+                pass
+
+        Timestamps are given in nanoseconds since the epoch (``int64``) and values as ``float64``,
+        both arrays can be wrapped without copying, e.g. using :func:`numpy.frombuffer`.
+        Do not combine this with iterating over the data points of the Drain itself.
+        """
+        while True:
+            try:
+                yield await self._next_chunk()
+            except StopAsyncIteration:
+                return
+
+    async def _next_chunk(self) -> Chunk:
+        if self._exhausted:
+            raise StopAsyncIteration()
+        chunk = await self._data.get()
+        if chunk is None:
+            self._exhausted = True
             raise StopAsyncIteration()
-        return metric, time, value
+        return chunk
@@ -27,12 +27,19 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import asyncio
+import time
 import uuid
+from array import array
 from asyncio import CancelledError, Task
 from asyncio.futures import Future
-from collections.abc import Iterable, Iterator
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from collections.abc import AsyncGenerator, AsyncIterator, Iterable, Iterator, Mapping
+from contextlib import aclosing
+from dataclasses import dataclass
 from enum import Enum, auto
-from itertools import chain
+from itertools import accumulate, chain, repeat
+from operator import mul, sub
 from typing import Any, Optional
 
 import aio_pika
@@ -43,6 +50,7 @@ from .connection_watchdog import ConnectionWatchdog
 from .exceptions import (
     HistoryError,
     InvalidHistoryResponse,
+    NonMonotonicTimestamps,
     PublishFailed,
     ReconnectTimeout,
 )
@@ -51,6 +59,14 @@ from .rpc import rpc_handler
 from .timeseries import JsonDict, TimeAggregate, Timedelta, Timestamp, TimeValue
 from .version import __version__  # noqa: F401 - shut up flake8, automatic version str
 
+try:
+    import numpy as np
+    import numpy.typing as npt
+except ImportError:  # pragma: no cover
+    _numpy_available = False
+else:
+    _numpy_available = True
+
 logger = get_logger(__name__)
 
 
@@ -102,6 +118,63 @@ class HistoryResponseType(Enum):
     """
 
 
+@dataclass(frozen=True)
+class TimeValueArrays:
+    """Columnar representation of a sequence of :class:`~metricq.TimeValue`.
+
+    Each field is a contiguous buffer of the same length,
+    it can be wrapped without copying using e.g. :func:`numpy.frombuffer`.
+    """
+
+    timestamp: "array[int]"
+    """timestamps in nanoseconds since the epoch (``int64``)"""
+    value: "array[float]"
+    """values (``float64``)"""
+
+
+@dataclass(frozen=True)
+class TimeAggregateArrays:
+    """Columnar representation of a sequence of :class:`~metricq.TimeAggregate`.
+
+    Each field is a contiguous buffer of the same length,
+    it can be wrapped without copying using e.g. :func:`numpy.frombuffer`.
+    """
+
+    timestamp: "array[int]"
+    """timestamps in nanoseconds since the epoch (``int64``)"""
+    minimum: "array[float]"
+    """minimum values (``float64``)"""
+    maximum: "array[float]"
+    """maximum values (``float64``)"""
+    sum: "array[float]"
+    """sums of all values (``float64``)"""
+    count: "array[int]"
+    """total numbers of values (``uint64``)"""
+    integral_ns: "array[float]"
+    """nanoseconds-based integrals of values (``float64``)"""
+    active_time: "array[int]"
+    """time spanned by each aggregate, in nanoseconds (``int64``)"""
+
+    @property
+    def mean(self) -> "array[float]":
+        """Mean values, see :attr:`TimeAggregate.mean <metricq.TimeAggregate.mean>`."""
+        if _numpy_available:
+            return _mean_numpy(self)
+
+        nan = float("NaN")
+        return array(
+            "d",
+            (
+                integral / active_time
+                if active_time > 0
+                else (total / count if count != 0 else nan)
+                for integral, active_time, total, count in zip(
+                    self.integral_ns, self.active_time, self.sum, self.count
+                )
+            ),
+        )
+
+
 class HistoryResponse:
     """Response to a history request containing the historical data.
 
@@ -322,13 +395,391 @@ class HistoryResponse:
 
         raise ValueError("Invalid HistoryResponse mode")
 
+    def _timestamps(self) -> "array[int]":
+        # Copying repeated fields into a list first is much faster than iterating over them.
+        time_delta = self._proto.time_delta[:]
+        if _numpy_available:
+            return _from_numpy("q", np.cumsum(np.array(time_delta, dtype=np.int64)))
+        return array("q", accumulate(time_delta))
+
+    def _aggregate_columns(self) -> TimeAggregateArrays:
+        minimum: list[float] = []
+        maximum: list[float] = []
+        total: list[float] = []
+        count: list[int] = []
+        integral: list[float] = []
+        active_time: list[int] = []
+        # A single pass, accessing each aggregate message only once
+        for aggregate in self._proto.aggregate:
+            minimum.append(aggregate.minimum)
+            maximum.append(aggregate.maximum)
+            total.append(aggregate.sum)
+            count.append(aggregate.count)
+            integral.append(aggregate.integral)
+            active_time.append(aggregate.active_time)
+
+        return TimeAggregateArrays(
+            timestamp=self._timestamps(),
+            minimum=array("d", minimum),
+            maximum=array("d", maximum),
+            sum=array("d", total),
+            count=array("Q", count),
+            integral_ns=array("d", integral),
+            active_time=array("q", active_time),
+        )
+
+    def values_array(self, convert: bool = False) -> TimeValueArrays:
+        """All data points included in this response, as columnar arrays.
+
+        This is equivalent to :meth:`values`, but avoids creating Python objects for each data point.
+
+        Args:
+            convert:
+                Convert values transparently if response does not contain raw values.
+                If the response contains aggregates, this will return the mean value of each aggregate.
+
+        Raises:
+            ValueError:
+                if :code:`convert=False` and the response does not contain raw values.
+        """
+        if self._mode is HistoryResponseType.VALUES:
+            return TimeValueArrays(self._timestamps(), array("d", self._proto.value[:]))
+        elif self._mode is HistoryResponseType.EMPTY:
+            return TimeValueArrays(array("q"), array("d"))
+
+        if not convert:
+            raise ValueError(
+                "Attempting to access values of HistoryResponse.values_array in wrong mode: {}".format(
+                    self._mode
+                )
+            )
+
+        if self._mode is HistoryResponseType.AGGREGATES:
+            return TimeValueArrays(self._timestamps(), self.aggregates_array().mean)
+
+        if self._mode is HistoryResponseType.LEGACY:
+            return TimeValueArrays(
+                self._timestamps(), array("d", self._proto.value_avg)
+            )
+
+        raise ValueError("Invalid HistoryResponse mode")
+
+    def aggregates_array(self, convert: bool = False) -> TimeAggregateArrays:
+        """All aggregates contained in this response, as columnar arrays.
+
+        This is equivalent to :meth:`aggregates`, but avoids creating Python objects for each aggregate.
+
+        Args:
+            convert:
+                Convert values to aggregates transparently if response does not contain aggregates.
+                If the response contains `raw values`, this will return an aggregate for each value.
+
+        Raises:
+            ValueError:
+                if :code:`convert=False` and the underlying response does not contain aggregates
+            NonMonotonicTimestamps:
+                if the underling data has mode :attr:`~HistoryResponseType.VALUES` and
+                timestamps are not strictly monotonically increasing
+        """
+        if self._mode is HistoryResponseType.AGGREGATES:
+            return self._aggregate_columns()
+        elif self._mode is HistoryResponseType.EMPTY:
+            return _empty_aggregate_arrays()
+
+        if not convert:
+            raise ValueError(
+                "Attempting to access values of HistoryResponse.aggregates_array in wrong mode: {}".format(
+                    self._mode
+                )
+            )
+
+        if len(self) == 0:
+            return _empty_aggregate_arrays()
+
+        if self._mode is HistoryResponseType.VALUES:
+            timestamps = self._timestamps()
+            # First interval is useless here, each aggregate starts at the
+            # previous timestamp and carries the value of the next one.
+            values = array("d", self._proto.value[1:])
+            if _numpy_available:
+                active_time, integral_ns = _integrate_numpy(timestamps, values)
+            else:
+                active_time = array("q", map(sub, timestamps[1:], timestamps[:-1]))
+                integral_ns = array("d", map(mul, active_time, values))
+            if active_time and min(active_time) <= 0:
+                raise NonMonotonicTimestamps(
+                    "Timestamps in HistoryResponse are not strictly monotonic"
+                )
+            return TimeAggregateArrays(
+                timestamp=timestamps[:-1],
+                minimum=values,
+                maximum=values,
+                sum=values,
+                count=array("Q", repeat(1, len(values))),
+                integral_ns=integral_ns,
+                active_time=active_time,
+            )
+
+        if self._mode is HistoryResponseType.LEGACY:
+            # That of course only makes sense if you just use mean or mean_sum
+            # We don't do the nice intervals here...
+            count = len(self)
+            return TimeAggregateArrays(
+                timestamp=self._timestamps(),
+                minimum=array("d", self._proto.value_min),
+                maximum=array("d", self._proto.value_max),
+                sum=array("d", self._proto.value_avg),
+                count=array("Q", repeat(1, count)),
+                integral_ns=array("d", repeat(0.0, count)),
+                active_time=array("q", repeat(0, count)),
+            )
+
+        raise ValueError("Invalid HistoryResponse mode")
+
+
+def _empty_aggregate_arrays() -> TimeAggregateArrays:
+    return TimeAggregateArrays(
+        timestamp=array("q"),
+        minimum=array("d"),
+        maximum=array("d"),
+        sum=array("d"),
+        count=array("Q"),
+        integral_ns=array("d"),
+        active_time=array("q"),
+    )
+
+
+if _numpy_available:
+
+    def _from_numpy(typecode: str, data: "npt.NDArray[Any]") -> "array[Any]":
+        result = array(typecode)
+        result.frombytes(data.tobytes())
+        return result
+
+    def _mean_numpy(arrays: TimeAggregateArrays) -> "array[float]":
+        if not arrays.active_time:
+            return array("d")
+        integral = np.frombuffer(arrays.integral_ns, dtype=np.float64)
+        active_time = np.frombuffer(arrays.active_time, dtype=np.int64)
+        total = np.frombuffer(arrays.sum, dtype=np.float64)
+        count = np.frombuffer(arrays.count, dtype=np.uint64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(
+                active_time > 0,
+                integral / active_time,
+                np.where(count != 0, total / count, np.nan),
+            )
+        return _from_numpy("d", mean)
+
+    def _integrate_numpy(
+        timestamps: "array[int]", values: "array[float]"
+    ) -> tuple["array[int]", "array[float]"]:
+        """Durations between consecutive timestamps and their integrals over the next value."""
+        active_time = np.diff(np.frombuffer(timestamps, dtype=np.int64))
+        integral = active_time * np.frombuffer(values, dtype=np.float64)
+        return _from_numpy("q", active_time), _from_numpy("d", integral)
+
+
+def _stitch_values(responses: Iterable[HistoryResponse]) -> Iterator[TimeValue]:
+    """Chain the values of consecutive raw value responses.
+
+    Windows share their boundaries, so values at a boundary may be contained in
+    two consecutive responses.  Only yield values after the last one seen.
+    """
+    previous_timestamp: Optional[Timestamp] = None
+    for response in responses:
+        for time_value in response.values():
+            if previous_timestamp is None or previous_timestamp < time_value.timestamp:
+                previous_timestamp = time_value.timestamp
+                yield time_value
+
+
+_RequestKey = tuple[
+    str, Optional[int], Optional[int], Optional[int], HistoryRequestType
+]
+
+
+def _request_key(
+    metric: str,
+    start_time: Optional[Timestamp],
+    end_time: Optional[Timestamp],
+    interval_max: Optional[Timedelta],
+    request_type: HistoryRequestType,
+) -> _RequestKey:
+    return (
+        metric,
+        None if start_time is None else start_time.posix_ns,
+        None if end_time is None else end_time.posix_ns,
+        None if interval_max is None else interval_max.ns,
+        request_type,
+    )
+
+
+class HistoryCache:
+    """An in-process cache for responses to history requests.
+
+    Pass an instance to :class:`HistoryClient` to answer repeated identical requests
+    (same metric, time range, :literal:`interval_max` and request type)
+    without a round trip to the database.
+
+    Entries expire after a time-to-live depending on the type of request.
+    Requests whose :literal:`end_time` lies in the past are considered immutable
+    and are kept for :literal:`immutable_ttl` seconds instead.
+    If the cached responses hold more than :literal:`max_points` data points in total,
+    the least recently used entries are evicted.
+
+    Args:
+        max_points:
+            Maximum total number of data points (values or aggregates) in cached responses.
+        ttl:
+            Time-to-live of cached responses in seconds, by type of request.
+            Requests of types not included here are not cached.
+            Defaults to :attr:`DEFAULT_TTL`.
+        immutable_ttl:
+            Time-to-live in seconds of responses to requests whose :literal:`end_time` lies in the past.
+    """
+
+    DEFAULT_TTL: dict[HistoryRequestType, float] = {
+        HistoryRequestType.AGGREGATE: 10,
+        HistoryRequestType.AGGREGATE_TIMELINE: 10,
+        HistoryRequestType.LAST_VALUE: 1,
+    }
+    """Default time-to-live of cached responses in seconds, by type of request."""
+
+    def __init__(
+        self,
+        max_points: int = 1_000_000,
+        ttl: Optional[Mapping[HistoryRequestType, float]] = None,
+        immutable_ttl: float = 3600,
+    ):
+        if max_points < 1:
+            raise ValueError(f"max_points must be at least 1 ({max_points} < 1)")
+
+        self.max_points = max_points
+        self.ttl = dict(self.DEFAULT_TTL if ttl is None else ttl)
+        self.immutable_ttl = immutable_ttl
+
+        self.hits = 0
+        """Number of requests answered from the cache"""
+        self.misses = 0
+        """Number of cacheable requests not found in the cache"""
+        self.evictions = 0
+        """Number of entries evicted to stay within :literal:`max_points`"""
+
+        self._entries: OrderedDict[
+            _RequestKey, tuple[float, HistoryResponse]
+        ] = OrderedDict()
+        self._points = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._entries.clear()
+        self._points = 0
+
+    def lookup(
+        self,
+        metric: str,
+        start_time: Optional[Timestamp],
+        end_time: Optional[Timestamp],
+        interval_max: Optional[Timedelta],
+        request_type: HistoryRequestType,
+    ) -> Optional[HistoryResponse]:
+        """Get the cached response to a history request.
+
+        See :meth:`HistoryClient.history_data_request` for the arguments.
+
+        Returns:
+            The cached response, or :literal:`None` if there is none or it expired.
+        """
+        if self._ttl(request_type, end_time) is None:
+            return None
+        return self._get(
+            _request_key(metric, start_time, end_time, interval_max, request_type)
+        )
+
+    def store(
+        self,
+        metric: str,
+        start_time: Optional[Timestamp],
+        end_time: Optional[Timestamp],
+        interval_max: Optional[Timedelta],
+        request_type: HistoryRequestType,
+        response: HistoryResponse,
+    ) -> None:
+        """Cache the response to a history request, unless requests of its type are not cached.
+
+        See :meth:`HistoryClient.history_data_request` for the arguments.
+        """
+        ttl = self._ttl(request_type, end_time)
+        if ttl is not None:
+            self._put(
+                _request_key(metric, start_time, end_time, interval_max, request_type),
+                response,
+                ttl,
+            )
+
+    def _ttl(
+        self, request_type: HistoryRequestType, end_time: Optional[Timestamp]
+    ) -> Optional[float]:
+        ttl = self.ttl.get(request_type)
+        if ttl is None:
+            return None
+        if end_time is not None and end_time < Timestamp.now():
+            return max(ttl, self.immutable_ttl)
+        return ttl
+
+    def _get(self, key: _RequestKey) -> Optional[HistoryResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, response = entry
+            if time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            self._remove(key)
+
+        self.misses += 1
+        return None
+
+    def _put(self, key: _RequestKey, response: HistoryResponse, ttl: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + ttl, response)
+        self._points += _cache_cost(response)
+
+        while self._points > self.max_points and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: _RequestKey) -> None:
+        _expires, response = self._entries.pop(key)
+        self._points -= _cache_cost(response)
+
+
+def _cache_cost(response: HistoryResponse) -> int:
+    # Count empty responses as well, so that the number of entries is bounded too.
+    return max(1, len(response))
+
 
 class HistoryClient(Client):
-    """A MetricQ client to access historical metric data."""
+    """A MetricQ client to access historical metric data.
+
+    Args:
+        cache:
+            Cache responses to repeated identical requests in-process,
+            see :class:`~metricq.history_client.HistoryCache`.
+            Disabled by default.
+    """
 
-    def __init__(self, *args: Any, **kwargs: Any):
+    def __init__(self, *args: Any, cache: Optional[HistoryCache] = None, **kwargs: Any):
         super().__init__(*args, **kwargs)
 
+        self.cache = cache
+
         self.data_server_address: Optional[str] = None
         self.history_connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
         self.history_channel: Optional[aio_pika.abc.AbstractRobustChannel] = None
@@ -346,6 +797,9 @@ class HistoryClient(Client):
         )
 
         self._request_futures: dict[str, Future[HistoryResponse]] = dict()
+        self._inflight_requests: dict[_RequestKey, Task[HistoryResponse]] = dict()
+        # Number of callers waiting for each request in flight
+        self._inflight_waiters: dict[Task[HistoryResponse], int] = dict()
         self._reregister_task: Optional[Task[None]] = None
 
     async def connect(self) -> None:
@@ -404,7 +858,12 @@ class HistoryClient(Client):
 
         Closes the history connection and the channel in addition to
         :meth:`Agent.teardown()`.
+        Requests still in flight are cancelled.
         """
+        requests = list(self._inflight_requests.values())
+        for request in requests:
+            request.cancel()
+        await asyncio.gather(*requests, return_exceptions=True)
         await asyncio.gather(super().teardown(), self.__close()),
 
     async def get_metrics(self, *args: Any, **kwargs: Any) -> dict[str, JsonDict]:
@@ -427,6 +886,11 @@ class HistoryClient(Client):
     ) -> HistoryResponse:
         """Request historical data points of a metric.
 
+        If an identical request (same metric, time range, :literal:`interval_max` and request type)
+        is already in flight, no new request is sent.
+        Instead, this waits for the response to the request in flight, which is then shared among all callers.
+        The request is cancelled once all of its callers timed out or were cancelled.
+
         Args:
             metric:
                 The metric of interest.
@@ -440,7 +904,7 @@ class HistoryClient(Client):
                 The type of metric data to request.
                 See :class:`.HistoryRequestType`.
             timeout:
-                Operation timeout in seconds.
+                Operation timeout in seconds, for this caller only.
 
         Raises:
             ValueError: if metric is empty or longer than 255 bytes
@@ -452,6 +916,74 @@ class HistoryClient(Client):
                 "Metric names (amqp routing keys) must be at most 255 bytes long"
             )
 
+        if self.cache is not None:
+            cached_response = self.cache.lookup(
+                metric, start_time, end_time, interval_max, request_type
+            )
+            if cached_response is not None:
+                logger.debug("history request for {} answered from cache", metric)
+                return cached_response
+
+        request_key = _request_key(
+            metric, start_time, end_time, interval_max, request_type
+        )
+
+        # Identical requests that are already in flight share a single
+        # published message and the resulting response.
+        request = self._inflight_requests.get(request_key)
+        if request is None:
+            request = self._event_loop.create_task(
+                self._send_history_request(
+                    metric,
+                    start_time=start_time,
+                    end_time=end_time,
+                    interval_max=interval_max,
+                    request_type=request_type,
+                )
+            )
+            self._inflight_requests[request_key] = request
+            request.add_done_callback(
+                lambda task: self._on_history_request_done(request_key, task)
+            )
+        else:
+            logger.debug(
+                "history request for {} ({}-{},{}) is already in flight, waiting for its response",
+                metric,
+                start_time,
+                end_time,
+                interval_max,
+            )
+
+        # Shield the shared request, such that a caller that times out or
+        # gets cancelled does not cancel the request for everyone else.
+        # The request itself has no deadline, only the last caller to leave cancels it.
+        self._inflight_waiters[request] = self._inflight_waiters.get(request, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(request), timeout=timeout)
+        finally:
+            self._inflight_waiters[request] -= 1
+            if not self._inflight_waiters[request]:
+                del self._inflight_waiters[request]
+                request.cancel()
+
+    def _on_history_request_done(
+        self, request_key: _RequestKey, task: Task[HistoryResponse]
+    ) -> None:
+        if self._inflight_requests.get(request_key) is task:
+            del self._inflight_requests[request_key]
+        if not task.cancelled():
+            # Retrieve the exception, in case all waiting callers went away,
+            # to avoid "exception was never retrieved" warnings.
+            task.exception()
+
+    async def _send_history_request(
+        self,
+        metric: str,
+        start_time: Optional[Timestamp],
+        end_time: Optional[Timestamp],
+        interval_max: Optional[Timedelta],
+        request_type: HistoryRequestType,
+    ) -> HistoryResponse:
         correlation_id = "mq-history-py-{}-{}".format(self.token, uuid.uuid4().hex)
 
         logger.debug(
@@ -482,29 +1014,134 @@ class HistoryClient(Client):
         )
 
         self._request_futures[correlation_id] = self._event_loop.create_future()
-        assert self.history_exchange is not None
-        await self._history_connection_watchdog.established()
-
         try:
-            # TOC/TOU hazard: by the time we publish, the data connection might
-            # be gone again, even if we waited for it to be established before.
-            await self.history_exchange.publish(msg, routing_key=metric)
-        except aio_pika.exceptions.ChannelInvalidStateError as e:
-            # Trying to publish on a closed channel results in a ChannelInvalidStateError
-            # from aiormq.  Let's wrap that in a more descriptive error.
-            raise PublishFailed(
-                f"Failed to publish data chunk for metric '{metric!r}' "
-                f"on exchange '{self.history_exchange}' ({self.history_connection})"
-            ) from e
+            assert self.history_exchange is not None
+            await self._history_connection_watchdog.established()
 
-        try:
-            result = await asyncio.wait_for(
-                self._request_futures[correlation_id], timeout=timeout
-            )
+            try:
+                # TOC/TOU hazard: by the time we publish, the data connection might
+                # be gone again, even if we waited for it to be established before.
+                await self.history_exchange.publish(msg, routing_key=metric)
+            except aio_pika.exceptions.ChannelInvalidStateError as e:
+                # Trying to publish on a closed channel results in a ChannelInvalidStateError
+                # from aiormq.  Let's wrap that in a more descriptive error.
+                raise PublishFailed(
+                    f"Failed to publish data chunk for metric '{metric!r}' "
+                    f"on exchange '{self.history_exchange}' ({self.history_connection})"
+                ) from e
+
+            result = await self._request_futures[correlation_id]
         finally:
             del self._request_futures[correlation_id]
+
+        if self.cache is not None:
+            self.cache.store(
+                metric, start_time, end_time, interval_max, request_type, result
+            )
+
         return result
 
+    async def history_data_request_many(
+        self,
+        metrics: Iterable[str],
+        start_time: Optional[Timestamp],
+        end_time: Optional[Timestamp],
+        interval_max: Optional[Timedelta],
+        request_type: HistoryRequestType = HistoryRequestType.AGGREGATE_TIMELINE,
+        timeout: float = 60,
+        concurrency: int = 64,
+    ) -> AsyncIterator[tuple[str, HistoryResponse | Exception]]:
+        """Request historical data points of multiple metrics concurrently.
+
+        This sends a request like :meth:`history_data_request` for each metric,
+        but keeps up to :literal:`concurrency` requests in flight at the same time.
+        Results are yielded in the order in which they complete::
+
+            async for metric, result in client.history_data_request_many(
+                metrics, start_time, end_time, interval_max
+            ):
+                if isinstance(result, Exception):
+                    ... # handle the failed request for this metric
+                else:
+                    ... # process the HistoryResponse
+
+        A failed request does not affect the requests for other metrics,
+        instead the exception is yielded in place of the response.
+        Leaving the iteration early cancels all outstanding requests.
+
+        Args:
+            metrics:
+                The metrics of interest.
+            start_time:
+                Only include data points from this point in time onward.
+            end_time:
+                Only include data points up to this point in time.
+            interval_max:
+                Maximum time between data points in response.
+            request_type:
+                The type of metric data to request.
+                See :class:`.HistoryRequestType`.
+            timeout:
+                Operation timeout in seconds, applies to each request individually.
+            concurrency:
+                Maximum number of requests in flight at the same time.
+
+        Raises:
+            ValueError: if concurrency is not a positive integer
+
+        Exceptions raised while iterating over :literal:`metrics` are passed on to the caller.
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 ({concurrency} < 1)")
+
+        pending_metrics = iter(metrics)
+        # Results of requests, an exception if iterating over the metrics failed,
+        # None once a worker is done
+        results: asyncio.Queue[
+            tuple[str, HistoryResponse | Exception] | Exception | None
+        ] = asyncio.Queue()
+
+        async def request_worker() -> None:
+            try:
+                # All workers share the same iterator, so each metric is requested exactly once.
+                for metric in pending_metrics:
+                    try:
+                        response = await self.history_data_request(
+                            metric,
+                            start_time=start_time,
+                            end_time=end_time,
+                            interval_max=interval_max,
+                            request_type=request_type,
+                            timeout=timeout,
+                        )
+                    except Exception as e:
+                        logger.debug("history request for {} failed: {}", metric, e)
+                        results.put_nowait((metric, e))
+                    else:
+                        results.put_nowait((metric, response))
+            except Exception as e:
+                results.put_nowait(e)
+            finally:
+                results.put_nowait(None)
+
+        workers = [
+            self._event_loop.create_task(request_worker()) for _ in range(concurrency)
+        ]
+        try:
+            running = len(workers)
+            while running > 0:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
     async def history_aggregate(
         self,
         metric: str,
@@ -633,12 +1270,25 @@ class HistoryClient(Client):
         start_time: Optional[Timestamp] = None,
         end_time: Optional[Timestamp] = None,
         timeout: float = 60,
+        *,
+        window: Optional[Timedelta] = None,
+        window_points: Optional[int] = None,
+        concurrency: int = 4,
     ) -> Iterator[TimeValue]:
         """Retrieve raw values of a metric within the specified span of time.
 
         Omitting both :literal:`start_time` and :literal:`end_time` yields all values recorded for this metric,
         omitting either one yields values up to/starting at a point in time.
 
+        Large spans of time can be split into multiple smaller requests by passing
+        either :literal:`window` or :literal:`window_points`.
+        The database then never has to assemble a single huge response,
+        and the :literal:`timeout` applies to each of the smaller requests.
+        Up to :literal:`concurrency` of these requests are in flight at the same time,
+        their values are stitched together in order.
+        All values are still held in memory until this returns.
+        To process long spans of time with bounded memory, use :meth:`iter_raw_timeline` instead.
+
         Args:
             metric:
                 Name of the metric.
@@ -650,13 +1300,46 @@ class HistoryClient(Client):
                 If omitted, include all values after :literal:`start_time`.
             timeout:
                 Operation timeout in seconds.
+            window:
+                Split the request into windows of at most this duration.
+            window_points:
+                Split the request into windows of approximately this many values each,
+                based on the number of values in the requested span of time.
+            concurrency:
+                Maximum number of window requests in flight at the same time.
 
         Returns:
             An iterator over values of this metric.
 
         Raises:
             ~exceptions.InvalidHistoryResponse:
+            ValueError:
+                if :literal:`window` or :literal:`window_points` is given,
+                but :literal:`start_time` or :literal:`end_time` is omitted
         """
+        if window is not None or window_points is not None:
+            windows = await self._raw_timeline_windows(
+                metric,
+                start_time=start_time,
+                end_time=end_time,
+                window=window,
+                window_points=window_points,
+                timeout=timeout,
+            )
+            responses = [
+                response
+                async for response in self._raw_timeline_responses(
+                    metric, windows, concurrency=concurrency, timeout=timeout
+                )
+            ]
+            if any(
+                response.mode
+                not in (HistoryResponseType.VALUES, HistoryResponseType.EMPTY)
+                for response in responses
+            ):
+                raise InvalidHistoryResponse("Response contained no values")
+            return _stitch_values(responses)
+
         response: HistoryResponse = await self.history_data_request(
             metric=metric,
             start_time=start_time,
@@ -671,6 +1354,175 @@ class HistoryClient(Client):
         except ValueError:
             raise InvalidHistoryResponse("Response contained no values")
 
+    async def iter_raw_timeline(
+        self,
+        metric: str,
+        start_time: Timestamp,
+        end_time: Timestamp,
+        *,
+        chunk: Optional[Timedelta] = None,
+        chunk_points: Optional[int] = None,
+        concurrency: int = 2,
+        timeout: float = 60,
+    ) -> AsyncIterator[TimeValueArrays]:
+        """Stream raw values of a metric within the specified span of time.
+
+        The span of time is split into chunks of either a fixed duration (:literal:`chunk`)
+        or approximately a number of values (:literal:`chunk_points`), which are requested separately.
+        Values are yielded in order as columnar arrays, one batch per chunk, as soon as it arrives::
+
+            async for batch in client.iter_raw_timeline(
+                metric, start_time, end_time, chunk=Timedelta.from_s(3600)
+            ):
+                write(batch.timestamp, batch.value)
+
+        While a batch is being processed, the following :literal:`concurrency` chunks are already requested.
+        Memory usage is therefore bounded by the size of a few chunks, independent of the requested span of time.
+        When stopping early, close the iterator, e.g. using :func:`contextlib.aclosing`,
+        to cancel the requests for the following chunks right away.
+
+        Args:
+            metric:
+                Name of the metric.
+            start_time:
+                Only retrieve values from this point in time onward.
+            end_time:
+                Only retrieve values up to this point in time.
+            chunk:
+                Maximum timespan of values in each batch.
+            chunk_points:
+                Approximate number of values in each batch,
+                based on the number of values in the requested span of time.
+            concurrency:
+                Maximum number of chunk requests in flight at the same time.
+            timeout:
+                Operation timeout in seconds, applies to each chunk request individually.
+
+        Raises:
+            ~exceptions.InvalidHistoryResponse:
+            ValueError:
+                unless exactly one of :literal:`chunk` and :literal:`chunk_points` is given
+        """
+        windows = await self._raw_timeline_windows(
+            metric,
+            start_time=start_time,
+            end_time=end_time,
+            window=chunk,
+            window_points=chunk_points,
+            timeout=timeout,
+        )
+
+        previous_timestamp: Optional[int] = None
+        # Close the responses as soon as this is closed, cancelling prefetched requests.
+        async with aclosing(
+            self._raw_timeline_responses(
+                metric, windows, concurrency=concurrency, timeout=timeout
+            )
+        ) as responses:
+            async for response in responses:
+                try:
+                    batch = response.values_array()
+                except ValueError:
+                    raise InvalidHistoryResponse("Response contained no values")
+
+                # Windows share their boundaries, skip values already yielded.
+                if previous_timestamp is not None:
+                    first = bisect_right(batch.timestamp, previous_timestamp)
+                    if first > 0:
+                        batch = TimeValueArrays(
+                            batch.timestamp[first:], batch.value[first:]
+                        )
+
+                if len(batch.timestamp) > 0:
+                    previous_timestamp = batch.timestamp[-1]
+                    yield batch
+
+    async def _raw_timeline_windows(
+        self,
+        metric: str,
+        start_time: Optional[Timestamp],
+        end_time: Optional[Timestamp],
+        window: Optional[Timedelta],
+        window_points: Optional[int],
+        timeout: float,
+    ) -> list[tuple[Timestamp, Timestamp]]:
+        """Split a span of time into consecutive windows for raw value requests.
+
+        If :literal:`window_points` is given, the window duration is derived from
+        the number of values in the span, assuming a uniform rate.
+        """
+        if start_time is None or end_time is None:
+            raise ValueError("Splitting requests requires both start_time and end_time")
+        if (window is None) == (window_points is None):
+            raise ValueError("Exactly one of window and window_points must be given")
+
+        duration = end_time - start_time
+        if duration <= Timedelta(0):
+            return [(start_time, end_time)]
+
+        if window_points is not None:
+            if window_points < 1:
+                raise ValueError(
+                    f"window_points must be at least 1 ({window_points} < 1)"
+                )
+            aggregate = await self.history_aggregate(
+                metric, start_time=start_time, end_time=end_time, timeout=timeout
+            )
+            window_count = max(1, -(-aggregate.count // window_points))
+            window = Timedelta(-(-duration.ns // window_count))
+
+        assert window is not None
+        if window <= Timedelta(0):
+            raise ValueError(f"window must be a positive duration ({window})")
+
+        windows = []
+        window_start = start_time
+        while window_start < end_time:
+            window_end = min(window_start + window, end_time)
+            windows.append((window_start, window_end))
+            window_start = window_end
+        return windows
+
+    async def _raw_timeline_responses(
+        self,
+        metric: str,
+        windows: Iterable[tuple[Timestamp, Timestamp]],
+        concurrency: int,
+        timeout: float,
+    ) -> AsyncGenerator[HistoryResponse, None]:
+        """Request raw values for consecutive windows and yield the responses in order.
+
+        At most :literal:`concurrency` requests are in flight at the same time,
+        so that only a bounded number of responses is held in memory.
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 ({concurrency} < 1)")
+
+        pending: deque[Task[HistoryResponse]] = deque()
+        try:
+            for window_start, window_end in windows:
+                pending.append(
+                    self._event_loop.create_task(
+                        self.history_data_request(
+                            metric,
+                            start_time=window_start,
+                            end_time=window_end,
+                            interval_max=Timedelta(0),
+                            request_type=HistoryRequestType.FLEX_TIMELINE,
+                            timeout=timeout,
+                        )
+                    )
+                )
+                if len(pending) >= concurrency:
+                    yield await pending.popleft()
+
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
     @rpc_handler("config")
     async def _history_config(self, **kwargs: Any) -> None:
         logger.info("received config {}", kwargs)
@@ -1,10 +1,18 @@
+from array import array
 from types import TracebackType
 from typing import Any, Optional, TypeVar
 
+import numpy as np
 import pandas as pd
 
-from ..history_client import HistoryClient
-from ..timeseries import JsonDict
+from ..exceptions import InvalidHistoryResponse
+from ..history_client import (
+    HistoryClient,
+    HistoryRequestType,
+    TimeAggregateArrays,
+    TimeValueArrays,
+)
+from ..timeseries import JsonDict, Timedelta, Timestamp
 
 # With Python 3.11 use typing.Self instead
 Self = TypeVar("Self", bound="PandasHistoryClient")
@@ -52,7 +60,13 @@ class PandasHistoryClient:
         return await self._client.get_metrics(*args, **kwargs)
 
     async def history_aggregate_timeline(
-        self, *args: Any, **kwargs: Any
+        self,
+        metric: str,
+        *,
+        interval_max: Timedelta,
+        start_time: Optional[Timestamp] = None,
+        end_time: Optional[Timestamp] = None,
+        timeout: float = 60,
     ) -> pd.DataFrame:
         """
         The method works like :meth:`metricq.HistoryClient.history_aggregate_timeline`,
@@ -72,47 +86,34 @@ class PandasHistoryClient:
         * integral_s
 
         For details of those, see the documentation of :class:`metricq.TimeAggregate`.
+
+        Note:
+            Unlike raw values, aggregates are read from the response one message at a time.
+            Converting responses with millions of aggregates therefore takes seconds.
         """
-        data = await self._client.history_aggregate_timeline(*args, **kwargs)
-        columns = [
-            "timestamp",
-            "minimum",
-            "maximum",
-            "sum",
-            "count",
-            "integral_ns",
-            "active_time",
-            "mean",
-            "mean_integral",
-            "mean_sum",
-            "integral_s",
-        ]
-
-        return pd.DataFrame(
-            (
-                (
-                    {
-                        "timestamp": pd.Timestamp(
-                            aggregate.timestamp.posix_ns,
-                            unit="ns",
-                            tz="UTC",
-                        ),
-                        "active_time": pd.Timedelta(
-                            aggregate.active_time.ns, unit="ns"
-                        ),
-                    }
-                    | {
-                        attr: getattr(aggregate, attr)
-                        for attr in columns
-                        if attr not in ("timestamp", "active_time")
-                    }
-                )
-                for aggregate in data
-            ),
-            columns=columns,
+        response = await self._client.history_data_request(
+            metric=metric,
+            start_time=start_time,
+            end_time=end_time,
+            interval_max=interval_max,
+            request_type=HistoryRequestType.AGGREGATE_TIMELINE,
+            timeout=timeout,
         )
 
-    async def history_raw_timeline(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        try:
+            aggregates = response.aggregates_array()
+        except ValueError:
+            raise InvalidHistoryResponse("AGGREGATE_TIMELINE contains no aggregates")
+
+        return _aggregates_frame(aggregates)
+
+    async def history_raw_timeline(
+        self,
+        metric: str,
+        start_time: Optional[Timestamp] = None,
+        end_time: Optional[Timestamp] = None,
+        timeout: float = 60,
+    ) -> pd.DataFrame:
         """
         The method works like :meth:`metricq.HistoryClient.history_raw_timeline`,
         but returns a :class:`pandas.DataFrame` instead of a list of
@@ -122,22 +123,22 @@ class PandasHistoryClient:
         * timestamp
         * value
         """
-        data = await self._client.history_raw_timeline(*args, **kwargs)
-        return pd.DataFrame(
-            (
-                {
-                    "timestamp": pd.Timestamp(
-                        time_value.timestamp.posix_ns,
-                        unit="ns",
-                        tz="UTC",
-                    ),
-                    "value": time_value.value,
-                }
-                for time_value in data
-            ),
-            columns=["timestamp", "value"],
+        response = await self._client.history_data_request(
+            metric=metric,
+            start_time=start_time,
+            end_time=end_time,
+            interval_max=Timedelta(0),
+            request_type=HistoryRequestType.FLEX_TIMELINE,
+            timeout=timeout,
         )
 
+        try:
+            values = response.values_array()
+        except ValueError:
+            raise InvalidHistoryResponse("Response contained no values")
+
+        return _values_frame(values)
+
     async def __aenter__(self: Self) -> Self:
         await self.connect()
         return self
@@ -149,3 +150,48 @@ class PandasHistoryClient:
         traceback: Optional[TracebackType],
     ) -> None:
         await self.stop()
+
+
+def _timestamps(timestamps: "array[int]") -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(
+        np.frombuffer(timestamps, dtype=np.int64).view("datetime64[ns]"), tz="UTC"
+    )
+
+
+def _values_frame(values: TimeValueArrays) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "timestamp": _timestamps(values.timestamp),
+            "value": np.frombuffer(values.value, dtype=np.float64),
+        }
+    )
+
+
+def _aggregates_frame(aggregates: TimeAggregateArrays) -> pd.DataFrame:
+    sum_ = np.frombuffer(aggregates.sum, dtype=np.float64)
+    count = np.frombuffer(aggregates.count, dtype=np.uint64).astype(np.int64)
+    integral_ns = np.frombuffer(aggregates.integral_ns, dtype=np.float64)
+    active_time_ns = np.frombuffer(aggregates.active_time, dtype=np.int64)
+
+    # Division by zero yields NaN here, just like in TimeAggregate
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_sum = np.where(count != 0, sum_ / count, np.nan)
+        mean_integral = np.where(
+            active_time_ns != 0, integral_ns / active_time_ns, np.nan
+        )
+
+    return pd.DataFrame(
+        {
+            "timestamp": _timestamps(aggregates.timestamp),
+            "minimum": np.frombuffer(aggregates.minimum, dtype=np.float64),
+            "maximum": np.frombuffer(aggregates.maximum, dtype=np.float64),
+            "sum": sum_,
+            "count": count,
+            "integral_ns": integral_ns,
+            "active_time": active_time_ns.view("timedelta64[ns]"),
+            "mean": np.where(active_time_ns > 0, mean_integral, mean_sum),
+            "mean_integral": mean_integral,
+            "mean_sum": mean_sum,
+            "integral_s": integral_ns / 1e9,
+        }
+    )
@@ -0,0 +1,261 @@
+# Copyright (c) 2018, ZIH,
+# Technische Universitaet Dresden,
+# Federal Republic of Germany
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of metricq nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Keep the most recent data points of each metric in memory.
+
+This module requires NumPy, install :code:`metricq[numpy]`.
+"""
+
+from array import array
+from collections.abc import Iterable
+from typing import Any, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from .sink import Sink
+from .timeseries import Metric, Timestamp, TimeValue
+
+
+class RingBuffer:
+    """A fixed-capacity buffer of the most recent data points of a metric.
+
+    Timestamps and values are stored in preallocated NumPy arrays of :code:`capacity` elements,
+    the oldest data points are overwritten once the buffer is full.
+    Data points must be added in order of their timestamps, as MetricQ delivers them
+    for each metric.
+    Lookups by time are binary searches.
+
+    Args:
+        capacity: maximum number of data points kept
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        # Physical index of the oldest data point, and number of data points
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamps)
+
+    def __len__(self) -> int:
+        """Number of data points in the buffer."""
+        return self._size
+
+    def extend(self, timestamps: Iterable[int], values: Iterable[float]) -> None:
+        """Add data points, overwriting the oldest ones once the buffer is full.
+
+        Args:
+            timestamps:
+                POSIX timestamps in nanoseconds, e.g. an :class:`array.array` or
+                a NumPy array of dtype :code:`int64`
+            values: values at the respective timestamps
+
+        Raises:
+            ValueError: if the number of timestamps and values differs
+        """
+        new_timestamps = np.asarray(timestamps, dtype=np.int64)
+        new_values = np.asarray(values, dtype=np.float64)
+        if len(new_timestamps) != len(new_values):
+            raise ValueError(
+                f"Number of timestamps and values differ ({len(new_timestamps)} != {len(new_values)})"
+            )
+        capacity = self.capacity
+        if len(new_timestamps) > capacity:
+            new_timestamps = new_timestamps[-capacity:]
+            new_values = new_values[-capacity:]
+
+        count = len(new_timestamps)
+        end = (self._start + self._size) % capacity
+        # At most two copies: up to the end of the arrays, and the rest from their start
+        head = min(count, capacity - end)
+        self._timestamps[end : end + head] = new_timestamps[:head]
+        self._values[end : end + head] = new_values[:head]
+        self._timestamps[: count - head] = new_timestamps[head:]
+        self._values[: count - head] = new_values[head:]
+
+        overwritten = max(0, self._size + count - capacity)
+        self._start = (self._start + overwritten) % capacity
+        self._size += count - overwritten
+
+    def clear(self) -> None:
+        """Remove all data points."""
+        self._start = 0
+        self._size = 0
+
+    def latest(self) -> Optional[TimeValue]:
+        """The most recent data point, or :literal:`None` if the buffer is empty."""
+        if self._size == 0:
+            return None
+        last = (self._start + self._size - 1) % self.capacity
+        return TimeValue(
+            Timestamp(int(self._timestamps[last])), float(self._values[last])
+        )
+
+    def range(
+        self, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None
+    ) -> tuple["npt.NDArray[np.int64]", "npt.NDArray[np.float64]"]:
+        """Copies of the timestamps and values of the data points in a time range.
+
+        Args:
+            start: include data points at or after this time, defaults to the oldest data point
+            end: include data points before this time, defaults to after the newest data point
+        """
+        segments = self._segments(start, end)
+        if not segments:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return (
+            np.concatenate([self._timestamps[s] for s in segments]),
+            np.concatenate([self._values[s] for s in segments]),
+        )
+
+    def minimum(
+        self, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None
+    ) -> Optional[float]:
+        """Minimum value within a time range, or :literal:`None` if there are no data points.
+
+        See :meth:`range` for the arguments.
+        """
+        minima = [self._values[s].min() for s in self._segments(start, end)]
+        return float(min(minima)) if minima else None
+
+    def maximum(
+        self, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None
+    ) -> Optional[float]:
+        """Maximum value within a time range, or :literal:`None` if there are no data points.
+
+        See :meth:`range` for the arguments.
+        """
+        maxima = [self._values[s].max() for s in self._segments(start, end)]
+        return float(max(maxima)) if maxima else None
+
+    def mean(
+        self, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None
+    ) -> Optional[float]:
+        """Mean of the values within a time range, or :literal:`None` if there are no data points.
+
+        This is the mean of the data points, not weighted by their durations.
+        See :meth:`range` for the arguments.
+        """
+        segments = self._segments(start, end)
+        if not segments:
+            return None
+        values = [self._values[s] for s in segments]
+        return float(sum(v.sum() for v in values) / sum(len(v) for v in values))
+
+    def _segments(
+        self, start: Optional[Timestamp], end: Optional[Timestamp]
+    ) -> list[slice]:
+        """Non-empty slices of the arrays with the data points in a time range, in order."""
+        first = 0 if start is None else self._search(start.posix_ns)
+        last = self._size if end is None else self._search(end.posix_ns)
+        if first >= last:
+            return []
+        capacity = self.capacity
+        begin = (self._start + first) % capacity
+        stop = begin + last - first
+        if stop <= capacity:
+            return [slice(begin, stop)]
+        return [slice(begin, capacity), slice(0, stop - capacity)]
+
+    def _search(self, timestamp: int) -> int:
+        """Number of data points before a timestamp, by binary search."""
+        # The data points are stored in up to two sorted parts: from _start up
+        # to the end of the arrays, followed by those from the start of the arrays.
+        head = self._timestamps[
+            self._start : min(self._start + self._size, self.capacity)
+        ]
+        position = int(np.searchsorted(head, timestamp))
+        if position < len(head):
+            return position
+        tail = self._timestamps[: self._size - len(head)]
+        return position + int(np.searchsorted(tail, timestamp))
+
+
+class RingBufferSink(Sink):
+    """A :class:`Sink` that keeps the most recent data points of each subscribed metric.
+
+    Every metric gets a :class:`RingBuffer` of :code:`capacity` data points
+    once data for it arrives, filled a whole chunk at a time.
+    Buffers are discarded once their metric is unsubscribed, so memory is bounded
+    by :code:`capacity` times the number of subscribed metrics.
+
+    Example:
+        .. code-block:: python
+
+            sink = RingBufferSink(capacity=10_000, token=..., url=...)
+            await sink.connect()
+            await sink.subscribe(["example.temperature"])
+            ...
+            buffer = sink["example.temperature"]
+            print(buffer.latest(), buffer.maximum(start=Timestamp.now() - Timedelta.from_s(60)))
+
+    Subclasses overriding :meth:`on_data_chunk` must call the base class implementation.
+
+    Args:
+        capacity: number of data points kept per metric
+    """
+
+    def __init__(self, *args: Any, capacity: int, **kwargs: Any):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        super().__init__(*args, **kwargs)
+        self.capacity = capacity
+        self.buffers: dict[Metric, RingBuffer] = {}
+
+    def __getitem__(self, metric: Metric) -> RingBuffer:
+        """The buffer of a metric.
+
+        Raises:
+            KeyError: if no data arrived for the metric yet
+        """
+        return self.buffers[metric]
+
+    async def unsubscribe(self, metrics: Iterable[Metric]) -> None:
+        metrics_list = list(metrics)
+        await super().unsubscribe(metrics_list)
+        for metric in metrics_list:
+            self.buffers.pop(metric, None)
+
+    async def on_data_chunk(
+        self, metric: Metric, timestamps: "array[int]", values: "array[float]"
+    ) -> None:
+        buffer = self.buffers.get(metric)
+        if buffer is None:
+            buffer = self.buffers[metric] = RingBuffer(self.capacity)
+        buffer.extend(
+            np.frombuffer(timestamps, dtype=np.int64),
+            np.frombuffer(values, dtype=np.float64),
+        )
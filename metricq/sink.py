@@ -26,13 +26,28 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from abc import abstractmethod
-from asyncio import CancelledError, Task
-from collections.abc import Iterable
+import os
+import time
+from array import array
+from asyncio import (
+    CancelledError,
+    Queue,
+    Semaphore,
+    Task,
+    TimerHandle,
+    gather,
+    get_running_loop,
+)
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor
+from itertools import accumulate
+from math import ceil
 from typing import Any, Optional
 
 import aio_pika
 
+from . import datachunk_codec
 from .data_client import DataClient
 from .datachunk_pb2 import DataChunk
 from .logging import get_logger
@@ -50,16 +65,144 @@ class Sink(DataClient):
         add_uuid:
             whether to append a randomly generated UUID to this Sink's :term:`Token`.
             This is useful to distinguish different instances of the same Sink.
+        prefetch_count:
+            Maximum number of data chunks delivered to this Sink before it acknowledged them,
+            see :attr:`prefetch_count`.
+        adaptive_prefetch:
+            Continuously adjust :attr:`prefetch_count`, so that the prefetched chunks keep the Sink
+            busy for :attr:`PREFETCH_BUFFER_TIME` seconds, based on the observed processing time per chunk.
+        prefetch_memory_limit:
+            With :code:`adaptive_prefetch`, limit :attr:`prefetch_count` so that prefetched chunks
+            take up at most about this many bytes, based on the observed size of chunks.
+        ack_batch_size:
+            Acknowledge data chunks in batches of up to this many chunks, using a single
+            :code:`basic.ack` with :code:`multiple=True` instead of one per chunk.
+            Chunks are acknowledged once all chunks delivered before them have been handled
+            as well, at the latest :code:`ack_interval` seconds after being handled.
+            Chunks that fail to be handled are still rejected and requeued individually.
+            If the connection to the broker is lost, all handled chunks not yet acknowledged
+            are redelivered.
+        ack_interval:
+            Maximum number of seconds to delay acknowledgements with :code:`ack_batch_size`.
+        workers:
+            Handle up to this many data chunks concurrently, e.g. for Sinks that write to a database
+            in :meth:`on_data_chunk`.
+            Chunks of the same metric are handled one after another, in the order they arrived,
+            and each chunk is acknowledged once it has been handled.
+            The number of chunks waiting to be handled is bounded by :attr:`prefetch_count`.
+            By default, every chunk is handled as soon as it arrives, so chunks of the same metric
+            may be handled concurrently if :meth:`on_data_chunk` awaits anything.
+        executor:
+            Handle data chunks by calling :meth:`process_chunk` in this executor,
+            e.g. a :class:`concurrent.futures.ProcessPoolExecutor` for CPU-heavy analysis
+            that would otherwise block the event loop.
+            Results are passed to :meth:`on_processed_chunk` on the event loop,
+            and chunks are only acknowledged afterwards.
+            Combine with :code:`workers` to process chunks of the same metric in order.
+        max_offloaded_chunks:
+            Maximum number of chunks submitted to :code:`executor` at the same time.
+            Defaults to twice the number of CPUs.
     """
 
-    def __init__(self, *args: Any, add_uuid: bool = True, **kwargs: Any):
+    PREFETCH_BUFFER_TIME: float = 1.0
+    """Seconds of processing time worth of chunks to prefetch with adaptive prefetch.
+
+    This must cover the network round trip to the broker, otherwise the Sink runs out of
+    chunks before the next ones arrive."""
+
+    PREFETCH_MAX: int = 10_000
+    """Upper bound for adaptively chosen prefetch counts."""
+
+    PREFETCH_ADAPT_INTERVAL: float = 1.0
+    """Minimum number of seconds between adjustments of the prefetch count."""
+
+    SUBSCRIBE_PAGE_SIZE: int = 1000
+    """Maximum number of metrics per :code:`sink.subscribe` or :code:`sink.unsubscribe` RPC.
+
+    Larger lists of metrics are split into pages of this size,
+    which keeps the RPC messages small for Sinks with many metrics."""
+
+    SUBSCRIBE_CONCURRENCY: int = 4
+    """Maximum number of pages of metrics subscribed or unsubscribed at the same time."""
+
+    _PREFETCH_SMOOTHING = 0.1
+
+    def __init__(
+        self,
+        *args: Any,
+        add_uuid: bool = True,
+        prefetch_count: int = 400,
+        adaptive_prefetch: bool = False,
+        prefetch_memory_limit: Optional[int] = None,
+        ack_batch_size: Optional[int] = None,
+        ack_interval: float = 0.1,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        max_offloaded_chunks: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        cls = type(self)
+        if (
+            executor is None
+            and cls.on_data is Sink.on_data
+            and cls.on_data_chunk is Sink.on_data_chunk
+        ):
+            raise TypeError(
+                f"Can't instantiate {cls.__name__} without an implementation "
+                "of either on_data or on_data_chunk"
+            )
+        if executor is not None and cls.process_chunk is Sink.process_chunk:
+            raise TypeError(
+                f"Can't instantiate {cls.__name__} with an executor "
+                "without an implementation of process_chunk"
+            )
         super().__init__(*args, add_uuid=add_uuid, **kwargs)
+        self.executor = executor
+        if max_offloaded_chunks is None:
+            max_offloaded_chunks = 2 * (os.cpu_count() or 1)
+        if max_offloaded_chunks < 1:
+            raise ValueError(
+                f"max_offloaded_chunks must be positive, got {max_offloaded_chunks}"
+            )
+        self._offload_slots = Semaphore(max_offloaded_chunks)
+        self._batched_acks: Optional[_BatchedAcks] = None
+        if ack_batch_size is not None:
+            self._batched_acks = _BatchedAcks(
+                batch_size=ack_batch_size, interval=ack_interval
+            )
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        self.workers = workers
+        # Chunks waiting to be handled, for each metric that a worker handles or that
+        # waits in _ready_metrics.  This keeps chunks of a metric in order.
+        self._waiting_chunks: dict[
+            Metric, deque[aio_pika.abc.AbstractIncomingMessage]
+        ] = {}
+        self._ready_metrics: Queue[Metric] = Queue()
+        self._worker_tasks: list[Task[None]] = []
+        self._data_prefetch_count = self._check_prefetch_count(prefetch_count)
+        self.adaptive_prefetch = adaptive_prefetch
+        self.prefetch_memory_limit = prefetch_memory_limit
+
+        self.processing_time: Optional[float] = None
+        """Smoothed time in seconds to handle a data chunk, with adaptive prefetch."""
+        self.chunk_bytes: Optional[float] = None
+        """Smoothed size of received data chunks in bytes, with adaptive prefetch."""
+        self.outstanding_bytes = 0
+        """Total size of the data chunks currently being handled, in bytes."""
+        self._prefetch_adapted_at = time.monotonic()
+        self._prefetch_task: Optional[Task[None]] = None
 
         self._data_queue: Optional[aio_pika.abc.AbstractQueue] = None
         self._data_consumer_tag: Optional[str] = None
         self._subscribed_metrics: set[str] = set()
         self._subscribe_args: dict[str, Any] = dict()
         self._resubscribe_task: Optional[Task[None]] = None
+        self._reconnected_at: Optional[float] = None
+        self.reconnect_latency: Optional[float] = None
+        """Seconds from the last reconnect of the data connection until the first
+        data chunk arrived afterwards.
+        :literal:`None` until data arrived after a reconnect."""
 
     async def _declare_data_queue(self, name: str) -> None:
         assert self.data_channel is not None
@@ -73,13 +216,41 @@ class Sink(DataClient):
 
         assert self._data_queue is not None
 
+        if self.workers is not None and not self._worker_tasks:
+            self._worker_tasks = [
+                self._event_loop.create_task(self._data_worker())
+                for _ in range(self.workers)
+            ]
+
         logger.info("starting sink consume")
         self._data_consumer_tag = await self._data_queue.consume(self._on_data_message)
 
+    async def teardown(self) -> None:
+        """
+        .. Important::
+            Do not call this function, it is called indirectly by :meth:`Agent.stop`.
+
+        Stops the workers handling data chunks in addition to :meth:`DataClient.teardown()`.
+        Chunks that have not been handled yet are redelivered by the broker.
+        """
+        for task in self._worker_tasks:
+            task.cancel()
+        await gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._batched_acks is not None:
+            await self._batched_acks.flush()
+        await super().teardown()
+
     def _on_data_connection_reconnect(
         self, sender: Optional[aio_pika.abc.AbstractConnection]
     ) -> None:
         logger.info("Sink data connection ({}) reestablished!", sender)
+        self._reconnected_at = time.monotonic()
+
+        if self._batched_acks is not None:
+            # Delivery tags start over on the new channel, the broker redelivers
+            # everything that was not acknowledged on the old one.
+            self._batched_acks.reset()
 
         if self._resubscribe_task is not None and not self._resubscribe_task.done():
             logger.warning(
@@ -111,15 +282,19 @@ class Sink(DataClient):
         # Reuse manager-assigned data queue name for resubscription.
         self._subscribe_args.update(dataQueue=self._data_queue.name)
 
-        metrics = tuple(self._subscribed_metrics)
+        metrics = list(self._subscribed_metrics)
         logger.info(
             "Resubscribing to {} metric(s) with RPC parameters {}...",
             len(metrics),
             self._subscribe_args,
         )
-        response = await self.rpc(
-            "sink.subscribe", metrics=metrics, **self._subscribe_args
+        # The metadata was returned by the original subscription already.
+        responses = await self._rpc_pages(
+            "sink.subscribe",
+            self._pages(metrics),
+            **{**self._subscribe_args, "metadata": False},
         )
+        response = responses[0]
         assert response is not None
         await self._declare_data_queue(response["dataQueue"])
 
@@ -137,6 +312,9 @@ class Sink(DataClient):
     ) -> JsonDict:
         """Subscribe to a list of metrics.
 
+        Metrics are subscribed in pages of :attr:`SUBSCRIBE_PAGE_SIZE`,
+        the same applies to :meth:`unsubscribe` and to resubscribing after a reconnect.
+
         Args:
             metrics: names of the metrics to subscribe to
             expires: queue expiration time in seconds
@@ -145,7 +323,7 @@ class Sink(DataClient):
         Returns:
             rpc response
         """
-        metrics_list = list(metrics)
+        pages = self._pages(list(metrics))
 
         if self._data_queue is not None:
             kwargs.update(dataQueue=self._data_queue.name)
@@ -156,63 +334,330 @@ class Sink(DataClient):
         if metadata is not None:
             kwargs.update(metadata=metadata)
 
-        response = await self.rpc("sink.subscribe", metrics=metrics_list, **kwargs)
-        assert response is not None
-
-        self._subscribed_metrics.update(metrics_list)
-        # Save the subscription RPC args in case we need to resubscribe (after a reconnect).
-        self._subscribe_args = kwargs
+        def subscribed(page: list[Metric]) -> None:
+            self._subscribed_metrics.update(page)
+            # Save the subscription RPC args in case we need to resubscribe (after a reconnect).
+            self._subscribe_args = kwargs
 
+        responses: list[Optional[JsonDict]] = []
         if self._data_queue is None:
+            # The first page creates the data queue, the others need to reuse it.
+            response = await self.rpc("sink.subscribe", metrics=pages[0], **kwargs)
+            assert response is not None
+            subscribed(pages[0])
             await self.sink_config(**response)
-        return response
+            responses.append(response)
+            pages = pages[1:]
+            assert self._data_queue is not None
+            kwargs.update(dataQueue=self._data_queue.name)
+
+        responses += await self._rpc_pages(
+            "sink.subscribe",
+            pages,
+            **kwargs,
+            on_page=subscribed,
+        )
+        return _merge_subscribe_responses(responses)
 
     async def unsubscribe(self, metrics: Iterable[Metric]) -> None:
         assert self._data_queue
-        metrics_list = list(metrics)
-        await self.rpc(
-            "sink.unsubscribe", dataQueue=self._data_queue.name, metrics=metrics_list
+        await self._rpc_pages(
+            "sink.unsubscribe",
+            self._pages(list(metrics)),
+            dataQueue=self._data_queue.name,
+            on_page=self._subscribed_metrics.difference_update,
         )
 
-        self._subscribed_metrics.difference_update(metrics_list)
-
         # If we just unsubscribed from all metrics, reset the subscription args
         # to their defaults.
         if not self._subscribed_metrics:
             self._subscribe_args = dict()
 
+    def _pages(self, metrics: list[Metric]) -> list[list[Metric]]:
+        size = self.SUBSCRIBE_PAGE_SIZE
+        return [metrics[i : i + size] for i in range(0, len(metrics), size)] or [[]]
+
+    async def _rpc_pages(
+        self,
+        function: str,
+        pages: list[list[Metric]],
+        on_page: Optional[Callable[[list[Metric]], None]] = None,
+        **kwargs: Any,
+    ) -> list[Optional[JsonDict]]:
+        """Send an RPC for each page of metrics concurrently, return the responses in order.
+
+        :code:`on_page` is called with each page once its RPC succeeded.
+        """
+        concurrency = Semaphore(self.SUBSCRIBE_CONCURRENCY)
+
+        async def request(page: list[Metric]) -> Optional[JsonDict]:
+            async with concurrency:
+                response = await self.rpc(function, metrics=page, **kwargs)
+            if on_page is not None:
+                on_page(page)
+            return response
+
+        return await gather(*(request(page) for page in pages))
+
+    @property
+    def prefetch_count(self) -> int:
+        """Maximum number of data chunks delivered to this Sink before it acknowledged them.
+
+        Higher values increase throughput, especially over links with a high latency,
+        at the cost of memory for chunks that wait to be processed.
+        Use :meth:`set_prefetch_count` to change it.
+        """
+        return self._data_prefetch_count
+
+    async def set_prefetch_count(self, prefetch_count: int) -> None:
+        """Change :attr:`prefetch_count`, taking effect immediately if already connected.
+
+        Raises:
+            TypeError: if the value is not an integer
+            ValueError: if the value is not between 1 and 65535
+        """
+        self._data_prefetch_count = self._check_prefetch_count(prefetch_count)
+        if self.data_channel is not None:
+            logger.debug("setting prefetch count to {}", prefetch_count)
+            await self.data_channel.set_qos(prefetch_count=prefetch_count)
+
+    @staticmethod
+    def _check_prefetch_count(prefetch_count: int) -> int:
+        if not isinstance(prefetch_count, int):
+            raise TypeError(
+                f"prefetch_count must be an integer, got {type(prefetch_count).__name__}"
+            )
+        # prefetch-count is an unsigned short in AMQP, 0 would mean "unlimited"
+        if not 1 <= prefetch_count <= 0xFFFF:
+            raise ValueError(
+                f"prefetch_count must be between 1 and 65535, got {prefetch_count}"
+            )
+        return prefetch_count
+
+    def _observe_chunk(self, size: int, duration: float) -> None:
+        """Account for a handled chunk and adapt the prefetch count once per interval."""
+        if self.processing_time is None or self.chunk_bytes is None:
+            self.processing_time = duration
+            self.chunk_bytes = size
+        else:
+            self.processing_time += self._PREFETCH_SMOOTHING * (
+                duration - self.processing_time
+            )
+            self.chunk_bytes += self._PREFETCH_SMOOTHING * (size - self.chunk_bytes)
+
+        now = time.monotonic()
+        if now - self._prefetch_adapted_at < self.PREFETCH_ADAPT_INTERVAL:
+            return
+        if self._prefetch_task is not None and not self._prefetch_task.done():
+            return
+        self._prefetch_adapted_at = now
+
+        prefetch_count = self._adaptive_prefetch_count()
+        # Avoid a round trip to the broker for small changes
+        if abs(prefetch_count - self.prefetch_count) <= self.prefetch_count // 4:
+            return
+        self._prefetch_task = self._event_loop.create_task(
+            self._adapt_prefetch_count(prefetch_count)
+        )
+
+    def _adaptive_prefetch_count(self) -> int:
+        assert self.processing_time is not None and self.chunk_bytes is not None
+        prefetch_count = self.PREFETCH_MAX
+        if self.processing_time > 0:
+            prefetch_count = ceil(self.PREFETCH_BUFFER_TIME / self.processing_time)
+        if self.prefetch_memory_limit is not None and self.chunk_bytes > 0:
+            prefetch_count = min(
+                prefetch_count, int(self.prefetch_memory_limit / self.chunk_bytes)
+            )
+        return max(1, min(prefetch_count, self.PREFETCH_MAX, 0xFFFF))
+
+    async def _adapt_prefetch_count(self, prefetch_count: int) -> None:
+        logger.info(
+            "adapting prefetch count from {} to {} (processing time {:.3g}s, chunk size {:.0f} bytes)",
+            self.prefetch_count,
+            prefetch_count,
+            self.processing_time,
+            self.chunk_bytes,
+        )
+        try:
+            await self.set_prefetch_count(prefetch_count)
+        except Exception as e:
+            # The next adaption tries again.
+            logger.warning("Failed to adapt prefetch count: {}", e)
+
     async def _on_data_message(
         self, message: aio_pika.abc.AbstractIncomingMessage
     ) -> None:
-        async with message.process(requeue=True):
-            body = message.body
-            from_token = message.app_id
-            metric = message.routing_key
-            if metric is None:
-                logger.warning(
-                    "received data message without routing key from {}", from_token
-                )
-                return
-
-            logger.debug("received message from {}", from_token)
-            data_response = DataChunk()
-            data_response.ParseFromString(body)
-
-            await self._on_data_chunk(metric, data_response)
+        if self._reconnected_at is not None:
+            self.reconnect_latency = time.monotonic() - self._reconnected_at
+            self._reconnected_at = None
+            logger.info(
+                "Receiving data again {:.3f}s after reconnect", self.reconnect_latency
+            )
+        self.outstanding_bytes += len(message.body)
+        if self._batched_acks is not None:
+            self._batched_acks.deliver(message)
+        metric = message.routing_key
+        if self.workers is None or metric is None:
+            await self._handle_data_message(message)
+            return
+
+        waiting = self._waiting_chunks.get(metric)
+        if waiting is None:
+            self._waiting_chunks[metric] = deque((message,))
+            self._ready_metrics.put_nowait(metric)
+        else:
+            # A worker is busy with this metric, or it is ready already
+            waiting.append(message)
+
+    async def _data_worker(self) -> None:
+        while True:
+            metric = await self._ready_metrics.get()
+            waiting = self._waiting_chunks[metric]
+            try:
+                await self._handle_data_message(waiting.popleft())
+            except Exception as e:
+                # The chunk has been rejected and requeued, keep going with the next one
+                logger.error("Failed to handle data chunk of {}: {!r}", metric, e)
+
+            # Let other metrics take turns before handling the next chunk of this one
+            if waiting:
+                self._ready_metrics.put_nowait(metric)
+            else:
+                del self._waiting_chunks[metric]
+
+    async def _handle_data_message(
+        self, message: aio_pika.abc.AbstractIncomingMessage
+    ) -> None:
+        size = len(message.body)
+        started = time.monotonic()
+        try:
+            await self._process_data_message(message)
+        finally:
+            self.outstanding_bytes -= size
+        if self.adaptive_prefetch:
+            self._observe_chunk(size, time.monotonic() - started)
+
+    async def _process_data_message(
+        self, message: aio_pika.abc.AbstractIncomingMessage
+    ) -> None:
+        if self._batched_acks is None:
+            async with message.process(requeue=True):
+                await self._dispatch_data_message(message)
+            return
+
+        try:
+            await self._dispatch_data_message(message)
+        except BaseException:
+            await self._batched_acks.reject(message)
+            raise
+        self._batched_acks.settle(message)
+
+    async def _dispatch_data_message(
+        self, message: aio_pika.abc.AbstractIncomingMessage
+    ) -> None:
+        body = message.body
+        from_token = message.app_id
+        metric = message.routing_key
+        if metric is None:
+            logger.warning(
+                "received data message without routing key from {}", from_token
+            )
+            return
+
+        logger.debug("received message from {}", from_token)
+        if self.executor is not None:
+            await self._offload_chunk(metric, body)
+            return
+
+        if type(self)._on_data_chunk is Sink._on_data_chunk:
+            timestamps, values = datachunk_codec.decode(body)
+            await self.on_data_chunk(metric, timestamps, values)
+            return
+
+        data_response = DataChunk()
+        data_response.ParseFromString(body)
+
+        await self._on_data_chunk(metric, data_response)
+
+    async def _offload_chunk(self, metric: Metric, body: bytes) -> None:
+        assert self.executor is not None
+        # The serialized chunk is much cheaper to pass to another process than arrays,
+        # so it is only decoded by the executor.
+        async with self._offload_slots:
+            result = await get_running_loop().run_in_executor(
+                self.executor,
+                _process_serialized_chunk,
+                type(self).process_chunk,
+                metric,
+                body,
+            )
+        await self.on_processed_chunk(metric, result)
+
+    @staticmethod
+    def process_chunk(
+        metric: Metric, timestamps: "array[int]", values: "array[float]"
+    ) -> Any:
+        """Process a chunk of data points in the :code:`executor` passed to the Sink.
+
+        Override this (as a :func:`staticmethod`) to offload expensive processing from the event loop.
+        Instantiating a Sink with an :code:`executor` that does not override this raises a :class:`TypeError`.
+        For a :class:`~concurrent.futures.ProcessPoolExecutor`, this runs in another process,
+        so it has no access to the Sink and its return value must be picklable.
+
+        Args:
+            metric: name of the metric for which new data points arrived
+            timestamps: absolute timepoints of the data points, in nanoseconds since the epoch (``int64``)
+            values: values of the data points (``float64``)
+
+        Returns:
+            A result that is passed to :meth:`on_processed_chunk`.
+        """
+
+    async def on_processed_chunk(self, metric: Metric, result: Any) -> None:
+        """A Callback that is invoked on the event loop with the result of :meth:`process_chunk`.
+
+        The chunk is acknowledged once this returns.
+        The default implementation does nothing.
+
+        Args:
+            metric: name of the metric for which the chunk was processed
+            result: the return value of :meth:`process_chunk`
+        """
 
     async def _on_data_chunk(self, metric: Metric, data_chunk: DataChunk) -> None:
         """Only override this if absolutely necessary for performance"""
-        last_timed = 0
-        zipped_tv = zip(data_chunk.time_delta, data_chunk.value)
-        for time_delta, value in zipped_tv:
-            last_timed += time_delta
-            await self.on_data(metric, Timestamp(last_timed), value)
+        timestamps = array("q", accumulate(data_chunk.time_delta))
+        values = array("d", data_chunk.value)
+        await self.on_data_chunk(metric, timestamps, values)
+
+    async def on_data_chunk(
+        self, metric: Metric, timestamps: "array[int]", values: "array[float]"
+    ) -> None:
+        """A Callback that is invoked once for every chunk of data points received for any of the metrics this client is subscribed to.
+
+        The default implementation calls :meth:`on_data` for every data point in the chunk.
+        User-defined :term:`Sinks<Sink>` that handle many data points per second can override
+        this method instead of :meth:`on_data` to process a whole chunk at once,
+        avoiding a coroutine call and a :class:`Timestamp` object per data point.
+
+        Both arrays are contiguous buffers of the same length and can be wrapped
+        without copying, e.g. using :func:`numpy.frombuffer`.
+
+        Args:
+            metric: name of the metric for which new data points arrived
+            timestamps: absolute timepoints of the data points, in nanoseconds since the epoch (``int64``)
+            values: values of the data points (``float64``)
+        """
+        for timestamp, value in zip(timestamps, values):
+            await self.on_data(metric, Timestamp(timestamp), value)
 
-    @abstractmethod
     async def on_data(self, metric: Metric, timestamp: Timestamp, value: float) -> None:
         """A Callback that is invoked for every data point received for any of the metrics this client is subscribed to.
 
-        User-defined :term:`Sinks<Sink>` need to override this method to handle incoming data points.
+        User-defined :term:`Sinks<Sink>` need to override this method to handle incoming data points,
+        unless they override :meth:`on_data_chunk`.
+        Instantiating a Sink that overrides neither raises a :class:`TypeError`.
 
         Args:
             metric: name of the metric for which a new data point arrived
@@ -221,6 +666,138 @@ class Sink(DataClient):
         """
 
 
+def _process_serialized_chunk(
+    process_chunk: Callable[[Metric, "array[int]", "array[float]"], Any],
+    metric: Metric,
+    body: bytes,
+) -> Any:
+    timestamps, values = datachunk_codec.decode(body)
+    return process_chunk(metric, timestamps, values)
+
+
+def _merge_subscribe_responses(responses: list[Optional[JsonDict]]) -> JsonDict:
+    """Combine the responses to the pages of a :code:`sink.subscribe` RPC."""
+    merged = responses[0]
+    assert merged is not None
+    if len(responses) == 1:
+        return merged
+
+    merged = dict(merged)
+    metrics = merged.get("metrics")
+    if isinstance(metrics, dict):
+        metrics = dict(metrics)
+        for response in responses[1:]:
+            assert response is not None
+            metrics.update(response["metrics"])
+    elif isinstance(metrics, list):
+        metrics = list(metrics)
+        for response in responses[1:]:
+            assert response is not None
+            metrics.extend(response["metrics"])
+    merged["metrics"] = metrics
+    return merged
+
+
+class _BatchedAcks:
+    """Acknowledge handled messages in batches using :code:`basic.ack` with :code:`multiple=True`.
+
+    A multiple-ack acknowledges *all* outstanding deliveries up to its delivery tag,
+    so it is only sent for the longest prefix of deliveries that have all been settled,
+    even if handling finishes out of order.
+    """
+
+    def __init__(self, batch_size: int, interval: float):
+        if batch_size < 1:
+            raise ValueError(f"ack_batch_size must be positive, got {batch_size}")
+        if interval <= 0:
+            raise ValueError(f"ack_interval must be positive, got {interval}")
+        self.batch_size = batch_size
+        self.interval = interval
+        # Unsettled deliveries and those settled after them, in delivery order.
+        # Settled deliveries map to whether they are to be acknowledged.
+        self._deliveries: OrderedDict[
+            aio_pika.abc.AbstractIncomingMessage, Optional[bool]
+        ] = OrderedDict()
+        # Last message of the settled prefix that has not been acknowledged yet
+        self._ackable: Optional[aio_pika.abc.AbstractIncomingMessage] = None
+        self._unacked = 0
+        self._timer: Optional[TimerHandle] = None
+        self._ack_tasks: set[Task[None]] = set()
+
+    def deliver(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        self._deliveries[message] = None
+
+    def settle(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        """Mark a message as handled, acknowledging it with the next batch."""
+        self._settle(message, ack=True)
+
+    async def reject(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        """Reject and requeue a message that failed to be handled."""
+        try:
+            # This must happen before a later multiple-ack includes the message
+            await message.nack(requeue=True)
+        finally:
+            self._settle(message, ack=False)
+
+    def _settle(self, message: aio_pika.abc.AbstractIncomingMessage, ack: bool) -> None:
+        if message not in self._deliveries:
+            # Delivered on a previous channel, or not a data message
+            return
+        self._deliveries[message] = ack
+
+        while self._deliveries:
+            delivered, settled = next(iter(self._deliveries.items()))
+            if settled is None:
+                break
+            self._deliveries.popitem(last=False)
+            if settled:
+                self._ackable = delivered
+                self._unacked += 1
+
+        if self._unacked >= self.batch_size:
+            self._ack()
+        elif self._ackable is not None and self._timer is None:
+            self._timer = get_running_loop().call_later(self.interval, self._ack)
+
+    def _ack(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._ackable is None:
+            return
+        task = get_running_loop().create_task(
+            self._send_ack(self._ackable, self._unacked)
+        )
+        self._ack_tasks.add(task)
+        task.add_done_callback(self._ack_tasks.discard)
+        self._ackable = None
+        self._unacked = 0
+
+    @staticmethod
+    async def _send_ack(
+        message: aio_pika.abc.AbstractIncomingMessage, count: int
+    ) -> None:
+        try:
+            await message.ack(multiple=True)
+        except Exception as e:
+            # The broker redelivers these messages once the channel is closed
+            logger.warning("Failed to acknowledge {} data message(s): {}", count, e)
+
+    async def flush(self) -> None:
+        """Acknowledge the settled messages right away."""
+        self._ack()
+        await gather(*self._ack_tasks)
+
+    def reset(self) -> None:
+        """Forget all deliveries, they belong to a channel that has been closed."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._deliveries.clear()
+        self._ackable = None
+        self._unacked = 0
+
+
 class DurableSink(Sink):
     """
     A base class for user-defined :term:`Sinks<Sink>` that uses a configuration.
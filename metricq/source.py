@@ -29,8 +29,12 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import asyncio
+import os
+import time
 from abc import abstractmethod
-from collections.abc import Mapping
+from collections.abc import Iterable, Mapping
+from heapq import heappop, heappush
+from itertools import count
 from typing import Any, Optional, cast
 
 import aio_pika
@@ -40,7 +44,16 @@ from .datachunk_pb2 import DataChunk
 from .exceptions import PublishFailed
 from .logging import get_logger
 from .rpc import rpc_handler
-from .source_metric import ChunkSize, SourceMetric
+from .source_metric import (
+    BufferLimit,
+    BufferPolicy,
+    ChunkDuration,
+    ChunkSize,
+    MessageRate,
+    SourceMetric,
+    _BufferUsage,
+)
+from .spool import Spool
 from .timeseries import MetadataDict, Metric, Timestamp
 
 logger = get_logger(__name__)
@@ -50,6 +63,36 @@ class Source(DataClient):
     """A MetricQ :term:`Source`.
 
     See :ref:`source-how-to` on how to implement a new Source.
+
+    Args:
+        spool:
+            Write chunks that cannot be published to disk instead of keeping them in memory,
+            given as a directory or a :class:`~metricq.spool.Spool`.
+            Spooled chunks survive restarts of the Source and are replayed in order once
+            the data connection is (re-)established.
+            A chunk may be replayed again if the Source stops right after replaying it,
+            see :class:`~metricq.spool.Spool`.
+            While chunks are spooled, new chunks are spooled as well to keep them in order.
+        spool_replay_rate:
+            Maximum number of spooled chunks published per second,
+            or :literal:`None` to replay as fast as possible.
+        reliable:
+            Publish chunks with `publisher confirms <https://www.rabbitmq.com/confirms.html>`_
+            and retry chunks that the broker rejected or did not confirm in time.
+            Sending does not wait for each confirmation, instead up to :code:`confirm_window`
+            chunks may be unconfirmed at any time.
+            Use :meth:`flush` to wait until all chunks are confirmed.
+            Chunks are delivered at least once: a chunk that was received by the broker,
+            but whose confirmation got lost, is published again, and retried chunks may
+            arrive after chunks that were sent later.
+            With a :code:`spool`, such chunks are spooled instead of retried directly,
+            and so are all following chunks until the spool is replayed.
+            See :attr:`confirm_latency` and :attr:`republished_chunks`.
+        confirm_window:
+            Maximum number of unconfirmed chunks in reliable mode.
+            Once reached, sending blocks until the oldest chunks are confirmed.
+        confirm_timeout:
+            Seconds to wait for a confirmation in reliable mode before publishing a chunk again.
     """
 
     chunk_size: Optional[int] = cast(Optional[int], ChunkSize())
@@ -76,18 +119,183 @@ class Source(DataClient):
         ValueError: if value set not a positive, non-zero integer
     """
 
+    chunk_max_age = ChunkDuration()
+    """Maximum age of the oldest :term:`data point<Data Point>` in a chunk *(per metric)* before the chunk is sent.
+
+    This can be overriden for individual metrics, just like :attr:`chunk_size`:
+
+        .. code-block:: python
+
+            source = Source(...)
+            source.chunk_size = 1000
+            source.chunk_max_age = 1.5
+            source["example.metric"].chunk_max_age = Timedelta.from_ms(100)
+
+    Chunks are sent once they are full (see :attr:`chunk_size`) or once the first data point
+    added to them is older than this value, whichever comes first.
+    This bounds the latency of slow metrics, while large chunk sizes keep the overhead low for fast ones.
+    Values are given as a :class:`Timedelta` or as a number of seconds.
+
+    Initially, this value is set to :literal:`None`, so chunks are only sent once they are full.
+
+    Raises:
+        TypeError: if value set is neither :literal:`None`, a :class:`Timedelta` nor a number
+        ValueError: if value set is not positive
+    """
+
+    chunk_target_latency = ChunkDuration()
+    """Target latency *(per metric)* for adaptive chunking.
+
+    Setting this (or :attr:`chunk_max_message_rate`) enables adaptive chunking:
+    instead of using a fixed :attr:`chunk_size`, each metric measures the rate at which
+    :term:`data points<Data Point>` are sent and picks the largest chunk size that is filled
+    within this duration.
+    Chunks of metrics that slow down are still sent after this duration, unless
+    :attr:`chunk_max_age` is set explicitly.
+
+    Like :attr:`chunk_size`, this can be overriden for individual metrics:
+
+        .. code-block:: python
+
+            source = Source(...)
+            source.chunk_target_latency = 1.0
+            source.chunk_max_message_rate = 10
+            source["example.slow-metric"].chunk_target_latency = None
+
+    The chosen chunk sizes are announced as :code:`chunkSize` metadata.
+    Metrics declared via :meth:`declare_metrics` are re-declared in the background
+    whenever their chunk size changed considerably.
+
+    Values are given as a :class:`Timedelta` or as a number of seconds.
+    Initially, this value is set to :literal:`None`.
+
+    Raises:
+        TypeError: if value set is neither :literal:`None`, a :class:`Timedelta` nor a number
+        ValueError: if value set is not positive
+    """
+
+    chunk_max_message_rate = MessageRate()
+    """Maximum number of chunks sent per second *(per metric)* for adaptive chunking.
+
+    If set, adaptively chosen chunk sizes are increased so that no more than this many
+    chunks per second are sent for any metric, taking precedence over :attr:`chunk_target_latency`.
+    Setting only this value also enables adaptive chunking.
+
+    Initially, this value is set to :literal:`None`.
+
+    Raises:
+        TypeError: if value set is neither :literal:`None` nor a number
+        ValueError: if value set is not positive
+    """
+
+    metric_buffer_limit = BufferLimit()
+    """Maximum number of :term:`data points<Data Point>` buffered *(per metric)* while they cannot be sent.
+
+    Data points are buffered until their chunk is sent, and remain buffered if sending fails,
+    e.g. while the connection to the network is down.
+    To bound the memory used for buffering, set this and/or :attr:`buffer_limit`,
+    and choose what to do once a limit is reached with :attr:`buffer_policy`.
+    Like :attr:`chunk_size`, this can be overriden for individual metrics:
+
+        .. code-block:: python
+
+            source = Source(...)
+            source.buffer_limit = 10_000_000
+            source.metric_buffer_limit = 100_000
+            source.buffer_policy = BufferPolicy.DROP_OLDEST
+            source["example.important"].buffer_policy = BufferPolicy.BLOCK
+
+    The number of dropped data points is reported by :attr:`dropped_points`
+    and per metric by :attr:`SourceMetric.dropped_points`.
+    Initially, this value is set to :literal:`None`, so buffers are unbounded.
+
+    Raises:
+        TypeError: if value set is neither :literal:`None` nor an integer
+        ValueError: if value set not a positive, non-zero integer
+    """
+
+    buffer_policy: BufferPolicy
+    """What to do with new data points *(per metric)* once a buffer limit is reached,
+    see :class:`BufferPolicy` and :attr:`metric_buffer_limit`.
+
+    Initially, this is set to :attr:`BufferPolicy.BLOCK`.
+    """
+
+    SPOOL_RETRY_INTERVAL: float = 1.0
+    """Seconds to wait before retrying to publish a spooled chunk after a failure."""
+
+    CONFIRM_RETRY_INTERVAL: float = 1.0
+    """Seconds to wait before publishing a chunk again that was rejected or not confirmed in reliable mode."""
+
+    _CONFIRM_LATENCY_SMOOTHING = 0.1
+
+    chunk_size_redeclare_interval: float = 60.0
+    """Minimum number of seconds between re-declarations of metrics whose
+    :attr:`chunk_size` was changed by adaptive chunking."""
+
     task_stop_future: Optional[asyncio.Future[None]] = None
     """
     This future indicates when the task should be stopped.
     The result is meaningless (``None``).
     """
 
-    def __init__(self, *args: Any, **kwargs: Any):
+    def __init__(
+        self,
+        *args: Any,
+        spool: Optional[str | os.PathLike[str] | Spool] = None,
+        spool_replay_rate: Optional[float] = 1000.0,
+        reliable: bool = False,
+        confirm_window: int = 100,
+        confirm_timeout: float = 30.0,
+        **kwargs: Any,
+    ):
         super().__init__(*args, **kwargs)
+        if confirm_window < 1:
+            raise ValueError(f"confirm_window must be positive, got {confirm_window}")
+        if confirm_timeout <= 0:
+            raise ValueError(f"confirm_timeout must be positive, got {confirm_timeout}")
+        self.reliable = reliable
+        self._data_publisher_confirms = reliable
+        self.confirm_window = confirm_window
+        self.confirm_timeout = confirm_timeout
+        self._confirm_window = asyncio.Semaphore(confirm_window)
+        # Chunks published in reliable mode that are not confirmed yet, in publish order
+        self._unconfirmed: dict[asyncio.Task[None], tuple[str, bytes]] = {}
+        self.confirm_latency: Optional[float] = None
+        """Smoothed time in seconds from publishing a chunk until the broker confirmed it,
+        in reliable mode.
+        :literal:`None` until the first chunk is confirmed."""
+        self.republished_chunks = 0
+        """Number of chunks published again in reliable mode, because the broker rejected
+        them or did not confirm them in time."""
+
+        self.spool: Optional[Spool] = (
+            spool if spool is None or isinstance(spool, Spool) else Spool(spool)
+        )
+        self.spool_replay_rate = spool_replay_rate
+        self._spool_replay_task: Optional[asyncio.Task[None]] = None
         self.metrics: dict[str, SourceMetric] = dict()
         self.chunk_size = 1
+        self.chunk_max_age = None
+        self.chunk_target_latency = None
+        self.chunk_max_message_rate = None
+        self.metric_buffer_limit = None
+        self.buffer_policy = BufferPolicy.BLOCK
+        self._buffer_usage = _BufferUsage()
         self._task: Optional[asyncio.Task[None]] = None
 
+        self._flush_deadlines: list[tuple[float, int, SourceMetric]] = []
+        self._flush_deadline_counter = count()
+        self._flush_deadlines_changed = asyncio.Event()
+        self._chunk_flusher_task: Optional[asyncio.Task[None]] = None
+
+        # User-supplied metadata of declared metrics and the chunk sizes announced
+        # for them, for those that did not set chunkSize explicitly.
+        self._declared_metadata: dict[Metric, MetadataDict] = {}
+        self._declared_chunk_sizes: dict[Metric, Optional[int]] = {}
+        self._redeclare_metrics: set[Metric] = set()
+        self._redeclare_task: Optional[asyncio.Task[None]] = None
+
     async def connect(self) -> None:
         await super().connect()
         response = await self.rpc("source.register")
@@ -104,8 +312,11 @@ class Source(DataClient):
         if "config" in response:
             await self.rpc_dispatch("config", **response["config"])
 
+        self._replay_spool()
+
         self.task_stop_future = asyncio.Future()
         self._task = self._event_loop.create_task(self.task())
+        self._chunk_flusher_task = self._event_loop.create_task(self._chunk_flusher())
 
     @abstractmethod
     async def task(self) -> None:
@@ -133,20 +344,74 @@ class Source(DataClient):
         self.task_stop_future.set_result(None)
         # Wait for the task to complete before actually closing the connections etc.
         await self._task
+        if self._chunk_flusher_task is not None:
+            self._chunk_flusher_task.cancel()
+            await asyncio.gather(self._chunk_flusher_task, return_exceptions=True)
+        if self._redeclare_task is not None:
+            self._redeclare_task.cancel()
+            await asyncio.gather(self._redeclare_task, return_exceptions=True)
+        if self._spool_replay_task is not None:
+            self._spool_replay_task.cancel()
+            await asyncio.gather(self._spool_replay_task, return_exceptions=True)
+        await self._abandon_unconfirmed()
         await super().teardown()
+        if self.spool is not None:
+            self.spool.close()
 
     def __getitem__(self, id: Metric) -> SourceMetric:
         if id not in self.metrics:
-            self.metrics[id] = SourceMetric(id, self, chunk_size=self.chunk_size)
+            self.metrics[id] = SourceMetric(
+                id,
+                self,
+                chunk_size=self.chunk_size,
+                chunk_max_age=self.chunk_max_age,
+                chunk_target_latency=self.chunk_target_latency,
+                chunk_max_message_rate=self.chunk_max_message_rate,
+                buffer_limit=self.metric_buffer_limit,
+                buffer_policy=self.buffer_policy,
+                buffer_usage=self._buffer_usage,
+            )
         return self.metrics[id]
 
+    @property
+    def buffer_limit(self) -> Optional[int]:
+        """Maximum number of :term:`data points<Data Point>` buffered by this Source across all metrics.
+
+        See :attr:`metric_buffer_limit`.
+        Initially, this value is set to :literal:`None`, so buffers are unbounded.
+
+        Raises:
+            TypeError: if value set is neither :literal:`None` nor an integer
+            ValueError: if value set not a positive, non-zero integer
+        """
+        return self._buffer_usage.limit
+
+    @buffer_limit.setter
+    def buffer_limit(self, limit: Optional[int]) -> None:
+        self._buffer_usage.limit = limit
+
+    @property
+    def buffered_points(self) -> int:
+        """Number of :term:`data points<Data Point>` currently buffered across all metrics."""
+        return self._buffer_usage.points
+
+    @property
+    def dropped_points(self) -> int:
+        """Number of :term:`data points<Data Point>` dropped across all metrics because a buffer limit was reached."""
+        return sum(metric.dropped_points for metric in self.metrics.values())
+
+    @property
+    def unconfirmed_chunks(self) -> int:
+        """Number of chunks published in reliable mode that the broker has not confirmed yet."""
+        return len(self._unconfirmed)
+
     def _augment_metadata(
         self, metrics: Mapping[Metric, MetadataDict]
     ) -> dict[Metric, MetadataDict]:
         # Do not modify the user-supplied metadata.  The user expects this to
         # be a read-only parameter, modifying it without their consent could
         # lead to surprises.
-        augmented = dict(metrics)
+        augmented = {metric: dict(metadata) for metric, metadata in metrics.items()}
         for metric, metadata in augmented.items():
             # If a SourceMetric has a chunk_size of 0, chunking is disabled.
             metadata.setdefault("chunkSize", self[metric].chunk_size)
@@ -187,10 +452,17 @@ class Source(DataClient):
                             },
                         })
         """
-        metrics = self._augment_metadata(metrics=metrics)
+        augmented = self._augment_metadata(metrics=metrics)
 
-        logger.debug("declare_metrics({})", metrics)
-        await self.rpc("source.declare_metrics", metrics=metrics)
+        logger.debug("declare_metrics({})", augmented)
+        await self.rpc("source.declare_metrics", metrics=augmented)
+
+        for metric, metadata in metrics.items():
+            self._declared_metadata[metric] = dict(metadata)
+            if "chunkSize" in metadata:
+                self._declared_chunk_sizes.pop(metric, None)
+            else:
+                self._declared_chunk_sizes[metric] = augmented[metric]["chunkSize"]
 
     async def send(self, metric: str, time: Timestamp, value: float) -> None:
         """Send a :term:`data point<Data Point>` for a Metric.
@@ -221,13 +493,132 @@ class Source(DataClient):
         assert metric_object is not None
         await metric_object.send(time, value)
 
+    async def send_many(
+        self, metric: str, timestamps: Iterable[int], values: Iterable[float]
+    ) -> None:
+        """Send many :term:`data points<Data Point>` for a Metric at once.
+
+        This avoids the per-point overhead of :meth:`send`, no :class:`Timestamp` objects are created.
+        Data points are split into chunks according to :attr:`chunk_size`.
+
+        Args:
+            metric: name of a metric
+            timestamps:
+                POSIX timestamps in nanoseconds, e.g. a sequence of :code:`int` or
+                a NumPy array of dtype :code:`int64`
+            values:
+                values at the respective timestamps, e.g. a sequence of :code:`float` or
+                a NumPy array of dtype :code:`float64`
+
+        Raises:
+            ValueError: if the number of timestamps and values differs
+            PublishFailed: if sending a chunk failed
+
+        Warning:
+            As with :meth:`send`, data points of a failed call remain buffered and
+            must not be sent again.
+        """
+        logger.debug("send_many({}, ...)", metric)
+        await self[metric].send_many(timestamps, values)
+
     async def flush(self) -> None:
         """Flush all unsent data points to the network immediately.
 
         If automatic chunking is turned off (:attr:`chunk_size` is :literal:`None`),
         use this method to send data points.
+
+        In reliable mode, this also waits until the broker confirmed all chunks sent so far.
         """
         await asyncio.gather(*[m.flush() for m in self.metrics.values() if not m.empty])
+        if self._unconfirmed:
+            await asyncio.wait(list(self._unconfirmed))
+
+    def _schedule_chunk_flush(self, metric: SourceMetric, deadline: float) -> None:
+        """Flush the chunk of a metric at the given :func:`time.monotonic` deadline.
+
+        Don't call from anywhere other than SourceMetric.
+
+        :meta private:
+        """
+        if not self._flush_deadlines or deadline < self._flush_deadlines[0][0]:
+            # The chunk flusher is sleeping until a later deadline, wake it up.
+            self._flush_deadlines_changed.set()
+        heappush(
+            self._flush_deadlines,
+            (deadline, next(self._flush_deadline_counter), metric),
+        )
+
+    async def _chunk_flusher(self) -> None:
+        """Background task that sends chunks once their oldest data point exceeds :attr:`chunk_max_age`."""
+        while True:
+            now = time.monotonic()
+            expired: list[SourceMetric] = []
+            while self._flush_deadlines and self._flush_deadlines[0][0] <= now:
+                deadline, _, metric = heappop(self._flush_deadlines)
+                # Skip deadlines of chunks that have been sent in the meantime
+                if metric._flush_deadline == deadline:
+                    expired.append(metric)
+
+            if expired:
+                await asyncio.gather(*(self._flush_expired(m) for m in expired))
+                continue
+
+            timeout = (
+                self._flush_deadlines[0][0] - now if self._flush_deadlines else None
+            )
+            self._flush_deadlines_changed.clear()
+            try:
+                await asyncio.wait_for(
+                    self._flush_deadlines_changed.wait(), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush_expired(self, metric: SourceMetric) -> None:
+        logger.debug("flushing chunk of {} after exceeding its maximum age", metric.id)
+        try:
+            await metric.flush()
+        except Exception as e:
+            # The data points remain buffered and the flush is rescheduled.
+            # Any error must be caught here, otherwise the chunk flusher stops.
+            logger.warning("Failed to flush chunk of {}: {}", metric.id, e)
+
+    def _on_chunk_size_changed(self, metric: SourceMetric) -> None:
+        """Re-declare a metric once adaptive chunking changed its chunk size considerably.
+
+        Don't call from anywhere other than SourceMetric.
+
+        :meta private:
+        """
+        if metric.id not in self._declared_chunk_sizes:
+            # Not declared yet, or chunkSize was given explicitly
+            return
+
+        declared = self._declared_chunk_sizes[metric.id]
+        if declared is not None and declared / 2 <= metric.chunk_size <= declared * 2:
+            return
+
+        self._redeclare_metrics.add(metric.id)
+        if self._redeclare_task is None or self._redeclare_task.done():
+            self._redeclare_task = self._event_loop.create_task(
+                self._redeclare_chunk_sizes()
+            )
+
+    async def _redeclare_chunk_sizes(self) -> None:
+        # Changes of many metrics are batched into a single declaration.
+        await asyncio.sleep(self.chunk_size_redeclare_interval)
+
+        metrics = {
+            metric: self._declared_metadata[metric]
+            for metric in self._redeclare_metrics
+        }
+        self._redeclare_metrics.clear()
+        logger.debug("re-declaring {} metric(s) with new chunk sizes", len(metrics))
+        try:
+            await self.declare_metrics(metrics)
+        except Exception as e:
+            # Declared chunk sizes are unchanged, the next adaption tries again.
+            logger.warning("Failed to re-declare chunk sizes: {}", e)
 
     async def _send(self, metric: str, data_chunk: DataChunk) -> None:
         """Actually send a chunk (publish a data message).
@@ -239,13 +630,110 @@ class Source(DataClient):
 
         :meta private:
         """
-        msg = aio_pika.Message(data_chunk.SerializeToString())
+        body = data_chunk.SerializeToString()
+        if self.spool is None:
+            await self._data_connection_watchdog.established()
+            await self._publish_chunk(metric, body)
+            return
+
+        if not self.spool and self._data_connection_watchdog.is_established:
+            try:
+                await self._publish_chunk(metric, body)
+                return
+            except PublishFailed as e:
+                logger.warning("Spooling chunk of {}: {}", metric, e)
+
+        # Keep chunks in order: once spooled, everything is spooled until replayed.
+        self.spool.append(metric, body)
+        self._replay_spool()
+
+    async def _publish_chunk(self, metric: str, body: bytes) -> None:
+        """Publish a serialized chunk, without waiting for its confirmation in reliable mode.
+
+        Raises:
+            PublishFailed
+        """
+        if not self.reliable:
+            await self._publish(metric, body)
+            return
+
+        # Blocks once the window of unconfirmed chunks is full
+        await self._confirm_window.acquire()
+        task = self._event_loop.create_task(self._publish_confirmed(metric, body))
+        self._unconfirmed[task] = (metric, body)
+        task.add_done_callback(self._on_confirmed)
+
+    async def _publish_confirmed(self, metric: str, body: bytes) -> None:
+        """Publish a serialized chunk until the broker confirms it, or spool it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            published = loop.time()
+            try:
+                await self._publish(metric, body)
+            except PublishFailed as e:
+                if self.spool is not None:
+                    # The spool retries instead, keeping the chunk across restarts.
+                    logger.warning("Spooling chunk of {}: {}", metric, e)
+                    self.spool.append(metric, body)
+                    self._replay_spool()
+                    return
+                logger.warning("Publishing chunk of {} again: {}", metric, e)
+                self.republished_chunks += 1
+                await asyncio.sleep(self.CONFIRM_RETRY_INTERVAL)
+                await self._data_connection_watchdog.established()
+                continue
+
+            latency = loop.time() - published
+            if self.confirm_latency is None:
+                self.confirm_latency = latency
+            else:
+                self.confirm_latency += self._CONFIRM_LATENCY_SMOOTHING * (
+                    latency - self.confirm_latency
+                )
+            return
+
+    def _on_confirmed(self, task: asyncio.Task[None]) -> None:
+        del self._unconfirmed[task]
+        self._confirm_window.release()
+
+    async def _abandon_unconfirmed(self) -> None:
+        """Give unconfirmed chunks a last chance to be confirmed, then spool or drop them."""
+        if not self._unconfirmed:
+            return
+        await asyncio.wait(list(self._unconfirmed), timeout=self.confirm_timeout)
+        if not self._unconfirmed:
+            return
+
+        unconfirmed = list(self._unconfirmed.items())
+        for task, _ in unconfirmed:
+            task.cancel()
+        await asyncio.gather(*(task for task, _ in unconfirmed), return_exceptions=True)
+        if self.spool is not None:
+            logger.warning("Spooling {} unconfirmed chunks", len(unconfirmed))
+            for _, (metric, body) in unconfirmed:
+                self.spool.append(metric, body)
+        else:
+            logger.error("Giving up on {} unconfirmed chunks", len(unconfirmed))
+
+    async def _publish(self, metric: str, body: bytes) -> None:
+        """Publish a serialized chunk on the data exchange.
+
+        In reliable mode, this waits for the confirmation of the broker.
+
+        Raises:
+            PublishFailed
+        """
+        msg = aio_pika.Message(body)
         assert self.data_exchange is not None
-        await self._data_connection_watchdog.established()
         try:
             # TOC/TOU hazard: by the time we publish, the data connection might
             # be gone again, even if we waited for it to be established before.
-            await self.data_exchange.publish(msg, routing_key=metric, mandatory=False)
+            await self.data_exchange.publish(
+                msg,
+                routing_key=metric,
+                mandatory=False,
+                timeout=self.confirm_timeout if self.reliable else None,
+            )
         except aio_pika.exceptions.ChannelInvalidStateError as e:
             # Trying to publish on a closed channel results in a ChannelInvalidStateError
             # from aiormq.  Let's wrap that in a more descriptive error.
@@ -253,6 +741,53 @@ class Source(DataClient):
                 f"Failed to publish data chunk for metric '{metric!r}' "
                 f"on exchange '{self.data_exchange}' ({self.data_connection})"
             ) from e
+        except aio_pika.exceptions.DeliveryError as e:
+            raise PublishFailed(
+                f"Broker rejected data chunk for metric '{metric!r}'"
+            ) from e
+        except (aio_pika.exceptions.AMQPError, asyncio.TimeoutError) as e:
+            # Only raised while waiting for confirmations: the channel was closed
+            # before the broker confirmed the chunk, or the confirmation timed out.
+            raise PublishFailed(
+                f"Broker did not confirm data chunk for metric '{metric!r}': {e!r}"
+            ) from e
+
+    def _on_data_connection_reconnect(
+        self, sender: Optional[aio_pika.abc.AbstractConnection]
+    ) -> None:
+        super()._on_data_connection_reconnect(sender)
+        self._replay_spool()
+
+    def _replay_spool(self) -> None:
+        """Start replaying spooled chunks, unless already in progress."""
+        if not self.spool or self.data_exchange is None:
+            return
+        if self._spool_replay_task is None or self._spool_replay_task.done():
+            self._spool_replay_task = self._event_loop.create_task(self._spool_replay())
+
+    async def _spool_replay(self) -> None:
+        assert self.spool is not None
+        logger.info("Replaying {} spooled chunks", len(self.spool))
+        loop = asyncio.get_running_loop()
+        next_publish = loop.time()
+        while self.spool:
+            await self._data_connection_watchdog.established()
+            metric, body = self.spool.peek()
+            try:
+                await self._publish(metric, body)
+            except PublishFailed as e:
+                # Wait for the connection to be reported as closed and reestablished
+                logger.warning("Failed to replay spooled chunk of {}: {}", metric, e)
+                await asyncio.sleep(self.SPOOL_RETRY_INTERVAL)
+                continue
+            self.spool.pop()
+
+            if self.spool_replay_rate is not None:
+                next_publish = max(
+                    next_publish + 1 / self.spool_replay_rate, loop.time()
+                )
+                await asyncio.sleep(next_publish - loop.time())
+        logger.info("Replayed all spooled chunks")
 
     @rpc_handler("config")
     async def _source_config(self, **kwargs: Any) -> None:
@@ -28,12 +28,22 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import asyncio
 import math
+import time
+from array import array
+from collections.abc import Iterable
+from enum import Enum, auto
+from itertools import accumulate, chain
+from operator import sub
 from typing import Any, Optional, cast
 
 from . import source
 from .datachunk_pb2 import DataChunk
-from .timeseries import Metric, Timestamp
+from .logging import get_logger
+from .timeseries import Metric, Timedelta, Timestamp
+
+logger = get_logger(__name__)
 
 
 class ChunkSize:
@@ -53,6 +63,143 @@ class ChunkSize:
         setattr(instance, self._field_name, chunk_size)
 
 
+class ChunkDuration:
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self._name = name
+        self._field_name = f"_{name}"
+
+    def __get__(self, instance: Any, cls: Optional[type] = None) -> Optional[Timedelta]:
+        return cast(Optional[Timedelta], getattr(instance, self._field_name))
+
+    def __set__(self, instance: Any, duration: Timedelta | int | float | None) -> None:
+        if duration is not None:
+            if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+                duration = Timedelta.from_s(duration)
+            if not isinstance(duration, Timedelta):
+                raise TypeError(
+                    f"{self._name} must be `None`, a Timedelta or a number of seconds"
+                )
+            if not duration > Timedelta(0):
+                raise ValueError(f"{self._name} must be positive ({duration})")
+
+        setattr(instance, self._field_name, duration)
+
+
+class MessageRate:
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self._name = name
+        self._field_name = f"_{name}"
+
+    def __get__(self, instance: Any, cls: Optional[type] = None) -> Optional[float]:
+        return cast(Optional[float], getattr(instance, self._field_name))
+
+    def __set__(self, instance: Any, rate: int | float | None) -> None:
+        if rate is not None:
+            if not isinstance(rate, (int, float)) or isinstance(rate, bool):
+                raise TypeError(
+                    f"{self._name} must be `None` or a number of messages per second"
+                )
+            if not rate > 0:
+                raise ValueError(f"{self._name} must be positive ({rate})")
+            rate = float(rate)
+
+        setattr(instance, self._field_name, rate)
+
+
+class BufferLimit:
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self._name = name
+        self._field_name = f"_{name}"
+
+    def __get__(self, instance: Any, cls: Optional[type] = None) -> Optional[int]:
+        return cast(Optional[int], getattr(instance, self._field_name))
+
+    def __set__(self, instance: Any, limit: Optional[int]) -> None:
+        if limit is not None:
+            if not isinstance(limit, int) or isinstance(limit, bool):
+                raise TypeError(f"{self._name} must be `None` or a positive integer")
+            if not limit >= 1:
+                raise ValueError(f"{self._name} must be at least 1 ({limit} < 1)")
+
+        setattr(instance, self._field_name, limit)
+
+
+class BufferPolicy(Enum):
+    """What to do with new :term:`data points<Data Point>` once the buffer limit of a
+    :class:`Source` or a metric is reached.
+
+    See :attr:`Source.buffer_policy`.
+    """
+
+    BLOCK = auto()
+    """:meth:`Source.send` and :meth:`Source.send_many` wait until buffered data points are sent.
+
+    Data points appended without sending (e.g. via :class:`SynchronousSource` in batching
+    mode or :meth:`SourceMetric.append`) cannot wait and are dropped instead, like :attr:`DROP_NEWEST`.
+    """
+
+    DROP_OLDEST = auto()
+    """Drop the oldest buffered data points of the metric to make room for new ones.
+    """
+
+    DROP_NEWEST = auto()
+    """Drop new data points until buffered data points are sent.
+    """
+
+    DOWNSAMPLE = auto()
+    """Drop every other buffered data point of the metric to make room for new ones,
+    keeping the newest one.
+    """
+
+
+class _BufferUsage:
+    """Number of data points buffered by all metrics of a Source."""
+
+    limit = BufferLimit()
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.points = 0
+        self.metrics: list["SourceMetric"] = []
+        """All metrics sharing this limit."""
+        self._released = asyncio.Event()
+
+    def release(self, points: int) -> None:
+        """Account for sent or dropped data points and wake up everyone waiting for room."""
+        self.points -= points
+        self._released.set()
+        self._released = asyncio.Event()
+
+    async def released(self) -> None:
+        await self._released.wait()
+
+
+_BUFFER_FORMATS = {"q": ("q", "l"), "d": ("d",)}
+
+
+def _as_array(typecode: str, data: Iterable[Any]) -> "array[Any]":
+    """Convert data to an :class:`array.array` of 8-byte items, copying
+    contiguous buffers of matching type (e.g. NumPy arrays) in bulk."""
+    if isinstance(data, array) and data.typecode == typecode:
+        return data
+    try:
+        view = memoryview(data)  # type: ignore[arg-type]
+    except TypeError:
+        return array(typecode, data)
+
+    with view:
+        if (
+            view.ndim == 1
+            and view.itemsize == 8
+            and view.c_contiguous
+            and view.format.lstrip("@=") in _BUFFER_FORMATS[typecode]
+        ):
+            result = array(typecode)
+            result.frombytes(view.cast("B"))
+            return result
+    return array(typecode, data)
+
+
 class SourceMetric:
     chunk_size = ChunkSize()
     """Chunk size of this metric.
@@ -61,28 +208,154 @@ class SourceMetric:
     See :attr:`Source.chunk_size` for more information.
     """
 
+    chunk_max_age = ChunkDuration()
+    """Maximum age of the oldest data point in a chunk of this metric before the chunk is sent.
+
+    If set to :literal:`None`, chunks are only sent once they are full.
+    See :attr:`Source.chunk_max_age` for more information.
+    """
+
+    chunk_target_latency = ChunkDuration()
+    """Target latency of this metric for adaptive chunking.
+
+    See :attr:`Source.chunk_target_latency` for more information.
+    """
+
+    chunk_max_message_rate = MessageRate()
+    """Maximum number of chunks per second sent for this metric for adaptive chunking.
+
+    See :attr:`Source.chunk_max_message_rate` for more information.
+    """
+
+    buffer_limit = BufferLimit()
+    """Maximum number of data points buffered for this metric, including the chunk being sent.
+
+    If set to :literal:`None`, only :attr:`Source.buffer_limit` applies.
+    See :attr:`Source.metric_buffer_limit` for more information.
+    """
+
+    ADAPTIVE_CHUNK_SIZE_MAX = 10_000
+    """Upper bound for chunk sizes chosen by adaptive chunking."""
+
+    _RATE_SMOOTHING = 0.5
+    _RATE_WINDOW = 1.0
+
     def __init__(
-        self, id: Metric, source: "source.Source", chunk_size: Optional[int] = 1
+        self,
+        id: Metric,
+        source: "source.Source",
+        chunk_size: Optional[int] = 1,
+        chunk_max_age: Timedelta | int | float | None = None,
+        chunk_target_latency: Timedelta | int | float | None = None,
+        chunk_max_message_rate: int | float | None = None,
+        buffer_limit: Optional[int] = None,
+        buffer_policy: BufferPolicy = BufferPolicy.BLOCK,
+        buffer_usage: Optional[_BufferUsage] = None,
     ):
         self.id = id
         self.source = source
 
         self.chunk_size = chunk_size
+        self.chunk_max_age = chunk_max_age
+        self.chunk_target_latency = chunk_target_latency
+        self.chunk_max_message_rate = chunk_max_message_rate
         self.previous_timestamp = 0
         self.chunk = DataChunk()
+        self._flush_deadline: Optional[float] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.rate: Optional[float] = None
+        """Observed rate of data points per second, only measured for adaptive chunking."""
+        self._rate_points = 0
+        self._rate_since: Optional[float] = None
+
+        self.buffer_limit = buffer_limit
+        self.buffer_policy = buffer_policy
+        """What to do with new data points once the buffer limit is reached, see :class:`BufferPolicy`."""
+        self.dropped_points = 0
+        """Number of data points dropped because the buffer limit was reached."""
+        self._buffer_usage = _BufferUsage() if buffer_usage is None else buffer_usage
+        self._buffer_usage.metrics.append(self)
+        self._in_flight_points = 0
+        self._dropping = False
+
+    @property
+    def adaptive(self) -> bool:
+        """Whether the chunk size of this metric is chosen automatically from its observed rate."""
+        return (
+            self.chunk_target_latency is not None
+            or self.chunk_max_message_rate is not None
+        )
+
+    @property
+    def buffered_points(self) -> int:
+        """Number of data points buffered for this metric, including the chunk being sent."""
+        return len(self.chunk.time_delta) + self._in_flight_points
 
     def append(self, time: Timestamp, value: float) -> None:
         """
         Like send, but synchronous and will never flush
         """
+        if self.buffer_limit is not None or self._buffer_usage.limit is not None:
+            if self._make_room(1) == 0:
+                return
+
+        if len(self.chunk.time_delta) == 0:
+            self._start_chunk()
+
         timestamp = time.posix_ns
         self.chunk.time_delta.append(timestamp - self.previous_timestamp)
         self.previous_timestamp = timestamp
         self.chunk.value.append(value)
+        self._buffer_usage.points += 1
+
+        assert len(self.chunk.time_delta) == len(self.chunk.value)
+
+    def extend(self, timestamps: Iterable[int], values: Iterable[float]) -> None:
+        """Like :meth:`send_many`, but synchronous and will never flush.
+
+        Args:
+            timestamps: POSIX timestamps in nanoseconds
+            values: values at the respective timestamps
+
+        Raises:
+            ValueError: if the number of timestamps and values differs
+        """
+        self._extend(_as_array("q", timestamps), _as_array("d", values))
+
+    def _extend(self, timestamps: "array[int]", values: "array[float]") -> None:
+        if len(timestamps) != len(values):
+            raise ValueError(
+                f"Number of timestamps and values differ ({len(timestamps)} != {len(values)})"
+            )
+        if len(timestamps) == 0:
+            return
+
+        if self.buffer_limit is not None or self._buffer_usage.limit is not None:
+            accepted = self._make_room(len(timestamps))
+            if accepted == 0:
+                return
+            if accepted < len(timestamps):
+                timestamps = timestamps[:accepted]
+                values = values[:accepted]
+
+        if len(self.chunk.time_delta) == 0:
+            self._start_chunk()
+
+        self.chunk.time_delta.extend(
+            map(sub, timestamps, chain((self.previous_timestamp,), timestamps))
+        )
+        self.previous_timestamp = timestamps[-1]
+        self.chunk.value.extend(values)
+        self._buffer_usage.points += len(timestamps)
 
         assert len(self.chunk.time_delta) == len(self.chunk.value)
 
     async def send(self, time: Timestamp, value: float) -> None:
+        if self.buffer_policy is BufferPolicy.BLOCK and (
+            self.buffer_limit is not None or self._buffer_usage.limit is not None
+        ):
+            await self._wait_for_room(1)
         self.append(time, value)
 
         if self.chunk_size is None:
@@ -91,6 +364,40 @@ class SourceMetric:
         if self.chunk_size <= len(self.chunk.time_delta):
             await self.flush()
 
+    async def send_many(
+        self, timestamps: Iterable[int], values: Iterable[float]
+    ) -> None:
+        """Send many data points at once, split into chunks of :attr:`chunk_size`.
+
+        See :meth:`Source.send_many`.
+        """
+        timestamps = _as_array("q", timestamps)
+        values = _as_array("d", values)
+        if len(timestamps) != len(values):
+            raise ValueError(
+                f"Number of timestamps and values differ ({len(timestamps)} != {len(values)})"
+            )
+
+        if self.chunk_size is None:
+            if self.buffer_policy is BufferPolicy.BLOCK:
+                await self._wait_for_room(len(timestamps))
+            self._extend(timestamps, values)
+            return  # Chunking is disabled
+
+        start = 0
+        while start < len(timestamps):
+            room = max(1, self.chunk_size - len(self.chunk.time_delta))
+            end = start + room
+            if self.buffer_policy is BufferPolicy.BLOCK:
+                await self._wait_for_room(min(end, len(timestamps)) - start)
+            self._extend(timestamps[start:end], values[start:end])
+            start = end
+
+            if self.chunk_size is not None and self.chunk_size <= len(
+                self.chunk.time_delta
+            ):
+                await self.flush()
+
     async def error(self, time: Timestamp) -> None:
         await self.send(time, math.nan)
 
@@ -99,12 +406,208 @@ class SourceMetric:
         assert len(self.chunk.time_delta) == len(self.chunk.value)
         return len(self.chunk.time_delta) == 0
 
+    def _start_chunk(self) -> None:
+        """Schedule a time-based flush once the first data point of a chunk is appended."""
+        max_age = self.chunk_max_age
+        if max_age is None and self.adaptive:
+            # Adaptive chunking needs chunks of metrics that slow down to be
+            # sent eventually, both to keep latency low and to notice the change.
+            max_age = self.chunk_target_latency
+        if max_age is not None:
+            self._flush_deadline = time.monotonic() + max_age.s
+            self.source._schedule_chunk_flush(self, self._flush_deadline)
+        if self.adaptive and self._rate_since is None:
+            self._rate_since = time.monotonic()
+
     async def flush(self) -> None:
-        assert len(self.chunk.time_delta) == len(self.chunk.value)
-        if len(self.chunk.time_delta) == 0:
+        # Only a single flush per metric may be in progress at any time,
+        # otherwise chunks could be sent out of order.
+        async with self._flush_lock:
+            assert len(self.chunk.time_delta) == len(self.chunk.value)
+            if len(self.chunk.time_delta) == 0:
+                return
+
+            # Data points appended while we are sending go into a fresh chunk.
+            chunk = self.chunk
+            previous_timestamp = self.previous_timestamp
+            self.chunk = DataChunk()
+            self.previous_timestamp = 0
+            self._flush_deadline = None
+            self._in_flight_points = len(chunk.time_delta)
+
+            try:
+                await self.source._send(self.id, chunk)
+            except BaseException:
+                self._in_flight_points = 0
+                self._restore_chunk(chunk, previous_timestamp)
+                # Wake up blocked senders, so that they try to flush themselves
+                self._buffer_usage.release(0)
+                raise
+
+            self._in_flight_points = 0
+            self._buffer_usage.release(len(chunk.time_delta))
+            self._dropping = False
+
+            if self.adaptive:
+                self._observe_rate(len(chunk.value))
+
+    def _observe_rate(self, points: int) -> None:
+        """Account for sent data points and adapt the chunk size once per rate window."""
+        now = time.monotonic()
+        if self._rate_since is None:
+            # Adaptive chunking was enabled while this chunk was already filling up
+            self._rate_since = now
             return
 
-        await self.source._send(self.id, self.chunk)
-        del self.chunk.time_delta[:]
-        del self.chunk.value[:]
-        self.previous_timestamp = 0
+        self._rate_points += points
+        elapsed = now - self._rate_since
+        window = (
+            self.chunk_target_latency.s
+            if self.chunk_target_latency is not None
+            else self._RATE_WINDOW
+        )
+        if elapsed < window:
+            return
+
+        sample = self._rate_points / elapsed
+        if self.rate is None:
+            self.rate = sample
+        else:
+            self.rate += self._RATE_SMOOTHING * (sample - self.rate)
+        self._rate_points = 0
+        self._rate_since = now
+
+        self._adapt_chunk_size(self.rate)
+
+    def _adapt_chunk_size(self, rate: float) -> None:
+        """Choose the largest chunk size that meets the target latency without
+        exceeding the maximum message rate, the latter taking precedence."""
+        size = 1.0
+        if self.chunk_target_latency is not None:
+            size = rate * self.chunk_target_latency.s
+        if self.chunk_max_message_rate is not None:
+            size = max(size, math.ceil(rate / self.chunk_max_message_rate))
+        chunk_size = min(max(1, int(size)), self.ADAPTIVE_CHUNK_SIZE_MAX)
+
+        if chunk_size != self.chunk_size:
+            self.chunk_size = chunk_size
+            self.source._on_chunk_size_changed(self)
+
+    def _excess(self, points: int) -> int:
+        """Number of data points above the buffer limits if adding the given number of data points.
+
+        Empty buffers always accept data points, no matter how many.
+        """
+        excess = 0
+        buffered = self.buffered_points
+        if self.buffer_limit is not None and buffered > 0:
+            excess = buffered + points - self.buffer_limit
+        usage = self._buffer_usage
+        if usage.limit is not None and usage.points > 0:
+            excess = max(excess, usage.points + points - usage.limit)
+        return excess
+
+    async def _wait_for_room(self, points: int) -> None:
+        usage = self._buffer_usage
+        while self._excess(points) > 0:
+            if not self.empty and not self._flush_lock.locked():
+                await self.flush()
+                continue
+
+            if usage.limit is not None and usage.points + points > usage.limit:
+                # The limit of the Source may be exhausted by partial chunks of
+                # other metrics, which would otherwise never be sent.
+                pending = [
+                    metric
+                    for metric in usage.metrics
+                    if not metric.empty and not metric._flush_lock.locked()
+                ]
+                if pending:
+                    await asyncio.gather(*(metric.flush() for metric in pending))
+                    continue
+
+            # Wait for a chunk of this or any other metric of the Source to be sent
+            await usage.released()
+
+    def _make_room(self, points: int) -> int:
+        """Apply the buffer policy before adding data points, return how many of them to add."""
+        excess = self._excess(points)
+        if excess <= 0:
+            return points
+
+        if self.buffer_policy is BufferPolicy.DROP_OLDEST:
+            self._discard(self._drop_oldest(excess))
+        elif self.buffer_policy is BufferPolicy.DOWNSAMPLE:
+            while self._excess(points) > 0:
+                removed = self._downsample()
+                if removed == 0:
+                    break
+                self._discard(removed)
+
+        # Data points that do not fit nevertheless are dropped
+        accepted = max(0, points - max(0, self._excess(points)))
+        if accepted < points:
+            self._count_dropped(points - accepted)
+        return accepted
+
+    def _discard(self, points: int) -> None:
+        """Account for buffered data points that were dropped."""
+        if points > 0:
+            self._buffer_usage.release(points)
+            self._count_dropped(points)
+
+    def _count_dropped(self, points: int) -> None:
+        if not self._dropping:
+            logger.warning(
+                "Buffer limit of {} reached, dropping data points ({})",
+                self.id,
+                self.buffer_policy.name,
+            )
+            self._dropping = True
+        self.dropped_points += points
+
+    def _drop_oldest(self, points: int) -> int:
+        time_delta = self.chunk.time_delta
+        points = min(points, len(time_delta))
+        if points == 0:
+            return 0
+
+        if points == len(time_delta):
+            self.chunk = DataChunk()
+            self.previous_timestamp = 0
+            return points
+
+        # The first time delta of a chunk is an absolute timestamp
+        time_delta[points] = sum(time_delta[: points + 1])
+        del time_delta[:points]
+        del self.chunk.value[:points]
+        return points
+
+    def _downsample(self) -> int:
+        count = len(self.chunk.time_delta)
+        if count < 2:
+            return 0
+
+        # Keep every other data point, ending with the newest one
+        timestamps = list(accumulate(self.chunk.time_delta))[count - 1 :: -2][::-1]
+        values = list(self.chunk.value)[count - 1 :: -2][::-1]
+
+        chunk = DataChunk()
+        chunk.time_delta.extend(map(sub, timestamps, chain((0,), timestamps)))
+        chunk.value.extend(values)
+        self.chunk = chunk
+        return count - len(timestamps)
+
+    def _restore_chunk(self, chunk: DataChunk, previous_timestamp: int) -> None:
+        """Put back data points of an unsent chunk, in front of any data points appended in the meantime."""
+        if len(self.chunk.time_delta) > 0:
+            # The first time delta of a chunk is an absolute timestamp,
+            # make it relative to the last data point of the unsent chunk.
+            chunk.time_delta.append(self.chunk.time_delta[0] - previous_timestamp)
+            chunk.time_delta.extend(self.chunk.time_delta[1:])
+            chunk.value.extend(self.chunk.value)
+        else:
+            self.previous_timestamp = previous_timestamp
+
+        self.chunk = chunk
+        self._start_chunk()
@@ -0,0 +1,243 @@
+# Copyright (c) 2018, ZIH,
+# Technische Universitaet Dresden,
+# Federal Republic of Germany
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of metricq nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import mmap
+import os
+import struct
+from collections import deque
+from pathlib import Path
+from typing import Optional
+from zlib import crc32
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Record layout: header (state, metric length, chunk length), metric, chunk, CRC32 of metric and chunk
+_HEADER = struct.Struct("<BxxxII")
+_CRC = struct.Struct("<I")
+
+_STATE_END = 0
+_STATE_PENDING = 1
+_STATE_PUBLISHED = 2
+
+_SUFFIX = ".spool"
+
+
+class _Segment:
+    """A memory-mapped, append-only file of records."""
+
+    def __init__(self, path: Path, size: Optional[int] = None):
+        self.path = path
+        with open(path, "w+b" if size is not None else "r+b") as file:
+            if size is not None:
+                file.truncate(size)
+            self._mmap = mmap.mmap(file.fileno(), 0)
+
+        # Offsets of records not published yet
+        self.pending: deque[int] = deque()
+        self.write_offset = 0
+        self._recover()
+
+    def _recover(self) -> None:
+        """Find the records written so far, stopping at the first incomplete or corrupt one."""
+        buffer = self._mmap
+        offset = 0
+        while offset + _HEADER.size <= len(buffer):
+            state, metric_length, chunk_length = _HEADER.unpack_from(buffer, offset)
+            if state not in (_STATE_PENDING, _STATE_PUBLISHED):
+                break
+            payload = offset + _HEADER.size
+            end = payload + metric_length + chunk_length + _CRC.size
+            if end > len(buffer):
+                break
+            (checksum,) = _CRC.unpack_from(buffer, end - _CRC.size)
+            if crc32(buffer[payload : end - _CRC.size]) != checksum:
+                logger.warning("Ignoring corrupt record in spool segment {}", self.path)
+                break
+            if state == _STATE_PENDING:
+                self.pending.append(offset)
+            offset = end
+        self.write_offset = offset
+
+    def append(self, metric: bytes, chunk: bytes) -> bool:
+        """Append a record, return whether there was enough room."""
+        offset = self.write_offset
+        payload = offset + _HEADER.size
+        end = payload + len(metric) + len(chunk) + _CRC.size
+        if end > len(self._mmap):
+            return False
+
+        buffer = self._mmap
+        buffer[payload : payload + len(metric)] = metric
+        buffer[payload + len(metric) : end - _CRC.size] = chunk
+        _CRC.pack_into(
+            buffer, end - _CRC.size, crc32(buffer[payload : end - _CRC.size])
+        )
+        if end < len(buffer):
+            # Never mistake leftovers of a previous, torn write for the next record
+            buffer[end] = _STATE_END
+        # Only mark the record as valid once it is complete
+        _HEADER.pack_into(buffer, offset, _STATE_PENDING, len(metric), len(chunk))
+
+        self.pending.append(offset)
+        self.write_offset = end
+        return True
+
+    def peek(self) -> tuple[str, bytes]:
+        offset = self.pending[0]
+        _, metric_length, chunk_length = _HEADER.unpack_from(self._mmap, offset)
+        payload = offset + _HEADER.size
+        metric = self._mmap[payload : payload + metric_length].decode()
+        chunk = self._mmap[
+            payload + metric_length : payload + metric_length + chunk_length
+        ]
+        return metric, chunk
+
+    def pop(self) -> None:
+        offset = self.pending.popleft()
+        self._mmap[offset] = _STATE_PUBLISHED
+
+    def flush(self) -> None:
+        self._mmap.flush()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def remove(self) -> None:
+        self.close()
+        os.remove(self.path)
+
+
+class Spool:
+    """An append-only, on-disk queue of serialized data chunks.
+
+    A Source writes chunks here that it could not publish, see the ``spool`` argument
+    of :class:`Source`.
+    Chunks are stored in memory-mapped segment files of :code:`segment_size` bytes within
+    :code:`directory`.
+    Each record is marked as published in place once it has been sent,
+    and segment files are removed once all of their records are published,
+    so spooled chunks survive restarts of the Source.
+    Delivery is at-least-once: a record is only marked after publishing it returned,
+    so if the Source stops in between, the chunk is published again after the restart.
+
+    Args:
+        directory:
+            Directory for the segment files, created if it does not exist.
+            It must not be shared with other Sources.
+        segment_size:
+            Size of each segment file in bytes.
+            Segments are allocated sparsely and grow to fit chunks larger than this.
+        sync:
+            Write changes to disk after every operation instead of leaving this
+            to the operating system.
+            This protects against power loss, not just against restarts of the Source,
+            at a considerable cost.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        segment_size: int = 16 * 1024 * 1024,
+        sync: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.sync = sync
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._segments: deque[_Segment] = deque()
+        for path in sorted(self.directory.glob(f"*{_SUFFIX}")):
+            if path.stat().st_size == 0:
+                path.unlink()
+                continue
+            segment = _Segment(path)
+            if segment.pending:
+                self._segments.append(segment)
+            else:
+                segment.remove()
+        self._next_sequence = (
+            int(self._segments[-1].path.stem) + 1 if self._segments else 0
+        )
+        self._pending = sum(len(segment.pending) for segment in self._segments)
+        if self._pending:
+            logger.info("Recovered {} spooled chunks from {}", self._pending, directory)
+
+    def __len__(self) -> int:
+        """Number of spooled chunks not published yet."""
+        return self._pending
+
+    def append(self, metric: str, chunk: bytes) -> None:
+        """Spool a serialized chunk of a metric."""
+        encoded_metric = metric.encode()
+        if not self._segments or not self._segments[-1].append(encoded_metric, chunk):
+            record_size = _HEADER.size + len(encoded_metric) + len(chunk) + _CRC.size
+            path = self.directory / f"{self._next_sequence:020d}{_SUFFIX}"
+            self._next_sequence += 1
+            segment = _Segment(path, size=max(self.segment_size, record_size))
+            self._segments.append(segment)
+            appended = segment.append(encoded_metric, chunk)
+            assert appended
+        self._pending += 1
+        if self.sync:
+            self._segments[-1].flush()
+
+    def peek(self) -> tuple[str, bytes]:
+        """Return the oldest spooled chunk that is not published yet, and its metric.
+
+        Raises:
+            IndexError: if there are no spooled chunks
+        """
+        if not self._segments:
+            raise IndexError("peek from an empty spool")
+        return self._segments[0].peek()
+
+    def pop(self) -> None:
+        """Mark the oldest spooled chunk as published.
+
+        Raises:
+            IndexError: if there are no spooled chunks
+        """
+        if not self._segments:
+            raise IndexError("pop from an empty spool")
+        segment = self._segments[0]
+        segment.pop()
+        self._pending -= 1
+        if not segment.pending:
+            self._segments.popleft()
+            segment.remove()
+        elif self.sync:
+            segment.flush()
+
+    def close(self) -> None:
+        """Close all segment files, spooled chunks remain on disk."""
+        while self._segments:
+            self._segments.popleft().close()
@@ -25,12 +25,13 @@
 # LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import asyncio
 from collections.abc import AsyncIterator, Iterable
 from types import TracebackType
 from typing import Any, Optional
 
 from .client import Client
-from .drain import Drain
+from .drain import Chunk, Drain
 from .logging import get_logger
 from .timeseries import JsonDict, Timedelta, Timestamp
 
@@ -43,6 +44,7 @@ class Subscriber(Client):
         *args: Any,
         expires: Timedelta | int | float,
         metrics: Iterable[str],
+        shards: int = 1,
         **kwargs: Any,
     ):
         """Subscribes to a list of metrics
@@ -50,6 +52,13 @@ class Subscriber(Client):
         Args:
             metrics: List of metrics that you want to subscribe to.
             expires: The lifetime of the subscription queue in seconds.
+            shards:
+                Split the metrics across this many subscription queues.
+                :meth:`collect_data` and :meth:`collect_chunks` drain them concurrently,
+                each with its own :class:`Drain` and connection,
+                which speeds up catching up with large amounts of buffered data.
+                Data of each metric is still yielded in order,
+                but data of different metrics is interleaved arbitrarily.
         """
 
         super().__init__(*args, **kwargs)
@@ -65,12 +74,24 @@ class Subscriber(Client):
         if self.expires < Timedelta(0) or self.expires == Timedelta(0):
             raise ValueError("expires must be greater than zero")
 
+        if not 1 <= shards <= len(self._metrics):
+            raise ValueError(
+                f"shards must be between 1 and the number of metrics, got {shards}"
+            )
+        self._shard_metrics = [self._metrics[i::shards] for i in range(shards)]
+
         self._args = args
         self._kwargs = kwargs
 
         self.queue: Optional[str] = None
         """The name of the queue that is used to buffer the subscribed data
 
+        With several shards, this is the queue of the first one, see :attr:`queues`.
+        This is only set after :meth:`.connect()` has finished.
+        """
+        self.queues: list[str] = []
+        """The names of the queues of all shards
+
         This is only set after :meth:`.connect()` has finished.
         """
         self.metadata: dict[str, JsonDict] = {}
@@ -92,17 +113,25 @@ class Subscriber(Client):
 
         await super().connect()
 
-        response = await self.rpc(
-            "sink.subscribe", metrics=self._metrics, expires=self.expires.s, **kwargs
+        responses = await asyncio.gather(
+            *(
+                self.rpc(
+                    "sink.subscribe", metrics=metrics, expires=self.expires.s, **kwargs
+                )
+                for metrics in self._shard_metrics
+            )
         )
 
-        assert response is not None
-        self.queue = response["dataQueue"]
-        assert isinstance(response["metrics"], dict)
-        self.metadata = response["metrics"]
+        self.metadata = {}
+        for response in responses:
+            assert response is not None
+            self.queues.append(response["dataQueue"])
+            assert isinstance(response["metrics"], dict)
+            self.metadata.update(response["metrics"])
+        self.queue = self.queues[0]
         await self.stop()
 
-    def drain(self, **kwargs: Any) -> Drain:
+    def drain(self, shard: int = 0, **kwargs: Any) -> Drain:
         """Returns a fully configured instance of a Drain, by using the given settings used for the subscription.
 
         As the Drain is a context manager, you should use the result of this in a `with`-statement::
@@ -116,14 +145,22 @@ class Subscriber(Client):
         Note:
             For a more convenient way to retrieve the data, see :meth:`collect_data()`.
 
+        Args:
+            shard: index of the shard to drain, see the :code:`shards` argument
+
         Returns:
             Drain: Fully configured instance of a Drain
         """
-        assert self.queue is not None
+        assert self.queues
 
         new_kwargs = self._kwargs
         new_kwargs.update(kwargs)
-        return Drain(*self._args, **new_kwargs, queue=self.queue, metrics=self._metrics)
+        return Drain(
+            *self._args,
+            **new_kwargs,
+            queue=self.queues[shard],
+            metrics=self._shard_metrics[shard],
+        )
 
     async def collect_data(
         self, **kwargs: Any
@@ -132,10 +169,83 @@ class Subscriber(Client):
         Asynchronously iterate over the retrieved data.
         Can only be called once after :meth:`connect()` has finished successfully.
         """
+        if len(self.queues) > 1:
+            async for metric, timestamps, values in self._collect_shards(**kwargs):
+                for timestamp, value in zip(timestamps, values):
+                    yield metric, Timestamp(timestamp), value
+            return
+
         async with self.drain(**kwargs) as drain:
             async for data in drain:
                 yield data
 
+    async def collect_chunks(
+        self, max_buffered_chunks: Optional[int] = 100, **kwargs: Any
+    ) -> AsyncIterator[Chunk]:
+        """
+        Asynchronously iterate over the retrieved data a chunk at a time,
+        see :meth:`Drain.chunks`.
+        Can only be called once after :meth:`connect()` has finished successfully.
+
+        Args:
+            max_buffered_chunks:
+                Maximum number of received chunks buffered before the consumer catches up,
+                see :class:`Drain`.
+                If the iteration is stopped early, the remaining data stays in the queue.
+        """
+        if len(self.queues) > 1:
+            async for chunk in self._collect_shards(
+                max_buffered_chunks=max_buffered_chunks, **kwargs
+            ):
+                yield chunk
+            return
+
+        async with self.drain(
+            max_buffered_chunks=max_buffered_chunks, **kwargs
+        ) as drain:
+            async for chunk in drain.chunks():
+                yield chunk
+
+    async def _collect_shards(
+        self, max_buffered_chunks: Optional[int] = None, **kwargs: Any
+    ) -> AsyncIterator[Chunk]:
+        """Drain all shards concurrently, merging their chunks as they arrive."""
+        # Chunks of all shards, an exception if a shard failed, None once a shard is done
+        merged: asyncio.Queue[Chunk | Exception | None] = asyncio.Queue(
+            maxsize=max_buffered_chunks or 0
+        )
+
+        async def drain_shard(shard: int) -> None:
+            try:
+                async with self.drain(
+                    shard, max_buffered_chunks=max_buffered_chunks, **kwargs
+                ) as drain:
+                    async for chunk in drain.chunks():
+                        await merged.put(chunk)
+            except Exception as e:
+                await merged.put(e)
+                return
+            await merged.put(None)
+
+        tasks = [
+            self._event_loop.create_task(drain_shard(shard))
+            for shard in range(len(self.queues))
+        ]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await merged.get()
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
     async def __aexit__(
         self,
         exc_type: Optional[type[BaseException]],
@@ -28,9 +28,11 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import asyncio
+from array import array
+from collections import deque
 from collections.abc import Mapping
 from threading import Event, Lock, Thread
-from typing import Any
+from typing import Any, Optional
 
 from .logging import get_logger
 from .source import Source
@@ -49,10 +51,95 @@ class _SynchronousSource(Source):
         self.exception = None
         self._ready_event = Event()
 
+        # Data points handed over from producer threads in batching mode.
+        # deque.append and deque.popleft are atomic, so producers never block on a lock.
+        self._buffer: deque[tuple[Metric, Timestamp, float]] = deque()
+        self._buffer_wakeup_pending = False
+        self._buffer_event = asyncio.Event()
+        self._buffer_lock = asyncio.Lock()
+        self._buffer_task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop running in the background thread, safe to access from any thread."""
+        assert self._loop is not None, "SynchronousSource is not running"
+        return self._loop
+
     async def connect(self) -> None:
         await super().connect()
+        self._buffer_task = self._event_loop.create_task(self._consume_buffer())
         self._ready_event.set()
 
+    async def teardown(self) -> None:
+        if self._buffer_task is not None:
+            self._buffer_task.cancel()
+            await asyncio.gather(self._buffer_task, return_exceptions=True)
+        await super().teardown()
+
+    def enqueue(self, metric: Metric, time: Timestamp, value: float) -> None:
+        """Hand over a data point from any thread, to be sent by the event loop."""
+        self._buffer.append((metric, time, value))
+        if not self._buffer_wakeup_pending:
+            self._buffer_wakeup_pending = True
+            self.loop.call_soon_threadsafe(self._wake_up)
+
+    def _wake_up(self) -> None:
+        # Reset before the buffer is drained: data points enqueued from now on
+        # either schedule another wakeup or are picked up by the current drain.
+        self._buffer_wakeup_pending = False
+        self._buffer_event.set()
+
+    async def _consume_buffer(self) -> None:
+        while True:
+            await self._buffer_event.wait()
+            self._buffer_event.clear()
+            try:
+                await self.send_buffered()
+            except Exception as e:
+                # Unsent data points remain buffered in their SourceMetric
+                logger.error("[SynchronousSource] failed to send data {}", e)
+
+    async def send_buffered(self) -> None:
+        """Send all data points enqueued so far, in bulk per metric.
+
+        Data points are added to the buffers of all their metrics before any chunk is sent,
+        so that a failure to send one chunk loses none of them.
+        This never waits for room in the buffers, see :attr:`BufferPolicy.BLOCK`.
+        """
+        async with self._buffer_lock:
+            while self._buffer:
+                batch: dict[Metric, tuple[array[int], array[float]]] = {}
+                while self._buffer:
+                    metric, time, value = self._buffer.popleft()
+                    if metric not in batch:
+                        batch[metric] = (array("q"), array("d"))
+                    timestamps, values = batch[metric]
+                    timestamps.append(time.posix_ns)
+                    values.append(value)
+
+                full = []
+                for metric, (timestamps, values) in batch.items():
+                    source_metric = self[metric]
+                    source_metric.extend(timestamps, values)
+                    if (
+                        source_metric.chunk_size is not None
+                        and source_metric.chunk_size <= len(source_metric.chunk.value)
+                    ):
+                        full.append(source_metric)
+
+                results = await asyncio.gather(
+                    *(source_metric.flush() for source_metric in full),
+                    return_exceptions=True,
+                )
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+
+    async def flush_buffered(self) -> None:
+        """Send all enqueued data points and flush all chunks to the network."""
+        await self.send_buffered()
+        await self.flush()
+
     def on_exception(
         self, loop: asyncio.AbstractEventLoop, context: Mapping[str, Any]
     ) -> None:
@@ -85,13 +172,28 @@ class SynchronousSource:
     It spawns a new thread and runs an asynchronous :class:`Source` in it.
     Therefore, this class does not actually derive from :class:`Source`.
 
-    All parameters are passed to `Source.__init__`.
+    All parameters except `batching` are passed to `Source.__init__`.
+
+    Args:
+        batching:
+            Hand over data points to the background thread in batches.
+            In this mode, :meth:`send` only appends the data point to a buffer and returns
+            immediately by default, the background thread sends buffered data points in
+            bulk whenever it wakes up.
+            Use :meth:`flush` to wait until all data points are delivered.
+            This allows for much higher rates of data points than sending every data point
+            individually.
+            All data points of a metric buffered in between are sent in a single chunk,
+            which may exceed the chunk size.
+            Once a buffer limit is reached, new data points are dropped, even with
+            :attr:`BufferPolicy.BLOCK`.
     """
 
     _lock = Lock()
     _tid = 0
 
-    def __init__(self, *args: Any, **kwargs: Any):
+    def __init__(self, *args: Any, batching: bool = False, **kwargs: Any):
+        self.batching = batching
         self._source = _SynchronousSource(*args, **kwargs)
         self._thread = Thread(target=self._source.run)
 
@@ -116,7 +218,7 @@ class SynchronousSource:
         metric: Metric,
         time: Timestamp,
         value: float,
-        block: bool = True,
+        block: Optional[bool] = None,
         timeout: float = 60,
     ) -> None:
         """
@@ -128,14 +230,25 @@ class SynchronousSource:
             metric: name of the metric
             time: timestamp
             value: value of the metric
-            block: wait for completion of the asynchronous send operation
+            block:
+                wait for completion of the asynchronous send operation.
+                Defaults to `False` in batching mode and to `True` otherwise.
+                In batching mode, this waits for all buffered data points, see :meth:`flush`.
             timeout: in seconds, is only used in blocking mode
 
         Raises:
             TimeoutError: in case of timeout
         """
+        if self.batching:
+            self._source.enqueue(metric, time, value)
+            if block:
+                self.flush(timeout)
+            return
+
+        if block is None:
+            block = True
         f = asyncio.run_coroutine_threadsafe(
-            self._source.send(metric, time, value), self._source._event_loop
+            self._source.send(metric, time, value), self._source.loop
         )
         if block:
             exception = f.exception(timeout)
@@ -145,6 +258,25 @@ class SynchronousSource:
                 # self.stop()
                 # raise exception
 
+    def flush(self, timeout: float = 60) -> None:
+        """
+        Wait until all data points passed to :meth:`send` so far are sent to the network,
+        including those buffered in batching mode or waiting for a chunk to fill up.
+        Exceptions other than a timeout are not propagated to the caller, but logged instead.
+
+        Args:
+            timeout: in seconds
+
+        Raises:
+            TimeoutError: in case of timeout
+        """
+        f = asyncio.run_coroutine_threadsafe(
+            self._source.flush_buffered(), self._source.loop
+        )
+        exception = f.exception(timeout)
+        if exception:
+            logger.error("[SynchronousSource] failed to flush data {}", exception)
+
     def declare_metrics(
         self,
         metrics: Mapping[Metric, MetadataDict],
@@ -165,7 +297,7 @@ class SynchronousSource:
             TimeoutError: in case of timeout
         """
         f = asyncio.run_coroutine_threadsafe(
-            self._source.declare_metrics(metrics), self._source._event_loop
+            self._source.declare_metrics(metrics), self._source.loop
         )
         if block:
             exception = f.exception(timeout)
@@ -185,9 +317,9 @@ class SynchronousSource:
         """
 
         logger.info("[SynchronousSource] stopping")
-        f = asyncio.run_coroutine_threadsafe(
-            self._source.stop(), self._source._event_loop
-        )
+        if self.batching and self._source._loop is not None:
+            self.flush(timeout)
+        f = asyncio.run_coroutine_threadsafe(self._source.stop(), self._source.loop)
         exception = f.exception(timeout=timeout)
         if exception:
             logger.error("[SynchronousSource] stop call failed {}", exception)
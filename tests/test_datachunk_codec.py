@@ -0,0 +1,110 @@
+from array import array
+from collections.abc import Iterator
+from itertools import accumulate
+
+import pytest
+from google.protobuf.message import DecodeError
+
+from metricq import datachunk_codec
+from metricq.datachunk_pb2 import DataChunk
+
+
+def serialize(timestamps: list[int], values: list[float]) -> bytes:
+    chunk = DataChunk()
+    chunk.time_delta.extend(
+        timestamp - previous
+        for previous, timestamp in zip([0] + timestamps, timestamps)
+    )
+    chunk.value.extend(values)
+    return chunk.SerializeToString()
+
+
+CHUNKS = [
+    pytest.param([], [], id="empty"),
+    pytest.param([1_000_000_000], [4.2], id="single"),
+    pytest.param(
+        [1_600_000_000_000_000_000 + i * 1_000_000 for i in range(100)],
+        [float(i) / 3 for i in range(100)],
+        id="regular",
+    ),
+    pytest.param([0, 1, 2, 130, 16_384], [0.0, 1.0, -1.0, 1e300, -0.0], id="small"),
+    # Decreasing timestamps result in negative deltas, encoded as 10-byte varints
+    pytest.param([5000, 1000, -(2**61), 2**61], [1.0] * 4, id="negative"),
+    pytest.param([1, 2, 3], [], id="missing-values"),
+]
+
+
+@pytest.mark.parametrize(("timestamps", "values"), CHUNKS)
+def test_encode_matches_protobuf(timestamps: list[int], values: list[float]) -> None:
+    if len(timestamps) != len(values):
+        pytest.skip("encode requires as many timestamps as values")
+    assert datachunk_codec.encode(timestamps, values) == serialize(timestamps, values)
+
+
+@pytest.mark.parametrize(("timestamps", "values"), CHUNKS)
+def test_decode_matches_protobuf(timestamps: list[int], values: list[float]) -> None:
+    decoded_timestamps, decoded_values = datachunk_codec.decode(
+        serialize(timestamps, values)
+    )
+
+    assert isinstance(decoded_timestamps, array) and decoded_timestamps.typecode == "q"
+    assert isinstance(decoded_values, array) and decoded_values.typecode == "d"
+    assert list(decoded_timestamps) == timestamps
+    assert list(decoded_values) == values
+
+
+def test_encode_buffers() -> None:
+    np = pytest.importorskip("numpy")
+    timestamps = [1000, 2000, 4000]
+    values = [1.0, 2.0, 3.0]
+    expected = serialize(timestamps, values)
+
+    assert datachunk_codec.encode(np.array(timestamps), np.array(values)) == expected
+    assert (
+        datachunk_codec.encode(array("q", timestamps), array("d", values)) == expected
+    )
+
+    def generate() -> Iterator[int]:
+        yield from timestamps
+
+    assert datachunk_codec.encode(generate(), values) == expected
+
+
+def test_encode_length_mismatch() -> None:
+    with pytest.raises(ValueError):
+        datachunk_codec.encode([1, 2], [1.0])
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # Unpacked repeated fields, as written by some other serializers
+        bytes.fromhex("08e807" "08e807" "11000000000000f03f" "110000000000000040"),
+        # Fields in reverse order
+        bytes.fromhex("1210" "000000000000f03f" "0000000000000040" "0a04e807e807"),
+        # Packed fields split into several occurrences
+        bytes.fromhex("0a02e807" "0a02e807" "1210000000000000f03f0000000000000040"),
+        # An unknown field
+        bytes.fromhex("0a04e807e807" "1210000000000000f03f0000000000000040" "1801"),
+    ],
+)
+def test_decode_non_canonical(data: bytes) -> None:
+    timestamps, values = datachunk_codec.decode(data)
+
+    chunk = DataChunk()
+    chunk.ParseFromString(data)
+    assert list(timestamps) == list(accumulate(chunk.time_delta)) == [1000, 2000]
+    assert list(values) == list(chunk.value) == [1.0, 2.0]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        bytes.fromhex("0a05e807e8"),  # truncated field
+        bytes.fromhex("0a02e8e8"),  # truncated varint
+        bytes.fromhex("1203000000"),  # incomplete double
+    ],
+)
+def test_decode_malformed(data: bytes) -> None:
+    with pytest.raises(DecodeError):
+        datachunk_codec.decode(data)
@@ -0,0 +1,219 @@
+import random
+from array import array
+from itertools import islice
+from unittest.mock import AsyncMock, call
+
+import pytest
+
+from metricq import TimeAggregate, Timedelta, Timestamp
+from metricq.exceptions import NonMonotonicTimestamps
+
+np = pytest.importorskip("numpy")
+
+from metricq.downsampling import DownsamplingSink, WindowAggregator  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+def reference(
+    interval: int, timestamps: list[int], values: list[float]
+) -> list[TimeAggregate]:
+    """Split TimeAggregate.from_value_pair of every data point across windows"""
+    windows: dict[int, list[float]] = {}
+    for previous, timestamp, value in zip(timestamps, timestamps[1:], values[1:]):
+        pair = TimeAggregate.from_value_pair(
+            Timestamp(previous), Timestamp(timestamp), value
+        )
+        last = (timestamp - 1) // interval
+        for index in range(previous // interval, last + 1):
+            time = min((index + 1) * interval, timestamp) - max(
+                index * interval, previous
+            )
+            counted = index == last
+            window = windows.setdefault(index, [value, value, 0.0, 0, 0.0, 0])
+            window[0] = min(window[0], value)
+            window[1] = max(window[1], value)
+            window[2] += pair.sum if counted else 0.0
+            window[3] += pair.count if counted else 0
+            window[4] += pair.integral_ns * time / pair.active_time.ns
+            window[5] += time
+    return [
+        TimeAggregate(
+            timestamp=Timestamp(index * interval),
+            minimum=minimum,
+            maximum=maximum,
+            sum=total,
+            count=int(count),
+            integral_ns=integral,
+            active_time=Timedelta(int(time)),
+        )
+        for index, (minimum, maximum, total, count, integral, time) in sorted(
+            windows.items()
+        )
+    ]
+
+
+def assert_aggregates_equal(
+    actual: list[TimeAggregate], expected: list[TimeAggregate]
+) -> None:
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a.timestamp == e.timestamp
+        assert (a.minimum, a.maximum, a.count, a.active_time) == (
+            e.minimum,
+            e.maximum,
+            e.count,
+            e.active_time,
+        )
+        assert a.sum == pytest.approx(e.sum)
+        assert a.integral_ns == pytest.approx(e.integral_ns)
+
+
+async def test_window_aggregator_single_window() -> None:
+    aggregator = WindowAggregator(Timedelta(100))
+    assert list(aggregator.add([110, 120, 150], [1.0, 2.0, 4.0])) == []
+    assert list(aggregator.add([200], [3.0])) == [
+        TimeAggregate(
+            timestamp=Timestamp(100),
+            minimum=2.0,
+            maximum=4.0,
+            sum=9.0,
+            count=3,
+            integral_ns=10 * 2.0 + 30 * 4.0 + 50 * 3.0,
+            active_time=Timedelta(90),
+        )
+    ]
+    assert aggregator.flush() is None
+
+
+async def test_window_aggregator_spanning_data_point() -> None:
+    aggregator = WindowAggregator(Timedelta(100))
+    aggregator.add([50], [0.0])
+    closed = list(aggregator.add([350], [2.0]))
+
+    # The data point covers (50, 350], it is counted in the window [300, 400)
+    assert [a.timestamp for a in closed] == [
+        Timestamp(0),
+        Timestamp(100),
+        Timestamp(200),
+    ]
+    assert [a.count for a in closed] == [0, 0, 0]
+    assert [a.active_time for a in closed] == [
+        Timedelta(50),
+        Timedelta(100),
+        Timedelta(100),
+    ]
+    assert [a.integral_ns for a in closed] == [100.0, 200.0, 200.0]
+    assert aggregator.flush() == TimeAggregate(
+        timestamp=Timestamp(300),
+        minimum=2.0,
+        maximum=2.0,
+        sum=2.0,
+        count=1,
+        integral_ns=100.0,
+        active_time=Timedelta(50),
+    )
+
+
+async def test_window_aggregator_long_gap() -> None:
+    aggregator = WindowAggregator(Timedelta(1000))
+    aggregator.add([0], [0.0])
+    # A day of 1 µs windows, only created while iterating
+    closed = aggregator.add([86_400 * 10**9 + 500], [2.0])
+
+    assert [a.timestamp for a in islice(closed, 3)] == [
+        Timestamp(0),
+        Timestamp(1000),
+        Timestamp(2000),
+    ]
+    assert aggregator.flush() == TimeAggregate(
+        timestamp=Timestamp(86_400 * 10**9),
+        minimum=2.0,
+        maximum=2.0,
+        sum=2.0,
+        count=1,
+        integral_ns=1000.0,
+        active_time=Timedelta(500),
+    )
+
+
+@pytest.mark.parametrize("interval", [7, 100, 10_000])
+@pytest.mark.parametrize("chunk_size", [1, 13, 1000])
+async def test_window_aggregator_matches_value_pairs(
+    interval: int, chunk_size: int
+) -> None:
+    rng = random.Random(interval * chunk_size)
+    timestamps = [1000]
+    for _ in range(999):
+        timestamps.append(timestamps[-1] + rng.choice([1, 3, 50, 100, 250]))
+    values = [rng.uniform(-10, 10) for _ in timestamps]
+
+    aggregator = WindowAggregator(Timedelta(interval))
+    aggregates: list[TimeAggregate] = []
+    for start in range(0, len(timestamps), chunk_size):
+        aggregates += aggregator.add(
+            timestamps[start : start + chunk_size], values[start : start + chunk_size]
+        )
+    last = aggregator.flush()
+    if last is not None:
+        aggregates.append(last)
+
+    assert_aggregates_equal(aggregates, reference(interval, timestamps, values))
+
+
+async def test_window_aggregator_non_monotonic() -> None:
+    aggregator = WindowAggregator(Timedelta(100))
+    aggregator.add([10, 20], [1.0, 2.0])
+    with pytest.raises(NonMonotonicTimestamps):
+        aggregator.add([20], [3.0])
+
+
+async def test_window_aggregator_invalid() -> None:
+    with pytest.raises(ValueError):
+        WindowAggregator(Timedelta(0))
+    with pytest.raises(ValueError):
+        WindowAggregator(Timedelta(10)).add([1, 2], [1.0])
+
+
+class _TestDownsamplingSink(DownsamplingSink):
+    async def on_aggregate(
+        self, metric: str, interval: Timedelta, aggregate: TimeAggregate
+    ) -> None:
+        pass
+
+
+async def test_downsampling_sink_requires_on_aggregate() -> None:
+    with pytest.raises(TypeError):
+        DownsamplingSink(  # type: ignore[abstract]
+            intervals=[Timedelta(10)], token="sink-test", url="amqps://test.invalid"
+        )
+
+
+async def test_downsampling_sink() -> None:
+    sink = _TestDownsamplingSink(
+        intervals=[Timedelta(10), Timedelta(100)],
+        token="sink-test",
+        url="amqps://test.invalid",
+    )
+    on_aggregate = AsyncMock()
+    sink.on_aggregate = on_aggregate  # type: ignore
+
+    await sink.on_data_chunk(
+        "test.foo", array("q", [0, 5, 10, 15]), array("d", [0.0, 1.0, 2.0, 3.0])
+    )
+
+    assert on_aggregate.call_args_list == [
+        call(
+            "test.foo",
+            Timedelta(10),
+            TimeAggregate(
+                timestamp=Timestamp(0),
+                minimum=1.0,
+                maximum=2.0,
+                sum=3.0,
+                count=2,
+                integral_ns=15.0,
+                active_time=Timedelta(10),
+            ),
+        )
+    ]
@@ -0,0 +1,89 @@
+import asyncio
+from array import array
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aio_pika
+import pytest
+
+from metricq import Drain, Timestamp
+from metricq.datachunk_pb2 import DataChunk
+
+pytestmark = pytest.mark.asyncio
+
+
+def drain(**kwargs: Any) -> Drain:
+    return Drain(
+        token="drain-test",
+        url="amqps://test.invalid",
+        queue="test-queue",
+        metrics=["test.foo", "test.bar"],
+        **kwargs,
+    )
+
+
+def message(
+    metric: str | None = None, data_chunk: DataChunk | None = None
+) -> MagicMock:
+    message = MagicMock(spec=aio_pika.abc.AbstractIncomingMessage)
+    if data_chunk is None:
+        message.type = "end"
+    else:
+        message.type = None
+        message.body = data_chunk.SerializeToString()
+    message.routing_key = metric
+    message.app_id = "source-test"
+    message.process.return_value = AsyncMock()
+    return message
+
+
+async def receive_all(drain: Drain) -> None:
+    await drain._on_data_message(
+        message("test.foo", DataChunk(time_delta=[10, 10], value=[1.0, 2.0]))
+    )
+    await drain._on_data_message(
+        message("test.bar", DataChunk(time_delta=[15], value=[3.0]))
+    )
+    with patch.object(drain, "rpc"), patch.object(drain, "stop"):
+        await drain._on_data_message(message())
+
+
+async def test_drain_iterates_data_points() -> None:
+    d = drain()
+    await receive_all(d)
+
+    assert [data async for data in d] == [
+        ("test.foo", Timestamp(10), 1.0),
+        ("test.foo", Timestamp(20), 2.0),
+        ("test.bar", Timestamp(15), 3.0),
+    ]
+    assert [data async for data in d] == []
+
+
+async def test_drain_iterates_chunks() -> None:
+    d = drain()
+    await receive_all(d)
+
+    assert [chunk async for chunk in d.chunks()] == [
+        ("test.foo", array("q", [10, 20]), array("d", [1.0, 2.0])),
+        ("test.bar", array("q", [15]), array("d", [3.0])),
+    ]
+
+
+async def test_drain_bounded_buffer() -> None:
+    d = drain(max_buffered_chunks=1)
+    receiving = asyncio.create_task(receive_all(d))
+    await asyncio.sleep(0.01)
+
+    # The second chunk is neither buffered nor acknowledged until there is room
+    assert d._data.qsize() == 1
+    assert not receiving.done()
+
+    chunks = [chunk async for chunk in d.chunks()]
+    await asyncio.wait_for(receiving, 1)
+    assert [metric for metric, _, _ in chunks] == ["test.foo", "test.bar"]
+
+
+async def test_drain_invalid_buffer_size() -> None:
+    with pytest.raises(ValueError):
+        drain(max_buffered_chunks=0)
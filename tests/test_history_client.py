@@ -1,12 +1,34 @@
+import asyncio
 import math
-from typing import Any
+from collections.abc import AsyncGenerator, Iterator
+from typing import Any, Optional, cast
+from unittest.mock import AsyncMock, MagicMock
 
+import aio_pika
 import pytest
 from pytest_mock import MockerFixture
 
-from metricq import HistoryClient, TimeAggregate, Timestamp, TimeValue, history_pb2
-from metricq.exceptions import HistoryError, InvalidHistoryResponse
-from metricq.history_client import HistoryResponse, HistoryResponseType
+from metricq import (
+    HistoryClient,
+    TimeAggregate,
+    Timedelta,
+    Timestamp,
+    TimeValue,
+    history_pb2,
+)
+from metricq.exceptions import (
+    HistoryError,
+    InvalidHistoryResponse,
+    NonMonotonicTimestamps,
+)
+from metricq.history_client import (
+    HistoryCache,
+    HistoryRequestType,
+    HistoryResponse,
+    HistoryResponseType,
+    TimeAggregateArrays,
+    TimeValueArrays,
+)
 
 pytestmark = pytest.mark.asyncio
 
@@ -147,6 +169,130 @@ async def test_timelime_empty(
     assert list(await history_client.history_raw_timeline(DEFAULT_METRIC)) == []
 
 
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def numpy_available(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    if request.param:
+        pytest.importorskip("numpy")
+    monkeypatch.setattr("metricq.history_client._numpy_available", request.param)
+
+
+def _aggregates_from_arrays(arrays: TimeAggregateArrays) -> list[TimeAggregate]:
+    return [
+        TimeAggregate(
+            timestamp=Timestamp(timestamp),
+            minimum=minimum,
+            maximum=maximum,
+            sum=sum,
+            count=count,
+            integral_ns=integral_ns,
+            active_time=Timedelta(active_time),
+        )
+        for timestamp, minimum, maximum, sum, count, integral_ns, active_time in zip(
+            arrays.timestamp,
+            arrays.minimum,
+            arrays.maximum,
+            arrays.sum,
+            arrays.count,
+            arrays.integral_ns,
+            arrays.active_time,
+        )
+    ]
+
+
+VALUES_RESPONSE_FIELDS: dict[str, Any] = dict(
+    time_delta=[1000, 10, 20, 5], value=[1.0, 2.0, 3.0, 4.0]
+)
+
+AGGREGATES_RESPONSE_FIELDS: dict[str, Any] = dict(
+    time_delta=[1000, 10, 20],
+    aggregate=[
+        history_pb2.HistoryResponse.Aggregate(
+            minimum=0.0, maximum=2.0, sum=4.0, count=4, integral=10.0, active_time=10
+        ),
+        history_pb2.HistoryResponse.Aggregate(
+            minimum=1.0, maximum=1.0, sum=3.0, count=3, integral=0.0, active_time=0
+        ),
+        history_pb2.HistoryResponse.Aggregate(count=0),
+    ],
+)
+
+LEGACY_RESPONSE_FIELDS: dict[str, Any] = dict(
+    time_delta=[1000, 10],
+    value_min=[0.0, 1.0],
+    value_max=[2.0, 3.0],
+    value_avg=[1.0, 2.0],
+)
+
+
+@pytest.mark.parametrize(
+    "response_fields",
+    [
+        VALUES_RESPONSE_FIELDS,
+        AGGREGATES_RESPONSE_FIELDS,
+        LEGACY_RESPONSE_FIELDS,
+        dict(time_delta=[]),
+    ],
+)
+def test_history_response_values_array_matches_values(
+    response_fields: dict[str, Any]
+) -> None:
+    response = mock_history_response(**response_fields)
+    arrays = response.values_array(convert=True)
+
+    assert arrays.timestamp.typecode == "q"
+    assert arrays.value.typecode == "d"
+    # compare via repr to treat NaN values as equal
+    assert repr(
+        [TimeValue(Timestamp(t), v) for t, v in zip(arrays.timestamp, arrays.value)]
+    ) == repr(list(response.values(convert=True)))
+
+
+@pytest.mark.parametrize(
+    "response_fields",
+    [
+        VALUES_RESPONSE_FIELDS,
+        AGGREGATES_RESPONSE_FIELDS,
+        LEGACY_RESPONSE_FIELDS,
+        dict(time_delta=[]),
+        dict(time_delta=[1000], value=[1.0]),
+    ],
+)
+@pytest.mark.usefixtures("numpy_available")
+def test_history_response_aggregates_array_matches_aggregates(
+    response_fields: dict[str, Any]
+) -> None:
+    response = mock_history_response(**response_fields)
+    arrays = response.aggregates_array(convert=True)
+
+    assert _aggregates_from_arrays(arrays) == list(response.aggregates(convert=True))
+
+
+@pytest.mark.usefixtures("numpy_available")
+def test_history_response_aggregates_array_mean() -> None:
+    response = mock_history_response(**AGGREGATES_RESPONSE_FIELDS)
+
+    assert repr(list(response.aggregates_array().mean)) == repr(
+        [aggregate.mean for aggregate in response.aggregates()]
+    )
+
+
+def test_history_response_arrays_wrong_mode() -> None:
+    with pytest.raises(ValueError):
+        mock_history_response(**VALUES_RESPONSE_FIELDS).aggregates_array()
+
+    with pytest.raises(ValueError):
+        mock_history_response(**AGGREGATES_RESPONSE_FIELDS).values_array()
+
+
+def test_history_response_aggregates_array_non_monotonic() -> None:
+    response = mock_history_response(time_delta=[1000, 10, 0], value=[1.0, 2.0, 3.0])
+
+    with pytest.raises(NonMonotonicTimestamps):
+        response.aggregates_array(convert=True)
+
+
 async def test_get_metrics_historic_only(
     history_client: HistoryClient,
     mocker: MockerFixture,
@@ -189,3 +335,496 @@ async def test_get_metrics_historic_override(
     await history_client.get_metrics(
         selector=DEFAULT_METRIC, historic=historic_override
     )
+
+
+async def test_history_data_request_many(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    in_flight = 0
+    max_in_flight = 0
+
+    async def mocked(
+        _client: HistoryClient, metric: str, *args: Any, **_kwargs: Any
+    ) -> HistoryResponse:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        try:
+            # Let later requests overtake earlier ones
+            await asyncio.sleep(0.01 if metric == "test.slow" else 0)
+            if metric == "test.error":
+                raise HistoryError("A test error")
+            return mock_history_response(time_delta=[1000], value=[1.0])
+        finally:
+            in_flight -= 1
+
+    mocker.patch(f"{__name__}.HistoryClient.history_data_request", mocked)
+
+    metrics = ["test.slow", "test.error"] + [f"test.foo{i}" for i in range(10)]
+    results = {
+        metric: result
+        async for metric, result in history_client.history_data_request_many(
+            metrics, None, None, None, concurrency=3
+        )
+    }
+
+    assert max_in_flight == 3
+    assert results.keys() == set(metrics)
+    assert isinstance(results.pop("test.error"), HistoryError)
+    assert all(isinstance(result, HistoryResponse) for result in results.values())
+
+
+async def test_history_data_request_many_stop_early(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    started: list[str] = []
+
+    async def mocked(
+        _client: HistoryClient, metric: str, *args: Any, **_kwargs: Any
+    ) -> HistoryResponse:
+        started.append(metric)
+        await asyncio.sleep(0 if metric == "test.fast" else 10)
+        return mock_history_response(time_delta=[])
+
+    mocker.patch(f"{__name__}.HistoryClient.history_data_request", mocked)
+
+    results = cast(
+        AsyncGenerator[tuple[str, HistoryResponse | Exception], None],
+        history_client.history_data_request_many(
+            ["test.fast", "test.slow", "test.slower", "test.slowest"],
+            None,
+            None,
+            None,
+            concurrency=2,
+        ),
+    )
+    async for metric, _result in results:
+        assert metric == "test.fast"
+        break
+    await results.aclose()
+
+    assert started == ["test.fast", "test.slow", "test.slower"]
+
+
+async def test_history_data_request_many_failing_metrics(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    async def mocked(
+        _client: HistoryClient, metric: str, *args: Any, **_kwargs: Any
+    ) -> HistoryResponse:
+        return mock_history_response(time_delta=[])
+
+    mocker.patch(f"{__name__}.HistoryClient.history_data_request", mocked)
+
+    def metrics() -> Iterator[str]:
+        yield "test.foo"
+        raise RuntimeError("A test error")
+
+    received = []
+    with pytest.raises(RuntimeError, match="A test error"):
+        async for metric, _result in history_client.history_data_request_many(
+            metrics(), None, None, None, concurrency=2
+        ):
+            received.append(metric)
+    assert received == ["test.foo"]
+
+
+async def test_history_data_request_many_invalid_concurrency(
+    history_client: HistoryClient,
+) -> None:
+    with pytest.raises(ValueError):
+        async for _ in history_client.history_data_request_many(
+            ["test.foo"], None, None, None, concurrency=0
+        ):
+            pass
+
+
+RAW_TIMELINE = [TimeValue(Timestamp(t), float(t)) for t in range(0, 1000, 10)]
+
+
+def patch_raw_timeline_requests(
+    mocker: MockerFixture,
+) -> list[tuple[Timestamp, Timestamp]]:
+    """Serve RAW_TIMELINE for FLEX_TIMELINE requests (including both
+    boundaries) and record the requested windows."""
+    requested_windows: list[tuple[Timestamp, Timestamp]] = []
+
+    async def mocked(
+        _client: HistoryClient,
+        metric: str,
+        start_time: Timestamp,
+        end_time: Timestamp,
+        *args: Any,
+        **_kwargs: Any,
+    ) -> HistoryResponse:
+        requested_windows.append((start_time, end_time))
+        time_values = [
+            tv for tv in RAW_TIMELINE if start_time <= tv.timestamp <= end_time
+        ]
+        timestamps = [tv.timestamp.posix_ns for tv in time_values]
+        return mock_history_response(
+            time_delta=[b - a for a, b in zip([0] + timestamps, timestamps)],
+            value=[tv.value for tv in time_values],
+        )
+
+    mocker.patch(f"{__name__}.HistoryClient.history_data_request", mocked)
+    return requested_windows
+
+
+async def test_history_raw_timeline_window(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    requested_windows = patch_raw_timeline_requests(mocker)
+
+    values = await history_client.history_raw_timeline(
+        DEFAULT_METRIC,
+        start_time=Timestamp(0),
+        end_time=Timestamp(995),
+        window=Timedelta(100),
+        concurrency=3,
+    )
+
+    assert list(values) == RAW_TIMELINE
+    assert len(requested_windows) == 10
+    assert requested_windows[0] == (Timestamp(0), Timestamp(100))
+    assert requested_windows[-1] == (Timestamp(900), Timestamp(995))
+
+
+async def test_history_raw_timeline_window_points(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    requested_windows = patch_raw_timeline_requests(mocker)
+
+    async def history_aggregate(*args: Any, **kwargs: Any) -> TimeAggregate:
+        return TimeAggregate(
+            timestamp=Timestamp(0),
+            minimum=0.0,
+            maximum=0.0,
+            sum=0.0,
+            count=len(RAW_TIMELINE),
+            integral_ns=0.0,
+            active_time=Timedelta(1000),
+        )
+
+    mocker.patch(f"{__name__}.HistoryClient.history_aggregate", history_aggregate)
+
+    values = await history_client.history_raw_timeline(
+        DEFAULT_METRIC,
+        start_time=Timestamp(0),
+        end_time=Timestamp(1000),
+        window_points=25,
+    )
+
+    assert list(values) == RAW_TIMELINE
+    assert len(requested_windows) == 4
+
+
+async def test_history_raw_timeline_window_requires_bounds(
+    history_client: HistoryClient,
+) -> None:
+    with pytest.raises(ValueError):
+        await history_client.history_raw_timeline(
+            DEFAULT_METRIC, start_time=Timestamp(0), window=Timedelta(100)
+        )
+
+
+async def test_iter_raw_timeline(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    requested_windows = patch_raw_timeline_requests(mocker)
+
+    batches = [
+        batch
+        async for batch in history_client.iter_raw_timeline(
+            DEFAULT_METRIC, Timestamp(0), Timestamp(995), chunk=Timedelta(100)
+        )
+    ]
+
+    assert len(requested_windows) == 10
+    assert len(batches) == 10
+    assert [
+        TimeValue(Timestamp(timestamp), value)
+        for batch in batches
+        for timestamp, value in zip(batch.timestamp, batch.value)
+    ] == RAW_TIMELINE
+
+
+async def test_iter_raw_timeline_stop_early(
+    history_client: HistoryClient, mocker: MockerFixture
+) -> None:
+    cancelled: list[Timestamp] = []
+
+    async def mocked(
+        _client: HistoryClient,
+        metric: str,
+        start_time: Timestamp,
+        *args: Any,
+        **_kwargs: Any,
+    ) -> HistoryResponse:
+        if start_time > Timestamp(0):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(start_time)
+                raise
+        return mock_history_response(time_delta=[10], value=[1.0])
+
+    mocker.patch(f"{__name__}.HistoryClient.history_data_request", mocked)
+
+    batches = cast(
+        AsyncGenerator[TimeValueArrays, None],
+        history_client.iter_raw_timeline(
+            DEFAULT_METRIC,
+            Timestamp(0),
+            Timestamp(995),
+            chunk=Timedelta(100),
+            concurrency=3,
+        ),
+    )
+    async for _batch in batches:
+        break
+    await batches.aclose()
+
+    # Closing the iterator cancels the prefetched requests right away
+    assert sorted(cancelled) == [Timestamp(100), Timestamp(200)]
+
+
+async def test_iter_raw_timeline_requires_chunk(
+    history_client: HistoryClient,
+) -> None:
+    with pytest.raises(ValueError):
+        async for _ in history_client.iter_raw_timeline(
+            DEFAULT_METRIC, Timestamp(0), Timestamp(995)
+        ):
+            pass
+
+
+def test_history_cache_immutable_ttl(mocker: MockerFixture) -> None:
+    now = 1000.0
+    mocker.patch("metricq.history_client.time.monotonic", lambda: now)
+
+    cache = HistoryCache(ttl={HistoryRequestType.AGGREGATE: 1}, immutable_ttl=60)
+    response = mock_history_response(time_delta=[])
+
+    past = Timestamp.now() - Timedelta.from_s(60)
+    future = Timestamp.now() + Timedelta.from_s(60)
+    for end_time in (past, future, None):
+        cache.store(
+            DEFAULT_METRIC, None, end_time, None, HistoryRequestType.AGGREGATE, response
+        )
+    cache.store(
+        DEFAULT_METRIC, None, past, None, HistoryRequestType.FLEX_TIMELINE, response
+    )
+    assert len(cache) == 3
+
+    now += 30
+    assert (
+        cache.lookup(DEFAULT_METRIC, None, past, None, HistoryRequestType.AGGREGATE)
+        is response
+    )
+    assert (
+        cache.lookup(DEFAULT_METRIC, None, future, None, HistoryRequestType.AGGREGATE)
+        is None
+    )
+    assert (
+        cache.lookup(DEFAULT_METRIC, None, None, None, HistoryRequestType.AGGREGATE)
+        is None
+    )
+    assert (
+        cache.lookup(DEFAULT_METRIC, None, past, None, HistoryRequestType.FLEX_TIMELINE)
+        is None
+    )
+    # Lookups of request types that are not cached are no misses
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_history_cache_evicts_least_recently_used() -> None:
+    cache = HistoryCache(max_points=4)
+    response = mock_history_response(time_delta=[1, 1], value=[1.0, 2.0])
+
+    def store(metric: str) -> None:
+        cache.store(metric, None, None, None, HistoryRequestType.AGGREGATE, response)
+
+    def lookup(metric: str) -> Optional[HistoryResponse]:
+        return cache.lookup(metric, None, None, None, HistoryRequestType.AGGREGATE)
+
+    store("a")
+    store("b")
+    assert lookup("a") is response
+
+    store("c")
+
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert lookup("b") is None
+    assert lookup("a") is response
+    assert lookup("c") is response
+
+
+class _PublishingHistoryClient(HistoryClient):
+    """A HistoryClient whose history exchange answers every request immediately"""
+
+    def __init__(self, response: HistoryResponse, **kwargs: Any):
+        super().__init__(token="history-test", url="amqps://invalid./", **kwargs)
+        self.response = response
+        self.published: list[aio_pika.abc.AbstractMessage] = []
+
+        self.history_response_queue = MagicMock()
+        self.history_exchange = MagicMock()
+        self.history_exchange.publish = AsyncMock(side_effect=self._publish)
+        self._history_connection_watchdog = MagicMock()
+        self._history_connection_watchdog.established = AsyncMock()
+
+    async def _publish(
+        self, message: aio_pika.abc.AbstractMessage, routing_key: str
+    ) -> None:
+        self.published.append(message)
+        assert message.correlation_id is not None
+        self._event_loop.call_soon(
+            self._request_futures[message.correlation_id].set_result, self.response
+        )
+
+
+async def test_history_cache_hit() -> None:
+    cache = HistoryCache()
+    client = _PublishingHistoryClient(
+        mock_history_response(time_delta=[1000], value=[1.0]), cache=cache
+    )
+
+    first = await client.history_last_value(DEFAULT_METRIC)
+    second = await client.history_last_value(DEFAULT_METRIC)
+
+    assert first == second == TimeValue(Timestamp(1000), 1.0)
+    assert len(client.published) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+async def test_history_cache_distinguishes_requests() -> None:
+    cache = HistoryCache()
+    client = _PublishingHistoryClient(mock_history_response(time_delta=[]), cache=cache)
+
+    await client.history_data_request(DEFAULT_METRIC, None, None, None)
+    await client.history_data_request("test.bar", None, None, None)
+    await client.history_data_request(DEFAULT_METRIC, Timestamp(0), None, None)
+    await client.history_data_request(
+        DEFAULT_METRIC, None, None, None, request_type=HistoryRequestType.AGGREGATE
+    )
+
+    assert len(client.published) == 4
+    assert (cache.hits, cache.misses) == (0, 4)
+
+
+async def test_history_cache_uncached_request_type() -> None:
+    cache = HistoryCache(ttl={HistoryRequestType.AGGREGATE: 10})
+    client = _PublishingHistoryClient(mock_history_response(time_delta=[]), cache=cache)
+
+    for _ in range(2):
+        await client.history_data_request(DEFAULT_METRIC, None, None, None)
+
+    assert len(client.published) == 2
+    assert len(cache) == 0
+
+
+async def test_history_cache_expiry(mocker: MockerFixture) -> None:
+    now = 1000.0
+    mocker.patch("metricq.history_client.time.monotonic", lambda: now)
+
+    cache = HistoryCache(ttl={HistoryRequestType.LAST_VALUE: 1}, immutable_ttl=60)
+    client = _PublishingHistoryClient(mock_history_response(time_delta=[]), cache=cache)
+
+    await client.history_last_value(DEFAULT_METRIC)
+    now += 0.5
+    await client.history_last_value(DEFAULT_METRIC)
+    assert len(client.published) == 1
+
+    now += 1
+    await client.history_last_value(DEFAULT_METRIC)
+    assert len(client.published) == 2
+
+
+async def test_history_request_coalescing() -> None:
+    client = _PublishingHistoryClient(
+        mock_history_response(time_delta=[1000], value=[1.0])
+    )
+
+    responses = await asyncio.gather(
+        *(
+            client.history_data_request(DEFAULT_METRIC, None, None, None)
+            for _ in range(5)
+        ),
+        client.history_data_request("test.bar", None, None, None),
+    )
+
+    assert len(client.published) == 2
+    assert all(response is responses[0] for response in responses)
+    assert client._inflight_requests == {}
+
+
+async def test_history_request_coalescing_caller_timeout() -> None:
+    client = _PublishingHistoryClient(mock_history_response(time_delta=[]))
+    # Never answer the first publish, answer all later ones
+    client.history_exchange.publish = AsyncMock()  # type: ignore
+
+    first = asyncio.ensure_future(
+        client.history_data_request(DEFAULT_METRIC, None, None, None, timeout=10)
+    )
+    await asyncio.sleep(0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.history_data_request(
+            DEFAULT_METRIC, None, None, None, timeout=0.01
+        )
+
+    # The original request is not affected by the timeout of the second caller
+    assert not first.done()
+    assert len(client._inflight_requests) == 1
+    (request,) = client._inflight_requests.values()
+
+    # The last caller to leave cancels the shared request
+    first.cancel()
+    await asyncio.gather(first, request, return_exceptions=True)
+    assert request.cancelled()
+    assert client._inflight_requests == {}
+    assert client._inflight_waiters == {}
+
+
+async def test_history_request_coalescing_longer_timeout() -> None:
+    response = mock_history_response(time_delta=[])
+    client = _PublishingHistoryClient(response)
+    client.history_exchange.publish = AsyncMock()  # type: ignore
+
+    first = asyncio.ensure_future(
+        client.history_data_request(DEFAULT_METRIC, None, None, None, timeout=0.01)
+    )
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(
+        client.history_data_request(DEFAULT_METRIC, None, None, None, timeout=10)
+    )
+
+    with pytest.raises(asyncio.TimeoutError):
+        await first
+
+    # The request outlives the deadline of the caller that started it
+    assert not second.done()
+    (future,) = client._request_futures.values()
+    future.set_result(response)
+    assert await second is response
+
+
+async def test_history_client_teardown_cancels_requests() -> None:
+    client = _PublishingHistoryClient(mock_history_response(time_delta=[]))
+    client.history_exchange.publish = AsyncMock()  # type: ignore
+    client._history_connection_watchdog.stop = AsyncMock()  # type: ignore[method-assign]
+
+    caller = asyncio.ensure_future(
+        client.history_data_request(DEFAULT_METRIC, None, None, None)
+    )
+    await asyncio.sleep(0)
+    (request,) = client._inflight_requests.values()
+
+    await client.teardown()
+
+    assert request.cancelled()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    assert client._inflight_requests == {}
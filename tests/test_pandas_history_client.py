@@ -0,0 +1,122 @@
+import math
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from metricq import Timedelta, history_pb2
+from metricq.exceptions import InvalidHistoryResponse
+from metricq.history_client import HistoryResponse
+
+pd = pytest.importorskip("pandas")
+
+from metricq.pandas import PandasHistoryClient  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+DEFAULT_METRIC = "test.foo"
+
+
+@pytest.fixture
+def client() -> PandasHistoryClient:
+    return PandasHistoryClient(token="history-test", url="amqps://invalid./")
+
+
+def patch_history_data_request(mocker: MockerFixture, **response_fields: Any) -> None:
+    response = HistoryResponse(history_pb2.HistoryResponse(**response_fields))
+
+    async def mocked(*args: Any, **_kwargs: Any) -> HistoryResponse:
+        return response
+
+    mocker.patch("metricq.HistoryClient.history_data_request", mocked)
+
+
+async def test_pandas_history_aggregate_timeline(
+    client: PandasHistoryClient, mocker: MockerFixture
+) -> None:
+    patch_history_data_request(
+        mocker,
+        time_delta=[1000, 10, 10],
+        aggregate=[
+            history_pb2.HistoryResponse.Aggregate(
+                minimum=0.0,
+                maximum=2.0,
+                sum=4.0,
+                count=4,
+                integral=10.0,
+                active_time=10,
+            ),
+            history_pb2.HistoryResponse.Aggregate(
+                minimum=1.0, maximum=1.0, sum=3.0, count=3, integral=0.0, active_time=0
+            ),
+            history_pb2.HistoryResponse.Aggregate(count=0),
+        ],
+    )
+
+    df = await client.history_aggregate_timeline(
+        DEFAULT_METRIC, interval_max=Timedelta(10)
+    )
+    aggregates = list(
+        (
+            await client.client.history_data_request(DEFAULT_METRIC, None, None, None)
+        ).aggregates()
+    )
+
+    assert str(df["timestamp"].dtype) == "datetime64[ns, UTC]"
+    assert str(df["active_time"].dtype) == "timedelta64[ns]"
+    assert len(df) == len(aggregates)
+    for row, aggregate in zip(df.itertuples(), aggregates):
+        assert row.timestamp.value == aggregate.timestamp.posix_ns
+        assert row.active_time.value == aggregate.active_time.ns
+        for column in (
+            "minimum",
+            "maximum",
+            "sum",
+            "count",
+            "integral_ns",
+            "mean",
+            "mean_integral",
+            "mean_sum",
+            "integral_s",
+        ):
+            expected = getattr(aggregate, column)
+            actual = getattr(row, column)
+            assert actual == expected or (math.isnan(actual) and math.isnan(expected))
+
+
+async def test_pandas_history_raw_timeline(
+    client: PandasHistoryClient, mocker: MockerFixture
+) -> None:
+    patch_history_data_request(mocker, time_delta=[1000, 10], value=[1.0, 2.0])
+
+    df = await client.history_raw_timeline(DEFAULT_METRIC)
+
+    assert list(df.columns) == ["timestamp", "value"]
+    assert list(df["timestamp"]) == [
+        pd.Timestamp(1000, unit="ns", tz="UTC"),
+        pd.Timestamp(1010, unit="ns", tz="UTC"),
+    ]
+    assert list(df["value"]) == [1.0, 2.0]
+
+
+async def test_pandas_history_raw_timeline_empty(
+    client: PandasHistoryClient, mocker: MockerFixture
+) -> None:
+    patch_history_data_request(mocker, time_delta=[])
+
+    df = await client.history_raw_timeline(DEFAULT_METRIC)
+
+    assert list(df.columns) == ["timestamp", "value"]
+    assert len(df) == 0
+
+
+async def test_pandas_history_raw_timeline_aggregates(
+    client: PandasHistoryClient, mocker: MockerFixture
+) -> None:
+    patch_history_data_request(
+        mocker, time_delta=[1000], aggregate=[history_pb2.HistoryResponse.Aggregate()]
+    )
+
+    with pytest.raises(InvalidHistoryResponse):
+        await client.history_raw_timeline(DEFAULT_METRIC)
@@ -0,0 +1,112 @@
+from array import array
+from unittest.mock import patch
+
+import pytest
+
+from metricq import Timestamp, TimeValue
+
+np = pytest.importorskip("numpy")
+
+from metricq.ring_buffer import RingBuffer, RingBufferSink  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+def filled(capacity: int, count: int, batch: int) -> RingBuffer:
+    buffer = RingBuffer(capacity)
+    for start in range(0, count, batch):
+        timestamps = range(start, min(start + batch, count))
+        buffer.extend([t * 10 for t in timestamps], [float(t) for t in timestamps])
+    return buffer
+
+
+async def test_ring_buffer_empty() -> None:
+    buffer = RingBuffer(4)
+    assert len(buffer) == 0
+    assert buffer.latest() is None
+    assert buffer.minimum() is None
+    assert buffer.maximum() is None
+    assert buffer.mean() is None
+    timestamps, values = buffer.range()
+    assert len(timestamps) == len(values) == 0
+
+
+async def test_ring_buffer_invalid() -> None:
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+    with pytest.raises(ValueError):
+        RingBuffer(4).extend([1, 2], [1.0])
+
+
+@pytest.mark.parametrize("batch", [1, 3, 7, 20])
+async def test_ring_buffer_keeps_latest(batch: int) -> None:
+    # 13 data points into 7 slots, wrapping around
+    buffer = filled(capacity=7, count=13, batch=batch)
+
+    assert len(buffer) == 7
+    assert buffer.latest() == TimeValue(Timestamp(120), 12.0)
+    timestamps, values = buffer.range()
+    assert list(timestamps) == [t * 10 for t in range(6, 13)]
+    assert list(values) == [float(t) for t in range(6, 13)]
+
+
+@pytest.mark.parametrize(
+    ("start", "end"),
+    [
+        (None, None),
+        (Timestamp(60), Timestamp(130)),
+        (Timestamp(75), Timestamp(105)),
+        (Timestamp(95), None),
+        (None, Timestamp(80)),
+        (Timestamp(0), Timestamp(60)),
+        (Timestamp(200), None),
+        (Timestamp(90), Timestamp(90)),
+    ],
+)
+async def test_ring_buffer_window(
+    start: Timestamp | None, end: Timestamp | None
+) -> None:
+    buffer = filled(capacity=7, count=13, batch=5)
+    expected = [
+        float(t)
+        for t in range(6, 13)
+        if (start is None or t * 10 >= start.posix_ns)
+        and (end is None or t * 10 < end.posix_ns)
+    ]
+
+    _, values = buffer.range(start, end)
+    assert list(values) == expected
+    if expected:
+        assert buffer.minimum(start, end) == min(expected)
+        assert buffer.maximum(start, end) == max(expected)
+        assert buffer.mean(start, end) == pytest.approx(sum(expected) / len(expected))
+    else:
+        assert buffer.minimum(start, end) is None
+        assert buffer.mean(start, end) is None
+
+
+async def test_ring_buffer_clear() -> None:
+    buffer = filled(capacity=4, count=6, batch=2)
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.extend([1000], [1.0])
+    assert buffer.latest() == TimeValue(Timestamp(1000), 1.0)
+
+
+async def test_ring_buffer_sink() -> None:
+    sink = RingBufferSink(capacity=3, token="sink-test", url="amqps://test.invalid")
+
+    await sink.on_data_chunk(
+        "test.foo", array("q", [10, 20, 30, 40]), array("d", [1.0, 2.0, 3.0, 4.0])
+    )
+    await sink.on_data_chunk("test.bar", array("q", [10]), array("d", [5.0]))
+
+    assert sink["test.foo"].latest() == TimeValue(Timestamp(40), 4.0)
+    assert sink["test.foo"].minimum() == 2.0
+    assert len(sink["test.bar"]) == 1
+    with pytest.raises(KeyError):
+        sink["test.baz"]
+
+    with patch("metricq.sink.Sink.unsubscribe"):
+        await sink.unsubscribe(["test.foo"])
+    assert list(sink.buffers) == ["test.bar"]
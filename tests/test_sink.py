@@ -0,0 +1,475 @@
+import asyncio
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, call
+
+import aio_pika
+import pytest
+
+from metricq import Sink, Timestamp
+from metricq.datachunk_pb2 import DataChunk
+from metricq.sink import _BatchedAcks
+from metricq.timeseries import JsonDict
+
+pytestmark = pytest.mark.asyncio
+
+
+class _TestSink(Sink):
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(token="sink-test", url="amqps://test.invalid", **kwargs)
+        self.data = AsyncMock()
+
+    async def on_data(self, metric: str, timestamp: Timestamp, value: float) -> None:
+        await self.data(metric, timestamp, value)
+
+
+@pytest.fixture
+def sink() -> _TestSink:
+    return _TestSink()
+
+
+DATA_CHUNK = DataChunk(time_delta=[1000, 10, 20], value=[1.0, 2.0, 3.0])
+
+
+async def test_sink_on_data_chunk_decodes_absolute_timestamps(sink: _TestSink) -> None:
+    on_data_chunk = AsyncMock()
+    sink.on_data_chunk = on_data_chunk  # type: ignore
+
+    await sink._on_data_chunk("test.foo", DATA_CHUNK)
+
+    on_data_chunk.assert_awaited_once()
+    metric, timestamps, values = on_data_chunk.call_args.args
+    assert metric == "test.foo"
+    assert timestamps == array("q", [1000, 1010, 1030])
+    assert values == array("d", [1.0, 2.0, 3.0])
+
+
+async def test_sink_on_data_chunk_falls_back_to_on_data(sink: _TestSink) -> None:
+    await sink._on_data_chunk("test.foo", DATA_CHUNK)
+
+    assert sink.data.call_args_list == [
+        call("test.foo", Timestamp(1000), 1.0),
+        call("test.foo", Timestamp(1010), 2.0),
+        call("test.foo", Timestamp(1030), 3.0),
+    ]
+
+
+async def test_sink_on_data_chunk_empty(sink: _TestSink) -> None:
+    await sink._on_data_chunk("test.foo", DataChunk())
+
+    sink.data.assert_not_called()
+
+
+def data_message(metric: str, data_chunk: DataChunk) -> MagicMock:
+    message = MagicMock(spec=aio_pika.abc.AbstractIncomingMessage)
+    message.body = data_chunk.SerializeToString()
+    message.routing_key = metric
+    message.app_id = "source-test"
+    message.process.return_value = AsyncMock()
+    return message
+
+
+async def test_sink_on_data_message_decodes_chunk(sink: _TestSink) -> None:
+    on_data_chunk = AsyncMock()
+    sink.on_data_chunk = on_data_chunk  # type: ignore
+
+    await sink._on_data_message(data_message("test.foo", DATA_CHUNK))
+
+    on_data_chunk.assert_awaited_once_with(
+        "test.foo", array("q", [1000, 1010, 1030]), array("d", [1.0, 2.0, 3.0])
+    )
+
+
+async def test_sink_on_data_message_overridden_on_data_chunk() -> None:
+    """Sinks overriding _on_data_chunk still receive the parsed DataChunk"""
+    received: list[tuple[str, DataChunk]] = []
+
+    class _OverridingSink(_TestSink):
+        async def _on_data_chunk(self, metric: str, data_chunk: DataChunk) -> None:
+            received.append((metric, data_chunk))
+
+    await _OverridingSink()._on_data_message(data_message("test.foo", DATA_CHUNK))
+
+    assert received == [("test.foo", DATA_CHUNK)]
+
+
+async def test_sink_requires_on_data_or_on_data_chunk() -> None:
+    class _IncompleteSink(Sink):
+        pass
+
+    class _ChunkSink(Sink):
+        async def on_data_chunk(
+            self, metric: str, timestamps: "array[int]", values: "array[float]"
+        ) -> None:
+            pass
+
+    with pytest.raises(TypeError):
+        _IncompleteSink(token="sink-test", url="amqps://test.invalid")
+    _ChunkSink(token="sink-test", url="amqps://test.invalid")
+
+
+async def test_sink_prefetch_count_default(sink: _TestSink) -> None:
+    assert sink.prefetch_count == 400
+
+
+@pytest.mark.parametrize(
+    ("invalid", "exc_type"),
+    [(0, ValueError), (0x10000, ValueError), (1.5, TypeError)],
+)
+async def test_sink_prefetch_count_invalid(
+    invalid: Any, exc_type: type[Exception]
+) -> None:
+    with pytest.raises(exc_type):
+        _TestSink(prefetch_count=invalid)
+
+
+async def test_sink_set_prefetch_count(sink: _TestSink) -> None:
+    await sink.set_prefetch_count(1000)
+    assert sink.prefetch_count == 1000
+
+    sink.data_channel = AsyncMock()
+    await sink.set_prefetch_count(10)
+    assert sink.prefetch_count == 10
+    sink.data_channel.set_qos.assert_awaited_once_with(prefetch_count=10)
+
+
+async def test_sink_adaptive_prefetch() -> None:
+    sink = _TestSink(
+        adaptive_prefetch=True,
+        prefetch_memory_limit=1000,
+    )
+    sink.data_channel = AsyncMock()
+    sink.PREFETCH_ADAPT_INTERVAL = 0
+    sink.on_data_chunk = AsyncMock()  # type: ignore
+
+    message = data_message("test.foo", DATA_CHUNK)
+    await sink._on_data_message(message)
+    assert sink._prefetch_task is not None
+    await sink._prefetch_task
+
+    # Chunks are handled quickly, so the prefetch count is bounded by the memory limit
+    assert sink.chunk_bytes == len(message.body)
+    assert sink.prefetch_count == 1000 // len(message.body)
+    assert sink.outstanding_bytes == 0
+
+
+async def test_sink_adaptive_prefetch_processing_time(sink: _TestSink) -> None:
+    sink.processing_time = 0.01
+    sink.chunk_bytes = 100.0
+    assert sink._adaptive_prefetch_count() == 100
+
+    sink.processing_time = 10.0
+    assert sink._adaptive_prefetch_count() == 1
+
+    sink.processing_time = 0.0
+    assert sink._adaptive_prefetch_count() == sink.PREFETCH_MAX
+
+
+async def test_sink_workers_invalid() -> None:
+    with pytest.raises(ValueError):
+        _TestSink(workers=0)
+
+
+async def test_sink_workers_keep_metrics_in_order() -> None:
+    sink = _TestSink(workers=2)
+    handled: list[tuple[str, float]] = []
+    release: dict[str, asyncio.Event] = {
+        "test.foo": asyncio.Event(),
+        "test.bar": asyncio.Event(),
+    }
+
+    async def on_data_chunk(
+        metric: str, timestamps: "array[int]", values: "array[float]"
+    ) -> None:
+        await release[metric].wait()
+        handled.extend((metric, value) for value in values)
+
+    sink.on_data_chunk = on_data_chunk  # type: ignore
+    sink._worker_tasks = [asyncio.create_task(sink._data_worker()) for _ in range(2)]
+    try:
+        messages = [
+            data_message("test.foo", DataChunk(time_delta=[1], value=[1.0])),
+            data_message("test.foo", DataChunk(time_delta=[2], value=[2.0])),
+            data_message("test.bar", DataChunk(time_delta=[1], value=[3.0])),
+        ]
+        for message in messages:
+            await sink._on_data_message(message)
+        assert sink.outstanding_bytes == sum(len(m.body) for m in messages)
+
+        # test.bar is handled while test.foo is blocked
+        release["test.bar"].set()
+        await asyncio.sleep(0.01)
+        assert handled == [("test.bar", 3.0)]
+
+        release["test.foo"].set()
+        await asyncio.sleep(0.01)
+        assert handled == [("test.bar", 3.0), ("test.foo", 1.0), ("test.foo", 2.0)]
+        assert sink._waiting_chunks == {}
+        assert sink.outstanding_bytes == 0
+        for message in messages:
+            message.process.assert_called_once_with(requeue=True)
+    finally:
+        await sink.teardown()
+
+
+def acked_message(delivery_tag: int) -> MagicMock:
+    message = data_message("test.foo", DATA_CHUNK)
+    message.delivery_tag = delivery_tag
+    return message
+
+
+async def test_sink_batched_acks_invalid() -> None:
+    with pytest.raises(ValueError):
+        _TestSink(ack_batch_size=0)
+    with pytest.raises(ValueError):
+        _TestSink(
+            ack_batch_size=10,
+            ack_interval=0,
+        )
+
+
+async def test_sink_batched_acks_prefix() -> None:
+    acks = _BatchedAcks(batch_size=2, interval=10)
+    messages = [acked_message(tag) for tag in range(1, 5)]
+    for message in messages:
+        acks.deliver(message)
+
+    # Nothing can be acknowledged before the first delivery has been handled
+    acks.settle(messages[1])
+    acks.settle(messages[2])
+    await acks.flush()
+    for message in messages:
+        message.ack.assert_not_called()
+
+    # A single ack covers the first three deliveries
+    acks.settle(messages[0])
+    await asyncio.sleep(0)
+    messages[2].ack.assert_awaited_once_with(multiple=True)
+    messages[0].ack.assert_not_called()
+    messages[1].ack.assert_not_called()
+
+    # Remaining messages are acknowledged on flush
+    acks.settle(messages[3])
+    await acks.flush()
+    messages[3].ack.assert_awaited_once_with(multiple=True)
+
+
+async def test_sink_batched_acks_interval() -> None:
+    acks = _BatchedAcks(batch_size=100, interval=0.01)
+    message = acked_message(1)
+    acks.deliver(message)
+    acks.settle(message)
+    message.ack.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    message.ack.assert_awaited_once_with(multiple=True)
+
+
+async def test_sink_batched_acks_reject() -> None:
+    acks = _BatchedAcks(batch_size=1, interval=10)
+    failed, handled = acked_message(1), acked_message(2)
+    acks.deliver(failed)
+    acks.deliver(handled)
+
+    await acks.reject(failed)
+    failed.nack.assert_awaited_once_with(requeue=True)
+    acks.settle(handled)
+    await acks.flush()
+    failed.ack.assert_not_called()
+    handled.ack.assert_awaited_once_with(multiple=True)
+
+
+async def test_sink_batched_acks_reset() -> None:
+    acks = _BatchedAcks(batch_size=1, interval=10)
+    stale = acked_message(1)
+    acks.deliver(stale)
+    acks.reset()
+
+    # Deliveries on the previous channel are never acknowledged
+    acks.settle(stale)
+    await acks.flush()
+    stale.ack.assert_not_called()
+
+
+async def test_sink_on_data_message_batched_acks() -> None:
+    sink = _TestSink(ack_batch_size=2)
+    sink.on_data_chunk = AsyncMock(side_effect=[None, RuntimeError("test"), None])  # type: ignore
+    messages = [acked_message(tag) for tag in range(1, 4)]
+
+    await sink._on_data_message(messages[0])
+    with pytest.raises(RuntimeError):
+        await sink._on_data_message(messages[1])
+    await sink._on_data_message(messages[2])
+    await asyncio.sleep(0)
+
+    for message in messages:
+        message.process.assert_not_called()
+    messages[1].nack.assert_awaited_once_with(requeue=True)
+    messages[0].ack.assert_not_called()
+    messages[2].ack.assert_awaited_once_with(multiple=True)
+
+
+class _OffloadingSink(Sink):
+    @staticmethod
+    def process_chunk(
+        metric: str, timestamps: "array[int]", values: "array[float]"
+    ) -> tuple[str, int, float]:
+        return metric, os.getpid(), sum(values)
+
+
+@pytest.mark.parametrize("executor_type", [ThreadPoolExecutor, ProcessPoolExecutor])
+async def test_sink_executor(
+    executor_type: type[ThreadPoolExecutor | ProcessPoolExecutor],
+) -> None:
+    with executor_type(max_workers=1) as executor:
+        sink = _OffloadingSink(
+            token="sink-test", url="amqps://test.invalid", executor=executor
+        )
+        on_processed_chunk = AsyncMock()
+        sink.on_processed_chunk = on_processed_chunk  # type: ignore
+        message = data_message("test.foo", DATA_CHUNK)
+
+        await sink._on_data_message(message)
+
+    message.process.assert_called_once_with(requeue=True)
+    on_processed_chunk.assert_awaited_once()
+    metric, (processed_metric, pid, total) = on_processed_chunk.call_args.args
+    assert metric == processed_metric == "test.foo"
+    assert total == 6.0
+    assert (pid != os.getpid()) == (executor_type is ProcessPoolExecutor)
+
+
+async def test_sink_executor_requires_process_chunk() -> None:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(TypeError):
+            _TestSink(executor=executor)
+
+
+async def test_sink_executor_bounds_offloaded_chunks() -> None:
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    class _BlockingSink(Sink):
+        @staticmethod
+        def process_chunk(
+            metric: str, timestamps: "array[int]", values: "array[float]"
+        ) -> None:
+            started.release()
+            release.wait()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sink = _BlockingSink(
+            token="sink-test",
+            url="amqps://test.invalid",
+            executor=executor,
+            max_offloaded_chunks=2,
+        )
+        tasks = [
+            asyncio.create_task(
+                sink._on_data_message(data_message("test.foo", DATA_CHUNK))
+            )
+            for _ in range(3)
+        ]
+        for _ in range(2):
+            assert await asyncio.to_thread(started.acquire, timeout=1)
+        # The third chunk waits until one of the others is done
+        assert not await asyncio.to_thread(started.acquire, timeout=0.05)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+
+def subscribe_rpc(function: str, metrics: list[str], **kwargs: Any) -> JsonDict:
+    return {
+        "dataServerAddress": "amqps://test.invalid",
+        "dataQueue": "sink-test-data",
+        "metrics": {metric: {} for metric in metrics},
+    }
+
+
+async def test_sink_subscribe_pages(sink: _TestSink) -> None:
+    sink.SUBSCRIBE_PAGE_SIZE = 2
+    sink.rpc = AsyncMock(side_effect=subscribe_rpc)  # type: ignore
+
+    async def sink_config(**kwargs: Any) -> None:
+        sink._data_queue = MagicMock(spec=aio_pika.abc.AbstractQueue)
+        sink._data_queue.name = kwargs["dataQueue"]
+
+    sink.sink_config = AsyncMock(side_effect=sink_config)  # type: ignore
+
+    metrics = ["test.a", "test.b", "test.c", "test.d", "test.e"]
+    response = await sink.subscribe(metrics, expires=60)
+
+    assert [c.kwargs["metrics"] for c in sink.rpc.call_args_list] == [
+        ["test.a", "test.b"],
+        ["test.c", "test.d"],
+        ["test.e"],
+    ]
+    sink.sink_config.assert_awaited_once()
+    # All but the first page reuse the data queue
+    assert "dataQueue" not in sink.rpc.call_args_list[0].kwargs
+    for c in sink.rpc.call_args_list[1:]:
+        assert c.kwargs["dataQueue"] == "sink-test-data"
+    assert response["dataQueue"] == "sink-test-data"
+    assert list(response["metrics"]) == metrics
+    assert sink._subscribed_metrics == set(metrics)
+
+    sink.rpc.reset_mock()
+    await sink.unsubscribe(["test.a", "test.b", "test.c"])
+
+    assert [c.kwargs["metrics"] for c in sink.rpc.call_args_list] == [
+        ["test.a", "test.b"],
+        ["test.c"],
+    ]
+    assert sink._subscribed_metrics == {"test.d", "test.e"}
+
+
+async def test_sink_subscribe_failed_keeps_args(sink: _TestSink) -> None:
+    sink._data_queue = MagicMock(spec=aio_pika.abc.AbstractQueue)
+    sink._data_queue.name = "sink-test-data"
+    sink._subscribed_metrics = {"test.a"}
+    sink._subscribe_args = {"expires": 60}
+    sink.rpc = AsyncMock(side_effect=RuntimeError("rpc failed"))  # type: ignore
+
+    with pytest.raises(RuntimeError):
+        await sink.subscribe(["test.b"], expires=1)
+
+    # A reconnect resubscribes with the arguments that the manager accepted
+    assert sink._subscribe_args == {"expires": 60}
+    assert sink._subscribed_metrics == {"test.a"}
+
+
+async def test_sink_resubscribe_pages_without_metadata(sink: _TestSink) -> None:
+    sink.SUBSCRIBE_PAGE_SIZE = 2
+    sink.rpc = AsyncMock(side_effect=subscribe_rpc)  # type: ignore
+    sink._declare_data_queue = AsyncMock()  # type: ignore
+    sink._data_queue = MagicMock(spec=aio_pika.abc.AbstractQueue)
+    sink._data_queue.name = "sink-test-data"
+    sink._subscribed_metrics = {"test.a", "test.b", "test.c"}
+    sink._subscribe_args = {"expires": 60}
+
+    await sink._resubscribe(MagicMock())
+
+    assert sorted(
+        metric for c in sink.rpc.call_args_list for metric in c.kwargs["metrics"]
+    ) == ["test.a", "test.b", "test.c"]
+    assert len(sink.rpc.call_args_list) == 2
+    for c in sink.rpc.call_args_list:
+        assert c.kwargs["metadata"] is False
+        assert c.kwargs["expires"] == 60
+        assert c.kwargs["dataQueue"] == "sink-test-data"
+    sink._declare_data_queue.assert_awaited_once_with("sink-test-data")
+    sink._data_queue.consume.assert_awaited_once()
+
+
+async def test_sink_reconnect_latency(sink: _TestSink) -> None:
+    sink._reconnected_at = time.monotonic() - 1.0
+
+    await sink._on_data_message(data_message("test.foo", DATA_CHUNK))
+
+    assert sink.reconnect_latency is not None
+    assert sink.reconnect_latency >= 1.0
+    assert sink._reconnected_at is None
@@ -1,9 +1,15 @@
-from collections.abc import Iterator
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from typing import Any
 from unittest.mock import AsyncMock, call, patch
 
+import aio_pika
 import pytest
 
-from metricq import MetadataDict, Source
+from metricq import BufferPolicy, MetadataDict, Source, Timedelta, Timestamp
+from metricq.datachunk_pb2 import DataChunk
+from metricq.exceptions import PublishFailed
 
 pytestmark = pytest.mark.asyncio
 
@@ -68,3 +74,385 @@ async def test_source_declare_metrics_augment_chunk_size_override(
             "test.chunk-size.disabled": {"chunkSize": None},
         },
     )
+
+
+async def test_source_chunk_max_age_propagates(source: _TestSource) -> None:
+    source.chunk_max_age = 2
+    assert source["test.foo"].chunk_max_age == Timedelta.from_s(2)
+
+
+async def test_source_chunk_flusher_sends_expired_chunks(source: _TestSource) -> None:
+    source.chunk_size = 1000
+    source.chunk_max_age = 0.01
+    source["test.slow"].chunk_max_age = 0.05
+
+    with patch.object(source, "_send", new_callable=AsyncMock) as send:
+        flusher = asyncio.create_task(source._chunk_flusher())
+        try:
+            await source.send("test.slow", Timestamp(1000), 1.0)
+            await source.send("test.fast", Timestamp(1000), 1.0)
+            await source.send("test.fast", Timestamp(2000), 2.0)
+            assert not send.called
+
+            await asyncio.sleep(0.03)
+            assert [c.args[0] for c in send.call_args_list] == ["test.fast"]
+            assert source["test.fast"].empty
+
+            await asyncio.sleep(0.05)
+            assert [c.args[0] for c in send.call_args_list] == [
+                "test.fast",
+                "test.slow",
+            ]
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+
+async def test_source_chunk_flusher_skips_sent_chunks(source: _TestSource) -> None:
+    source.chunk_size = 2
+    source.chunk_max_age = 0.01
+
+    with patch.object(source, "_send", new_callable=AsyncMock) as send:
+        flusher = asyncio.create_task(source._chunk_flusher())
+        try:
+            await source.send("test.foo", Timestamp(1000), 1.0)
+            await source.send("test.foo", Timestamp(2000), 2.0)
+            send.assert_called_once()
+
+            await asyncio.sleep(0.03)
+            send.assert_called_once()
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+
+async def test_source_chunk_flusher_survives_failed_flush(source: _TestSource) -> None:
+    source.chunk_size = 1000
+    source.chunk_max_age = 0.01
+
+    with patch.object(
+        source, "_send", new_callable=AsyncMock, side_effect=[OSError("test"), None]
+    ) as send:
+        flusher = asyncio.create_task(source._chunk_flusher())
+        try:
+            await source.send("test.foo", Timestamp(1000), 1.0)
+
+            # The failed chunk is flushed again once it expires again
+            await asyncio.sleep(0.05)
+            assert send.call_count == 2
+            assert source["test.foo"].empty
+            assert not flusher.done()
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+
+async def test_source_declare_metrics_does_not_modify_metadata(
+    source: _TestSource,
+) -> None:
+    metadata: MetadataDict = {"unit": "W"}
+    await source.declare_metrics({"test.foo": metadata})
+
+    assert metadata == {"unit": "W"}
+
+
+async def test_source_adaptive_chunking_propagates(source: _TestSource) -> None:
+    source.chunk_target_latency = 0.5
+    source.chunk_max_message_rate = 20
+
+    source_metric = source["test.foo"]
+    assert source_metric.adaptive
+    assert source_metric.chunk_target_latency == Timedelta.from_ms(500)
+    assert source_metric.chunk_max_message_rate == 20.0
+
+
+async def test_source_redeclares_adapted_chunk_size(source: _TestSource) -> None:
+    source.chunk_target_latency = 1
+    source.chunk_size_redeclare_interval = 0
+    await source.declare_metrics(
+        {"test.adaptive": {"unit": "W"}, "test.explicit": {"chunkSize": 10}}
+    )
+    source.rpc.reset_mock()
+
+    # Small changes are not worth a re-declaration
+    source["test.adaptive"]._adapt_chunk_size(1.9)
+    source["test.explicit"]._adapt_chunk_size(1000.0)
+    await asyncio.sleep(0)
+    assert source._redeclare_task is None
+
+    source["test.adaptive"]._adapt_chunk_size(100.0)
+    assert source._redeclare_task is not None
+    await source._redeclare_task
+
+    assert_declare_metrics(
+        source, metrics={"test.adaptive": {"unit": "W", "chunkSize": 100}}
+    )
+    assert source._declared_chunk_sizes["test.adaptive"] == 100
+
+
+async def test_source_send_many(source: _TestSource) -> None:
+    source.chunk_size = 2
+
+    with patch.object(source, "_send", new_callable=AsyncMock) as send:
+        await source.send_many("test.foo", [1000, 2000, 3000], [1.0, 2.0, 3.0])
+
+        send.assert_called_once()
+        assert list(source["test.foo"].chunk.value) == [3.0]
+
+
+async def test_source_buffer_limits(source: _TestSource) -> None:
+    source.chunk_size = None
+    source.buffer_limit = 3
+    source.metric_buffer_limit = 2
+    source.buffer_policy = BufferPolicy.DROP_NEWEST
+
+    for i in range(3):
+        source["test.foo"].append(Timestamp(i), float(i))
+        source["test.bar"].append(Timestamp(i), float(i))
+
+    assert source["test.foo"].buffer_limit == 2
+    assert source.buffered_points == 3
+    assert source.dropped_points == 3
+
+    with patch.object(source, "_send", new_callable=AsyncMock):
+        await source.flush()
+    assert source.buffered_points == 0
+
+
+@pytest.mark.parametrize(("invalid", "exc_type"), [(0, ValueError), ("1", TypeError)])
+async def test_source_buffer_limit_invalid(
+    source: _TestSource, invalid: Any, exc_type: type[Exception]
+) -> None:
+    with pytest.raises(exc_type):
+        source.buffer_limit = invalid
+    with pytest.raises(exc_type):
+        source.metric_buffer_limit = invalid
+
+
+@pytest.fixture
+def spooling_source(tmp_path: Path) -> Iterator[_TestSource]:
+    with patch("metricq.source.Source.rpc"):
+        source = _TestSource(
+            token="source-test",
+            url="amqps://test.invalid",
+            spool=tmp_path,
+            spool_replay_rate=None,
+        )
+        source.data_exchange = AsyncMock()
+        yield source
+
+
+def published(source: _TestSource) -> list[tuple[str, list[float]]]:
+    assert source.data_exchange is not None
+    result = []
+    for (message,), kwargs in source.data_exchange.publish.call_args_list:  # type: ignore
+        chunk = DataChunk()
+        chunk.ParseFromString(message.body)
+        result.append((kwargs["routing_key"], list(chunk.value)))
+    return result
+
+
+async def test_source_spool_replays_after_reconnect(
+    spooling_source: _TestSource,
+) -> None:
+    source = spooling_source
+    assert source.spool is not None
+    watchdog = source._data_connection_watchdog
+    watchdog.start()
+    try:
+        # The data connection is down, chunks are spooled instead of waiting
+        await asyncio.wait_for(source.send("test.foo", Timestamp(1000), 1.0), 1)
+        await asyncio.wait_for(source.send("test.bar", Timestamp(1000), 2.0), 1)
+        assert len(source.spool) == 2
+        assert published(source) == []
+
+        source._on_data_connection_reconnect(None)
+        assert source._spool_replay_task is not None
+        await asyncio.wait_for(source._spool_replay_task, 1)
+
+        assert len(source.spool) == 0
+        assert published(source) == [("test.foo", [1.0]), ("test.bar", [2.0])]
+
+        # Once replayed, chunks are published directly
+        await source.send("test.foo", Timestamp(2000), 3.0)
+        assert published(source)[-1] == ("test.foo", [3.0])
+        assert source._spool_replay_task.done()
+    finally:
+        await watchdog.stop()
+
+
+async def test_source_spool_failed_publish(spooling_source: _TestSource) -> None:
+    source = spooling_source
+    assert source.spool is not None and source.data_exchange is not None
+    source.data_exchange.publish.side_effect = PublishFailed("test")  # type: ignore
+    watchdog = source._data_connection_watchdog
+    watchdog.start()
+    watchdog.set_established()
+    try:
+        await source.send("test.foo", Timestamp(1000), 1.0)
+
+        # The chunk is not lost, and is retried in the background
+        assert len(source.spool) == 1
+        assert source["test.foo"].empty
+        assert source._spool_replay_task is not None
+        source._spool_replay_task.cancel()
+    finally:
+        await watchdog.stop()
+
+
+@pytest.fixture
+async def reliable_source() -> AsyncIterator[_TestSource]:
+    with patch("metricq.source.Source.rpc"):
+        source = _TestSource(
+            token="source-test",
+            url="amqps://test.invalid",
+            reliable=True,
+            confirm_window=2,
+            confirm_timeout=0.1,
+        )
+        source.CONFIRM_RETRY_INTERVAL = 0
+        source.data_exchange = AsyncMock()
+        watchdog = source._data_connection_watchdog
+        watchdog.start()
+        watchdog.set_established()
+        yield source
+        await watchdog.stop()
+
+
+async def test_source_reliable_enables_publisher_confirms(
+    reliable_source: _TestSource,
+) -> None:
+    assert reliable_source._data_publisher_confirms
+    assert not _TestSource(token="test", url="amqps://test.invalid").reliable
+
+
+async def test_source_reliable_confirm_window(reliable_source: _TestSource) -> None:
+    source = reliable_source
+    assert source.data_exchange is not None
+    confirmations: asyncio.Queue[asyncio.Future[None]] = asyncio.Queue()
+
+    async def publish(*args: Any, **kwargs: Any) -> None:
+        confirmation = asyncio.get_running_loop().create_future()
+        confirmations.put_nowait(confirmation)
+        await confirmation
+
+    source.data_exchange.publish.side_effect = publish  # type: ignore
+
+    await source.send("test.foo", Timestamp(1000), 1.0)
+    await source.send("test.foo", Timestamp(2000), 2.0)
+    assert source.unconfirmed_chunks == 2
+
+    # The window is full, sending waits for the oldest confirmation
+    blocked = asyncio.create_task(source.send("test.foo", Timestamp(3000), 3.0))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    (await confirmations.get()).set_result(None)
+    await asyncio.wait_for(blocked, 1)
+
+    flush = asyncio.create_task(source.flush())
+    for _ in range(2):
+        (await confirmations.get()).set_result(None)
+    await asyncio.wait_for(flush, 1)
+
+    assert source.unconfirmed_chunks == 0
+    assert published(source) == [
+        ("test.foo", [1.0]),
+        ("test.foo", [2.0]),
+        ("test.foo", [3.0]),
+    ]
+    assert source.confirm_latency is not None and source.confirm_latency >= 0
+    assert source.republished_chunks == 0
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        aio_pika.exceptions.DeliveryError(None, None),  # type: ignore
+        asyncio.TimeoutError(),
+    ],
+)
+async def test_source_reliable_retries_unconfirmed(
+    reliable_source: _TestSource, failure: Exception
+) -> None:
+    source = reliable_source
+    assert source.data_exchange is not None
+    source.data_exchange.publish.side_effect = [failure, None]  # type: ignore
+
+    await source.send("test.foo", Timestamp(1000), 1.0)
+    await asyncio.wait_for(source.flush(), 1)
+
+    assert published(source) == [("test.foo", [1.0]), ("test.foo", [1.0])]
+    assert source.republished_chunks == 1
+    assert source.unconfirmed_chunks == 0
+
+
+async def test_source_reliable_spools_failed_publish(tmp_path: Path) -> None:
+    with patch("metricq.source.Source.rpc"):
+        source = _TestSource(
+            token="source-test",
+            url="amqps://test.invalid",
+            reliable=True,
+            spool=tmp_path,
+            spool_replay_rate=None,
+        )
+    source.data_exchange = AsyncMock()
+    source.data_exchange.publish.side_effect = [
+        aio_pika.exceptions.DeliveryError(None, None),  # type: ignore
+        None,
+        None,
+    ]
+    watchdog = source._data_connection_watchdog
+    watchdog.start()
+    watchdog.set_established()
+    try:
+        await source.send("test.foo", Timestamp(1000), 1.0)
+        await asyncio.wait_for(source.flush(), 1)
+        assert source.spool is not None
+        # Handed to the spool instead of being retried, and replayed from there
+        assert source.republished_chunks == 0
+        assert source._spool_replay_task is not None
+        await asyncio.wait_for(source._spool_replay_task, 1)
+        assert len(source.spool) == 0
+
+        await source.send("test.foo", Timestamp(2000), 2.0)
+        await asyncio.wait_for(source.flush(), 1)
+        assert published(source) == [
+            ("test.foo", [1.0]),
+            ("test.foo", [1.0]),
+            ("test.foo", [2.0]),
+        ]
+    finally:
+        await watchdog.stop()
+
+
+async def test_source_reliable_spools_unconfirmed_on_teardown(
+    tmp_path: Path,
+) -> None:
+    with patch("metricq.source.Source.rpc"):
+        source = _TestSource(
+            token="source-test",
+            url="amqps://test.invalid",
+            reliable=True,
+            confirm_timeout=0.01,
+            spool=tmp_path,
+        )
+    source.data_exchange = AsyncMock()
+
+    async def publish(*args: Any, **kwargs: Any) -> None:
+        # The broker never confirms
+        await asyncio.Event().wait()
+
+    source.data_exchange.publish.side_effect = publish
+    watchdog = source._data_connection_watchdog
+    watchdog.start()
+    watchdog.set_established()
+    try:
+        await source.send("test.foo", Timestamp(1000), 1.0)
+        assert source.spool is not None and len(source.spool) == 0
+
+        await source._abandon_unconfirmed()
+        assert source.unconfirmed_chunks == 0
+        assert len(source.spool) == 1
+        assert source.spool.peek()[0] == "test.foo"
+    finally:
+        await watchdog.stop()
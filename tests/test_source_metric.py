@@ -1,14 +1,18 @@
+import asyncio
+from array import array
 from collections.abc import Iterator
+from itertools import accumulate
 from math import isnan
 from typing import Any, Optional, cast
-from unittest.mock import AsyncMock, create_autospec
+from unittest.mock import AsyncMock, create_autospec, patch
 
 import pytest
 
 from metricq import Timedelta, Timestamp
 from metricq.datachunk_pb2 import DataChunk
+from metricq.exceptions import PublishFailed
 from metricq.source import Source
-from metricq.source_metric import ChunkSize, SourceMetric
+from metricq.source_metric import BufferPolicy, ChunkSize, SourceMetric, _BufferUsage
 
 pytestmark = pytest.mark.asyncio
 
@@ -155,3 +159,410 @@ async def test_source_send_error_value_is_none(source_metric: SourceMetric) -> N
     source_metric.source.attach_mock(AsyncMock(side_effect=send), "_send")  # type: ignore
 
     await source_metric.error(Timestamp(0))
+
+
+async def test_source_metric_send_many_chunked(source: Source) -> None:
+    sent: list[list[float]] = []
+
+    async def send(metric_id: str, chunk: DataChunk) -> None:
+        sent.append(list(chunk.value))
+
+    source.attach_mock(AsyncMock(side_effect=send), "_send")  # type: ignore
+    source_metric = SourceMetric("test.foo", source=source, chunk_size=3)
+
+    await source_metric.send(Timestamp(0), 0.0)
+    await source_metric.send_many(range(1, 9), [float(v) for v in range(1, 9)])
+
+    assert sent == [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0], [6.0, 7.0, 8.0]]
+    assert source_metric.empty
+
+
+@pytest.mark.parametrize(
+    ("max_age", "expected"),
+    [
+        (None, None),
+        (1, Timedelta.from_s(1)),
+        (0.5, Timedelta.from_ms(500)),
+        (Timedelta.from_ms(10), Timedelta.from_ms(10)),
+    ],
+)
+def test_source_metric_chunk_max_age_valid(
+    source: Source, max_age: Any, expected: Optional[Timedelta]
+) -> None:
+    source_metric = SourceMetric("test.foo", source=source, chunk_max_age=max_age)
+    assert source_metric.chunk_max_age == expected
+
+
+@pytest.mark.parametrize(
+    ("invalid", "exc_type"),
+    [
+        (0, ValueError),
+        (-1.0, ValueError),
+        (Timedelta(0), ValueError),
+        ("1", TypeError),
+        (True, TypeError),
+    ],
+)
+def test_source_metric_chunk_max_age_invalid(
+    source: Source, invalid: Any, exc_type: type[Exception]
+) -> None:
+    with pytest.raises(exc_type):
+        SourceMetric("test.foo", source=source, chunk_max_age=invalid)
+
+
+async def test_source_metric_chunk_max_age_schedules_flush(
+    source: Source, metric: _Metric
+) -> None:
+    source_metric = SourceMetric(
+        "test.foo", source=source, chunk_size=10, chunk_max_age=1
+    )
+
+    await source_metric.send(*next(metric))
+    await source_metric.send(*next(metric))
+
+    # Only the first data point of a chunk schedules a flush
+    source._schedule_chunk_flush.assert_called_once()  # type: ignore
+    (scheduled_metric, deadline), _ = source._schedule_chunk_flush.call_args  # type: ignore
+    assert scheduled_metric is source_metric
+    assert deadline == source_metric._flush_deadline
+
+    await source_metric.flush()
+    assert source_metric._flush_deadline is None
+
+
+async def test_source_metric_append_during_flush(
+    source_metric: SourceMetric, metric: _Metric
+) -> None:
+    """Data points appended while a chunk is being sent must not get lost"""
+    sent: list[list[float]] = []
+
+    async def send(metric_id: str, chunk: DataChunk) -> None:
+        await asyncio.sleep(0)
+        sent.append(list(chunk.value))
+
+    source_metric.source.attach_mock(AsyncMock(side_effect=send), "_send")  # type: ignore
+    source_metric.chunk_size = None
+
+    source_metric.append(*next(metric))
+    flush = asyncio.create_task(source_metric.flush())
+    await asyncio.sleep(0)
+    source_metric.append(*next(metric))
+    await flush
+    await source_metric.flush()
+
+    assert len(sent) == 2
+    assert len(sent[0]) == 1 and len(sent[1]) == 1
+    assert source_metric.empty
+
+
+async def test_source_metric_failed_flush_keeps_data(source: Source) -> None:
+    source_metric = SourceMetric("test.foo", source=source, chunk_size=None)
+    appended = False
+
+    async def send(metric_id: str, chunk: DataChunk) -> None:
+        nonlocal appended
+        if not appended:
+            # Data point arriving while the first attempt to send is in progress
+            source_metric.append(Timestamp(3000), 3.0)
+            appended = True
+            raise PublishFailed("test")
+
+    source_metric.source.attach_mock(AsyncMock(side_effect=send), "_send")  # type: ignore
+
+    source_metric.append(Timestamp(1000), 1.0)
+    source_metric.append(Timestamp(2000), 2.0)
+
+    with pytest.raises(PublishFailed):
+        await source_metric.flush()
+
+    # Unsent and new data points are merged into a single, valid chunk
+    assert list(source_metric.chunk.time_delta) == [1000, 1000, 1000]
+    assert list(source_metric.chunk.value) == [1.0, 2.0, 3.0]
+
+    source_metric.append(Timestamp(4000), 4.0)
+    assert list(source_metric.chunk.time_delta) == [1000, 1000, 1000, 1000]
+
+
+@pytest.mark.parametrize(
+    ("invalid", "exc_type"),
+    [
+        (0, ValueError),
+        (-2.5, ValueError),
+        ("10", TypeError),
+        (True, TypeError),
+    ],
+)
+def test_source_metric_chunk_max_message_rate_invalid(
+    source: Source, invalid: Any, exc_type: type[Exception]
+) -> None:
+    with pytest.raises(exc_type):
+        SourceMetric("test.foo", source=source, chunk_max_message_rate=invalid)
+
+
+@pytest.mark.parametrize(
+    ("target_latency", "max_message_rate", "rate", "expected"),
+    [
+        # As many data points as are produced within the target latency
+        (1, None, 100.0, 100),
+        (0.1, None, 100.0, 10),
+        # Slow metrics are sent point by point
+        (1, None, 0.2, 1),
+        # The message rate limit takes precedence over the target latency
+        (0.01, 10, 1000.0, 100),
+        (None, 10, 1000.0, 100),
+        (None, 10, 5.0, 1),
+        # Never larger than the upper bound
+        (10, None, 1e9, SourceMetric.ADAPTIVE_CHUNK_SIZE_MAX),
+    ],
+)
+def test_source_metric_adapt_chunk_size(
+    source: Source,
+    target_latency: Optional[float],
+    max_message_rate: Optional[float],
+    rate: float,
+    expected: int,
+) -> None:
+    source_metric = SourceMetric(
+        "test.foo",
+        source=source,
+        chunk_target_latency=target_latency,
+        chunk_max_message_rate=max_message_rate,
+    )
+    assert source_metric.adaptive
+
+    source_metric._adapt_chunk_size(rate)
+
+    assert source_metric.chunk_size == expected
+    if expected != 1:
+        source._on_chunk_size_changed.assert_called_once_with(source_metric)  # type: ignore
+    else:
+        assert not source._on_chunk_size_changed.called  # type: ignore
+
+
+async def test_source_metric_adaptive_chunking_follows_rate(
+    source: Source, metric: _Metric
+) -> None:
+    clock = 0.0
+    source_metric = SourceMetric("test.foo", source=source, chunk_target_latency=1)
+
+    with patch("metricq.source_metric.time.monotonic", side_effect=lambda: clock):
+        # 100 data points per second, sent one by one until the first rate window is over
+        for _ in range(100):
+            await source_metric.send(*next(metric))
+            clock += 0.01
+        await source_metric.send(*next(metric))
+
+        assert source_metric.rate is not None
+        assert source_metric.rate == pytest.approx(101)
+        assert source_metric.chunk_size == int(source_metric.rate)
+        assert len(source_metric.source._send.mock_calls) == 101  # type: ignore
+
+        # The rate halves, the smoothed rate follows
+        for _ in range(101):
+            await source_metric.send(*next(metric))
+            clock += 0.02
+
+        assert source_metric.rate is not None
+        assert 50 < source_metric.rate < 101
+        assert source_metric.chunk_size == int(source_metric.rate)
+
+    # Chunks of adaptive metrics are flushed after the target latency
+    assert source._schedule_chunk_flush.called  # type: ignore
+    assert source_metric._flush_deadline == pytest.approx(clock - 0.02 + 1)
+
+
+@pytest.mark.parametrize(
+    ("timestamps", "values"),
+    [
+        ([1000, 3000, 4000], [1.0, 2.0, 3.0]),
+        (array("q", [1000, 3000, 4000]), array("d", [1.0, 2.0, 3.0])),
+        (range(1000, 5000, 1000), (1.0, 2.0, 3.0, 4.0)),
+    ],
+)
+def test_source_metric_extend_matches_append(
+    source: Source, timestamps: Any, values: Any
+) -> None:
+    appended = SourceMetric("test.foo", source=source, chunk_size=None)
+    extended = SourceMetric("test.foo", source=source, chunk_size=None)
+
+    appended.append(Timestamp(500), 0.0)
+    for timestamp, value in zip(timestamps, values):
+        appended.append(Timestamp(timestamp), value)
+
+    extended.append(Timestamp(500), 0.0)
+    extended.extend(timestamps, values)
+
+    assert extended.chunk == appended.chunk
+    assert extended.previous_timestamp == appended.previous_timestamp
+
+
+def test_source_metric_extend_numpy(source: Source) -> None:
+    np = pytest.importorskip("numpy")
+    source_metric = SourceMetric("test.foo", source=source, chunk_size=None)
+
+    source_metric.extend(
+        np.array([10, 20, 50], dtype=np.int64), np.array([1.0, 2.0, 3.0])
+    )
+    # Non-contiguous arrays are converted element-wise
+    source_metric.extend(np.arange(60, 100, 10)[::2], np.ones(4)[::2])
+
+    assert list(source_metric.chunk.time_delta) == [10, 10, 30, 10, 20]
+    assert list(source_metric.chunk.value) == [1.0, 2.0, 3.0, 1.0, 1.0]
+
+
+def test_source_metric_extend_length_mismatch(source_metric: SourceMetric) -> None:
+    with pytest.raises(ValueError):
+        source_metric.extend([1, 2], [1.0])
+    assert source_metric.empty
+
+
+def appended(source_metric: SourceMetric) -> list[tuple[int, float]]:
+    return list(
+        zip(accumulate(source_metric.chunk.time_delta), source_metric.chunk.value)
+    )
+
+
+@pytest.mark.parametrize(
+    ("policy", "expected"),
+    [
+        (BufferPolicy.DROP_NEWEST, [1, 2, 3, 4]),
+        (BufferPolicy.DROP_OLDEST, [3, 4, 5, 6]),
+        # [1, 2, 3, 4] -> [2, 4] + [5, 6]
+        (BufferPolicy.DOWNSAMPLE, [2, 4, 5, 6]),
+        # Appending cannot block, new data points are dropped instead
+        (BufferPolicy.BLOCK, [1, 2, 3, 4]),
+    ],
+)
+def test_source_metric_buffer_policy(
+    source: Source, policy: BufferPolicy, expected: list[int]
+) -> None:
+    source_metric = SourceMetric(
+        "test.foo", source=source, chunk_size=None, buffer_limit=4, buffer_policy=policy
+    )
+
+    for i in range(1, 7):
+        source_metric.append(Timestamp(i * 1000), float(i))
+
+    assert appended(source_metric) == [(i * 1000, float(i)) for i in expected]
+    assert source_metric.dropped_points == 2
+    assert source_metric.buffered_points == 4
+    assert source_metric._buffer_usage.points == 4
+
+
+def test_source_metric_buffer_policy_extend(source: Source) -> None:
+    source_metric = SourceMetric(
+        "test.foo",
+        source=source,
+        chunk_size=None,
+        buffer_limit=4,
+        buffer_policy=BufferPolicy.DROP_OLDEST,
+    )
+
+    source_metric.extend([1000, 2000, 3000], [1.0, 2.0, 3.0])
+    source_metric.extend([4000, 5000, 6000, 7000], [4.0, 5.0, 6.0, 7.0])
+
+    assert appended(source_metric) == [
+        (4000, 4.0),
+        (5000, 5.0),
+        (6000, 6.0),
+        (7000, 7.0),
+    ]
+    assert source_metric.dropped_points == 3
+
+
+def test_source_metric_buffer_limit_shared(source: Source) -> None:
+    usage = _BufferUsage(limit=3)
+    foo = SourceMetric(
+        "test.foo",
+        source=source,
+        chunk_size=None,
+        buffer_policy=BufferPolicy.DROP_NEWEST,
+        buffer_usage=usage,
+    )
+    bar = SourceMetric(
+        "test.bar",
+        source=source,
+        chunk_size=None,
+        buffer_policy=BufferPolicy.DROP_NEWEST,
+        buffer_usage=usage,
+    )
+
+    foo.append(Timestamp(1000), 1.0)
+    foo.append(Timestamp(2000), 2.0)
+    bar.append(Timestamp(1000), 1.0)
+    bar.append(Timestamp(2000), 2.0)
+
+    assert usage.points == 3
+    assert foo.dropped_points == 0 and bar.dropped_points == 1
+
+
+async def test_source_metric_buffer_policy_block(
+    source: Source, metric: _Metric
+) -> None:
+    connected = asyncio.Event()
+
+    async def send(metric_id: str, chunk: DataChunk) -> None:
+        await connected.wait()
+
+    source.attach_mock(AsyncMock(side_effect=send), "_send")  # type: ignore
+    source_metric = SourceMetric(
+        "test.foo", source=source, chunk_size=None, buffer_limit=3
+    )
+
+    # A chunk waiting for the connection to be established...
+    source_metric.append(*next(metric))
+    source_metric.append(*next(metric))
+    flush = asyncio.create_task(source_metric.flush())
+    await asyncio.sleep(0)
+
+    # ...and new data points fill up the buffer
+    await asyncio.wait_for(source_metric.send(*next(metric)), timeout=1)
+    blocked = asyncio.create_task(source_metric.send(*next(metric)))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert source_metric.buffered_points == 3
+
+    connected.set()
+    await asyncio.wait_for(blocked, timeout=1)
+    await flush
+    assert source_metric.dropped_points == 0
+    assert source_metric.buffered_points == 2
+
+
+async def test_source_metric_buffer_policy_block_failed_flush(
+    source: Source, metric: _Metric
+) -> None:
+    source.attach_mock(AsyncMock(side_effect=PublishFailed("test")), "_send")  # type: ignore
+    source_metric = SourceMetric(
+        "test.foo", source=source, chunk_size=None, buffer_limit=2
+    )
+    await source_metric.send(*next(metric))
+    await source_metric.send(*next(metric))
+
+    # Blocked senders try to send buffered data points themselves and see the error
+    with pytest.raises(PublishFailed):
+        await asyncio.wait_for(source_metric.send(*next(metric)), timeout=1)
+    assert source_metric.buffered_points == 2
+
+
+async def test_source_metric_buffer_policy_block_shared(
+    source: Source, metric: _Metric
+) -> None:
+    source.attach_mock(AsyncMock(), "_send")  # type: ignore
+    usage = _BufferUsage(limit=4)
+    foo = SourceMetric("test.foo", source=source, chunk_size=10, buffer_usage=usage)
+    bar = SourceMetric("test.bar", source=source, chunk_size=1, buffer_usage=usage)
+
+    for _ in range(4):
+        await foo.send(*next(metric))
+    assert source._send.call_count == 0  # type: ignore
+
+    # The partial chunk of the other metric is sent to make room
+    await asyncio.wait_for(bar.send(*next(metric)), timeout=1)
+    assert source._send.call_count == 2  # type: ignore
+    assert [call.args[0] for call in source._send.call_args_list] == [  # type: ignore
+        "test.foo",
+        "test.bar",
+    ]
+    assert foo.empty and bar.empty
+    assert usage.points == 0
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+
+from metricq.spool import Spool
+
+
+def drain(spool: Spool) -> list[tuple[str, bytes]]:
+    chunks = []
+    while spool:
+        chunks.append(spool.peek())
+        spool.pop()
+    return chunks
+
+
+def test_spool_fifo(tmp_path: Path) -> None:
+    spool = Spool(tmp_path)
+    assert len(spool) == 0
+
+    spool.append("test.foo", b"first")
+    spool.append("test.bar", b"second")
+    spool.append("test.foo", b"")
+
+    assert len(spool) == 3
+    assert drain(spool) == [
+        ("test.foo", b"first"),
+        ("test.bar", b"second"),
+        ("test.foo", b""),
+    ]
+    with pytest.raises(IndexError):
+        spool.peek()
+
+
+def test_spool_survives_restart(tmp_path: Path) -> None:
+    spool = Spool(tmp_path)
+    spool.append("test.foo", b"published")
+    spool.append("test.foo", b"pending")
+    spool.pop()
+    spool.close()
+
+    # Only chunks that were not published are recovered
+    spool = Spool(tmp_path)
+    assert len(spool) == 1
+    spool.append("test.foo", b"new")
+    assert drain(spool) == [("test.foo", b"pending"), ("test.foo", b"new")]
+
+
+def test_spool_segments(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segment_size=64)
+
+    spool.append("test.foo", b"x" * 40)
+    spool.append("test.foo", b"y" * 40)
+    # Chunks larger than a segment get a segment of their own
+    spool.append("test.foo", b"z" * 100)
+    assert len(list(tmp_path.iterdir())) == 3
+
+    spool.pop()
+    # Published segments are removed
+    assert len(list(tmp_path.iterdir())) == 2
+
+    assert drain(spool) == [("test.foo", b"y" * 40), ("test.foo", b"z" * 100)]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_ignores_torn_record(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, segment_size=1024)
+    spool.append("test.foo", b"complete")
+    spool.append("test.foo", b"torn")
+    spool.close()
+
+    # Corrupt the last byte of the second chunk, as if writing it was interrupted
+    (segment,) = tmp_path.iterdir()
+    data = bytearray(segment.read_bytes())
+    data[data.index(b"torn") + 3] = 0
+    segment.write_bytes(data)
+
+    spool = Spool(tmp_path, segment_size=1024)
+    assert len(spool) == 1
+    spool.append("test.foo", b"next")
+    spool.close()
+
+    spool = Spool(tmp_path, segment_size=1024)
+    assert drain(spool) == [("test.foo", b"complete"), ("test.foo", b"next")]
@@ -0,0 +1,152 @@
+import asyncio
+from array import array
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from metricq import Subscriber, Timestamp
+from metricq.drain import Chunk
+
+pytestmark = pytest.mark.asyncio
+
+METRICS = ["test.a", "test.b", "test.c", "test.d", "test.e"]
+
+
+def subscriber(**kwargs: Any) -> Subscriber:
+    return Subscriber(
+        token="subscriber-test",
+        url="amqps://test.invalid",
+        expires=60,
+        metrics=METRICS,
+        **kwargs,
+    )
+
+
+async def connect(subscriber: Subscriber) -> MagicMock:
+    async def rpc(function: str, metrics: list[str], **kwargs: Any) -> dict[str, Any]:
+        return {
+            "dataQueue": f"queue-{metrics[0]}",
+            "metrics": {metric: {} for metric in metrics},
+        }
+
+    with patch("metricq.subscription.Client.connect"), patch.object(
+        subscriber, "rpc", side_effect=rpc
+    ) as mock_rpc, patch.object(subscriber, "stop"):
+        await subscriber.connect()
+    return mock_rpc
+
+
+class FakeDrain:
+    def __init__(self, chunks: list[Chunk], error: Exception | None = None):
+        self._chunks = chunks
+        self._error = error
+
+    async def __aenter__(self) -> "FakeDrain":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def chunks(self) -> AsyncIterator[Chunk]:
+        for chunk in self._chunks:
+            # Give the other shards a chance to interleave
+            await asyncio.sleep(0)
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+
+def chunk(metric: str, *timestamps: int) -> Chunk:
+    return metric, array("q", timestamps), array("d", map(float, timestamps))
+
+
+async def test_subscriber_single_shard() -> None:
+    s = subscriber()
+    mock_rpc = await connect(s)
+
+    mock_rpc.assert_called_once()
+    assert mock_rpc.call_args.kwargs["metrics"] == METRICS
+    assert s.queues == ["queue-test.a"]
+    assert s.queue == "queue-test.a"
+    assert set(s.metadata) == set(METRICS)
+
+
+async def test_subscriber_shards_split_metrics() -> None:
+    s = subscriber(shards=2)
+    mock_rpc = await connect(s)
+
+    assert [call.kwargs["metrics"] for call in mock_rpc.call_args_list] == [
+        ["test.a", "test.c", "test.e"],
+        ["test.b", "test.d"],
+    ]
+    assert s.queues == ["queue-test.a", "queue-test.b"]
+    assert s.queue == "queue-test.a"
+    assert set(s.metadata) == set(METRICS)
+
+    drain = s.drain(1)
+    assert drain._queue == "queue-test.b"
+    assert drain._metrics == ["test.b", "test.d"]
+
+
+@pytest.mark.parametrize("shards", [0, len(METRICS) + 1])
+async def test_subscriber_invalid_shards(shards: int) -> None:
+    with pytest.raises(ValueError):
+        subscriber(shards=shards)
+
+
+async def test_subscriber_collect_chunks_merges_shards() -> None:
+    s = subscriber(shards=2)
+    await connect(s)
+
+    drains = [
+        FakeDrain([chunk("test.a", 1, 2), chunk("test.c", 3), chunk("test.a", 4)]),
+        FakeDrain([chunk("test.b", 5), chunk("test.b", 6, 7)]),
+    ]
+    with patch.object(s, "drain", side_effect=lambda shard, **kwargs: drains[shard]):
+        chunks = [c async for c in s.collect_chunks()]
+
+    assert sorted((metric, list(t)) for metric, t, _ in chunks) == [
+        ("test.a", [1, 2]),
+        ("test.a", [4]),
+        ("test.b", [5]),
+        ("test.b", [6, 7]),
+        ("test.c", [3]),
+    ]
+    # Order per metric is preserved
+    for metric in METRICS:
+        timestamps = [t for m, ts, _ in chunks if m == metric for t in ts]
+        assert timestamps == sorted(timestamps)
+
+
+async def test_subscriber_collect_data_merges_shards() -> None:
+    s = subscriber(shards=2)
+    await connect(s)
+
+    drains = [FakeDrain([chunk("test.a", 1, 2)]), FakeDrain([chunk("test.b", 3)])]
+    with patch.object(s, "drain", side_effect=lambda shard, **kwargs: drains[shard]):
+        data = [d async for d in s.collect_data()]
+
+    assert sorted(data) == [
+        ("test.a", Timestamp(1), 1.0),
+        ("test.a", Timestamp(2), 2.0),
+        ("test.b", Timestamp(3), 3.0),
+    ]
+
+
+async def test_subscriber_collect_chunks_shard_failure() -> None:
+    s = subscriber(shards=2)
+    await connect(s)
+
+    stalled = AsyncMock(side_effect=asyncio.Event().wait)
+    drains = [
+        FakeDrain([chunk("test.a", 1)], error=RuntimeError("shard failed")),
+        MagicMock(__aenter__=stalled, __aexit__=AsyncMock(return_value=None)),
+    ]
+    with patch.object(s, "drain", side_effect=lambda shard, **kwargs: drains[shard]):
+        with pytest.raises(RuntimeError, match="shard failed"):
+            async for _ in s.collect_chunks():
+                pass
+    # The stalled shard was cancelled rather than awaited
+    stalled.assert_awaited_once()
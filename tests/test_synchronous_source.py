@@ -0,0 +1,103 @@
+from collections.abc import Iterator
+from threading import Thread
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from metricq import SynchronousSource, Timestamp
+from metricq.datachunk_pb2 import DataChunk
+from metricq.exceptions import PublishFailed
+from metricq.source import Source
+
+
+@pytest.fixture
+def send() -> Iterator[AsyncMock]:
+    # Run the background thread without a network connection
+    with patch.object(Source, "connect"), patch.object(
+        Source, "teardown"
+    ), patch.object(Source, "_send", new_callable=AsyncMock) as send:
+        yield send
+
+
+def sent_values(send: AsyncMock) -> dict[str, list[float]]:
+    values: dict[str, list[float]] = {}
+    for (metric, chunk), _ in send.call_args_list:
+        assert len(chunk.time_delta) == len(chunk.value)
+        values.setdefault(metric, []).extend(chunk.value)
+    return values
+
+
+def test_synchronous_source_batching(send: AsyncMock) -> None:
+    source = SynchronousSource(
+        token="source-test", url="amqps://test.invalid", batching=True
+    )
+    try:
+
+        def produce(metric: str) -> None:
+            for i in range(1000):
+                source.send(metric, Timestamp(i), float(i))
+
+        producers = [Thread(target=produce, args=(f"test.{i}",)) for i in range(4)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+
+        source.flush(timeout=10)
+
+        # All data points arrive in order, in far fewer calls than data points
+        assert sent_values(send) == {
+            f"test.{i}": [float(v) for v in range(1000)] for i in range(4)
+        }
+        assert send.await_count < 4000
+    finally:
+        source.stop(timeout=10)
+
+
+def test_synchronous_source_stop_flushes_buffer(send: AsyncMock) -> None:
+    source = SynchronousSource(
+        token="source-test", url="amqps://test.invalid", batching=True
+    )
+    source.send("test.foo", Timestamp(1000), 1.0)
+    source.stop(timeout=10)
+
+    assert sent_values(send) == {"test.foo": [1.0]}
+
+
+def test_synchronous_source_batching_failed_chunk(send: AsyncMock) -> None:
+    async def fail_foo(metric: str, chunk: DataChunk) -> None:
+        if metric == "test.foo":
+            raise PublishFailed("test")
+
+    source = SynchronousSource(
+        token="source-test", url="amqps://test.invalid", batching=True
+    )
+    try:
+        send.side_effect = fail_foo
+        source.send("test.foo", Timestamp(1000), 1.0)
+        source.send("test.bar", Timestamp(1000), 2.0)
+        source.flush(timeout=10)
+
+        # Data points of other metrics are sent, those of the failed chunk remain buffered
+        assert sent_values(send)["test.bar"] == [2.0]
+        assert list(source._source["test.foo"].chunk.value) == [1.0]
+
+        send.side_effect = None
+        source.flush(timeout=10)
+        assert send.await_args is not None
+        metric, chunk = send.await_args.args
+        assert metric == "test.foo" and list(chunk.value) == [1.0]
+    finally:
+        source.stop(timeout=10)
+
+
+def test_synchronous_source_unbatched(send: AsyncMock) -> None:
+    with patch.object(Source, "send", new_callable=AsyncMock) as source_send:
+        source = SynchronousSource(token="source-test", url="amqps://test.invalid")
+        try:
+            source.send("test.foo", Timestamp(1000), 1.0)
+            source_send.assert_awaited_once_with("test.foo", Timestamp(1000), 1.0)
+        finally:
+            source.stop(timeout=10)
+
+    assert not send.called